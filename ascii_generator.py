@@ -4,53 +4,145 @@ ascii_generator.py
 Generates a simple ASCII schematic diagram (tree-like) from the 'model' dict
 produced by build_network_model.py.
 
-Assumptions:
-- We have exactly one "HV_Station" node feeding "MV_Node_0".
-- From MV_Node_0, there are several feeders (MV_Node_i),
-  each with a transformer to an LV_Node_i,
-  which then links to building nodes.
-
-If your model is more complex, you'll need to adapt the logic accordingly.
+Two layouts are supported:
+- The legacy layout, used when the model has an "HV_Station" node feeding
+  "MV_Node_0". From MV_Node_0, there are several feeders (MV_Node_i),
+  each with a transformer to an LV_Node_i, which then links to building nodes.
+- The tree layout for the naming build_network_model actually produces:
+  MainSubstation -> Feeder* -> Feeder*_LVbranch_* -> buildings (B*).
+  It is rendered in one depth-first traversal over a NetworkGraph index,
+  with optional depth and fan-out truncation, and can be streamed line by
+  line (iter_ascii_diagram / write_ascii_diagram) instead of building one
+  big string.
 """
 
-def generate_ascii_diagram(model):
+from network_graph import NetworkGraph, EDGE_LINE
+
+
+def _node_role(name, is_root):
+    """
+    Classifies a node by the naming used in build_network_model / create_mv_lv_lines.
+    """
+    if is_root or name == "MainSubstation":
+        return "Substation"
+    if name.startswith("Feeder"):
+        return "LV branch" if "_LVbranch_" in name else "Feeder"
+    if name.startswith("B"):
+        return "Building"
+    return "Node"
+
+
+def iter_ascii_diagram(model, max_depth=None, max_children=None, graph=None):
+    """
+    Yields the ASCII tree of the model one line at a time, e.g.:
+
+      MainSubstation (id=1) [Substation]
+      ├─ L0001: Feeder1 (id=2) [Feeder]
+      │  ├─ L0002: Feeder1_LVbranch_1 (id=3) [LV branch]
+      │  └─ L0003: Feeder1_LVbranch_2 (id=4) [LV branch]
+      │     ├─ B0002 (id=22) [Building]
+      ...
+
+    :param model: dict with "nodes", "lines", "links", "sources"
+    :param max_depth: stop expanding below this depth (root = 0);
+                      the hidden part is summarised in one line
+    :param max_children: show at most this many children per node,
+                         the rest is summarised in one line
+    :param graph: optional prebuilt NetworkGraph for this model
+    """
+    if graph is None:
+        graph = NetworkGraph(model)
+    if len(graph.roots) == 0:
+        yield "No source (MainSubstation) found in the model!"
+        return
+
+    names = graph.names
+    node_ids = graph.node_ids
+    parent_edge = graph.parent_edge
+    depth = graph.depth
+
+    def label(pos):
+        text = f"{names[pos]} (id={node_ids[pos]}) [{_node_role(names[pos], depth[pos] == 0)}]"
+        e = parent_edge[pos]
+        if e >= 0 and graph.edge_kind[e] == EDGE_LINE:
+            text = f"{graph.edge(e).get('name', e)}: {text}"
+        return text
+
+    # explicit stack of (position, prefix for this line, prefix for children);
+    # position None marks a plain summary line stored in the prefix slot
+    stack = [(r, "", "") for r in reversed(graph.roots.tolist())]
+    while stack:
+        pos, line_prefix, child_prefix = stack.pop()
+        if pos is None:
+            yield line_prefix
+            continue
+        yield line_prefix + label(pos)
+
+        children = graph.children(pos).tolist()
+        if not children:
+            continue
+        if max_depth is not None and depth[pos] >= max_depth:
+            hidden = len(graph.subtree(pos)) - 1
+            yield f"{child_prefix}└─ ... ({hidden} nodes below depth {max_depth})"
+            continue
+
+        hidden = 0
+        if max_children is not None and len(children) > max_children:
+            hidden = len(children) - max_children
+            children = children[:max_children]
+            stack.append((None, f"{child_prefix}└─ ... ({hidden} more)", ""))
+
+        for i in range(len(children) - 1, -1, -1):
+            is_last = (i == len(children) - 1) and not hidden
+            stack.append((children[i],
+                          child_prefix + ("└─ " if is_last else "├─ "),
+                          child_prefix + ("   " if is_last else "│  ")))
+
+
+def write_ascii_diagram(model, output_path, max_depth=None, max_children=None, graph=None):
+    """
+    Streams the ASCII tree to 'output_path' without holding it in memory.
+    Returns the number of lines written.
+    """
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for line in iter_ascii_diagram(model, max_depth, max_children, graph):
+            f.write(line)
+            f.write("\n")
+            count += 1
+    return count
+
+
+def generate_ascii_diagram(model, max_depth=None, max_children=None):
     """
     Returns a multi-line ASCII string representing the hierarchical layout:
       HV_Station -> MV_Node_0 -> feeders -> T(MV->LV) -> LV_Node -> buildings
+    Models without an HV_Station (e.g. MainSubstation/Feeder*/LVbranch from
+    build_network_model) are rendered with iter_ascii_diagram instead,
+    using max_depth / max_children for truncation.
+    For very large models prefer write_ascii_diagram, which streams to a file.
     """
-    # A helper function to get a node dict by ID
-    def get_node_by_id(n_id):
-        return next((n for n in model["nodes"] if n["id"] == n_id), None)
-
-    # A helper to find lines from a given from_node
-    def get_lines_from(src_id):
-        return [l for l in model["lines"] if l["from_node"] == src_id]
+    graph = NetworkGraph(model)
 
-    # A helper to find links from a given from_node (for buildings, etc.)
-    def get_links_from(src_id):
-        return [lk for lk in model["links"] if lk["from_node"] == src_id]
+    # O(1) lookups through the shared index instead of scanning the model
+    get_node_by_id = graph.node_by_id
+    get_lines_from = graph.lines_from
+    get_links_from = graph.links_from
 
     lines = []
 
     # 1) Find the HV_Station node
-    hv_node = None
-    for n in model["nodes"]:
-        if n["name"] == "HV_Station":
-            hv_node = n
-            break
-
-    if hv_node is None:
-        return "No HV_Station found in the model!"
+    hv_pos = graph.position_of_name("HV_Station")
+    if hv_pos is None:
+        return "\n".join(iter_ascii_diagram(model, max_depth, max_children, graph))
+    hv_node = model["nodes"][hv_pos]
 
     hv_str = f"{hv_node['name']} (id={hv_node['id']})"
     lines.append(hv_str)
 
     # 2) Find the line from HV_Station to MV_Node_0 (the main MV bus)
-    hv_to_mv_line = None
-    for l in model["lines"]:
-        if l["from_node"] == hv_node["id"]:
-            hv_to_mv_line = l
-            break
+    hv_lines = get_lines_from(hv_node["id"])
+    hv_to_mv_line = hv_lines[0] if hv_lines else None
 
     if hv_to_mv_line is None:
         lines.append("  |-> [No HV->MV connection found!]")
@@ -62,10 +154,7 @@ def generate_ascii_diagram(model):
 
     # 3) From MV_Node_0, we look for lines that feed MV_Node_i
     #    i.e. from_node = mv_main["id"], plus the MV->LV transformer line
-    feeders = []
-    for ln in model["lines"]:
-        if ln["from_node"] == mv_main["id"] and "Feeder" in ln["name"]:
-            feeders.append(ln)
+    feeders = [ln for ln in get_lines_from(mv_main["id"]) if "Feeder" in ln["name"]]
 
     # Sort feeders by name or ID (for consistent ordering)
     feeders.sort(key=lambda x: x["name"])
@@ -78,12 +167,8 @@ def generate_ascii_diagram(model):
         lines.append(line_str)
 
         # Now find the transformer line from that MV_Node to an LV_Node
-        tx_line = None
-        for l in model["lines"]:
-            if l["from_node"] == mv_node_id and "MVtoLV" in l["name"]:
-                tx_line = l
-                break
-        
+        tx_line = next((l for l in get_lines_from(mv_node_id) if "MVtoLV" in l["name"]), None)
+
         if tx_line:
             tx_str = f"         └─ {tx_line['name']} (id={tx_line['id']}) [Transformer]"
             lines.append(tx_str)
@@ -0,0 +1,345 @@
+"""
+benchmark_pipeline.py
+
+Times every pipeline stage on synthetic regions of increasing size
+(1k, 10k, 100k and 1M buildings by default) to show where scaling breaks.
+
+Stages (each reads the files written by the previous ones):
+  generate_buildings          generate_rich_building_data + write_buildings_to_csv
+  determine_feeders           k-means placement, one feeder per 'buildings_per_feeder'
+  create_mv_lv_lines          MST LV topology + node table
+  assign_buildings            assign_buildings_to_lines
+  build_network_model         build_network_model
+  generate_json_data          generate_json_data
+  pf_solve                    one sweep power flow (run_power_flow_sweep)
+  generate_time_series_loads  a few time steps of loads
+  time_series                 run_time_series_pf_long with a PowerFlowSession
+
+Every stage runs in its own spawned process, so its peak RSS (ru_maxrss) is
+not inflated by earlier stages. Only the stage call itself is timed; reading
+inputs it needs beyond its own arguments (e.g. the model for the solver) is
+setup and is not included in the wall time, but is part of the peak RSS.
+A stage that fails or exceeds --timeout is recorded with its status, and the
+stages after it at the same scale are skipped.
+
+Each run is appended to a JSON history file. If a baseline file exists, stages
+whose wall time or peak RSS grew by more than --tolerance (and by more than a
+small absolute margin) are flagged as regressions; the exit code is 1 then.
+
+Usage:
+  python benchmark_pipeline.py --scales 1k,10k
+  python benchmark_pipeline.py --scales 1k,10k,100k --save-baseline
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import time
+from datetime import datetime
+
+from memory_budget import peak_rss_mb
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+STAGES = [
+    "generate_buildings",
+    "determine_feeders",
+    "create_mv_lv_lines",
+    "assign_buildings",
+    "build_network_model",
+    "generate_json_data",
+    "pf_solve",
+    "generate_time_series_loads",
+    "time_series",
+]
+
+# Differences below these are treated as noise when comparing with the baseline
+MIN_WALL_DELTA_S = 0.05
+MIN_RSS_DELTA_MB = 10.0
+
+
+def _paths(workdir):
+    return {
+        "buildings": os.path.join(workdir, "buildings.csv"),
+        "feeders": os.path.join(workdir, "feeders.csv"),
+        "lines": os.path.join(workdir, "lines.csv"),
+        "nodes": os.path.join(workdir, "lines_nodes.csv"),
+        "assignments": os.path.join(workdir, "building_assignments.csv"),
+        "ts_loads": os.path.join(workdir, "time_series_loads.csv"),
+        "ts_long": os.path.join(workdir, "time_series_long.csv"),
+    }
+
+
+def _build_model(p):
+    from build_network_model import build_network_model
+    return build_network_model(p["buildings"], p["lines"], p["assignments"], node_locations=p["nodes"])
+
+
+# ------------------------------------------------------------------ stages
+# Each stage does its setup and returns the zero-argument callable to be timed.
+
+def _stage_generate_buildings(p, cfg):
+    from generate_buildings import generate_rich_building_data, write_buildings_to_csv
+
+    def run():
+        write_buildings_to_csv(generate_rich_building_data(cfg["num_buildings"]), p["buildings"])
+    return run
+
+
+def _stage_determine_feeders(p, cfg):
+    from determine_num_feeders import determine_feeders
+
+    def run():
+        determine_feeders(buildings_csv=p["buildings"], feeders_csv=p["feeders"],
+                          buildings_per_feeder=cfg["buildings_per_feeder"],
+                          placement_mode="kmeans", random_seed=cfg["seed"])
+    return run
+
+
+def _stage_create_mv_lv_lines(p, cfg):
+    import csv
+    from create_mv_lv_lines import create_mv_lv_lines
+    with open(p["feeders"], "r", encoding="utf-8") as f:
+        feeders = [{"feeder_id": r["feeder_id"], "lat": float(r["lat"]), "lon": float(r["lon"])}
+                   for r in csv.DictReader(f)]
+
+    def run():
+        create_mv_lv_lines(substation_id="MainSubstation", substation_lat=40.150,
+                           substation_lon=-3.550, feeder_nodes=feeders,
+                           output_path=p["lines"], nodes_output_path=p["nodes"],
+                           lv_topology="mst", buildings=p["buildings"])
+    return run
+
+
+def _stage_assign_buildings(p, cfg):
+    from assign_buildings import (assign_buildings_to_lines, load_buildings, load_lines,
+                                  write_assignments_csv)
+
+    def run():
+        assignments = assign_buildings_to_lines(load_buildings(p["buildings"]),
+                                                load_lines(p["lines"]),
+                                                node_locations=p["nodes"], only_lv=True)
+        write_assignments_csv(assignments, p["assignments"])
+    return run
+
+
+def _stage_build_network_model(p, cfg):
+    return lambda: _build_model(p)
+
+
+def _stage_generate_json_data(p, cfg):
+    from json_generator import generate_json_data
+    model = _build_model(p)
+    return lambda: generate_json_data(model)
+
+
+def _stage_pf_solve(p, cfg):
+    from json_generator import generate_json_data
+    from power_flow_solver import run_power_flow_sweep
+    input_dict = generate_json_data(_build_model(p))
+    return lambda: run_power_flow_sweep(input_dict)
+
+
+def _stage_generate_time_series_loads(p, cfg):
+    import csv
+    from generate_time_series_loads import generate_time_series_loads
+    with open(p["buildings"], "r", encoding="utf-8") as f:
+        building_ids = [r["building_id"] for r in csv.DictReader(f)]
+    end_minutes = 15 * cfg["steps"]
+    end_time = f"2025-01-01 {end_minutes // 60:02d}:{end_minutes % 60:02d}:00"
+
+    def run():
+        generate_time_series_loads(
+            building_ids=building_ids,
+            categories=["facility", "generation", "storage", "total_electricity"],
+            start_time="2025-01-01 00:00:00", end_time=end_time,
+            step_minutes=15, output_csv=p["ts_loads"])
+    return run
+
+
+def _stage_time_series(p, cfg):
+    from power_flow_solver import PowerFlowSession
+    from time_series_runner_long import run_time_series_pf_long
+
+    def run():
+        run_time_series_pf_long(buildings_file=p["buildings"], lines_file=p["lines"],
+                                assignments_file=p["assignments"], ts_file=p["ts_loads"],
+                                output_csv=p["ts_long"], session=PowerFlowSession())
+    return run
+
+
+def _run_stage(stage, workdir, cfg):
+    """
+    Entry point of the spawned stage process. Returns wall time and peak RSS.
+    """
+    random.seed(cfg["seed"])
+    quiet = open(os.devnull, "w")
+    stdout = sys.stdout
+    if not cfg["verbose"]:
+        sys.stdout = quiet
+    try:
+        run = globals()[f"_stage_{stage}"](_paths(workdir), cfg)
+        t0 = time.perf_counter()
+        run()
+        wall_s = time.perf_counter() - t0
+    finally:
+        sys.stdout = stdout
+        quiet.close()
+    return {"status": "ok", "wall_s": round(wall_s, 4), "peak_rss_mb": peak_rss_mb()}
+
+
+def run_scale(scale, num_buildings, workdir, cfg, timeout=None):
+    """
+    Runs all stages for one scale, each in a fresh spawned process.
+    Returns { stage: {"status", "wall_s", "peak_rss_mb"} }.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    cfg = dict(cfg, num_buildings=num_buildings)
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    failed = None
+    for stage in STAGES:
+        if failed is not None:
+            results[stage] = {"status": f"skipped ({failed} failed)", "wall_s": None, "peak_rss_mb": None}
+            print(f"[benchmark] {scale:>5} {stage:<27} {'-':>12} {'-':>9}  {results[stage]['status']}")
+            continue
+        pool = ctx.Pool(processes=1)
+        try:
+            res = pool.apply_async(_run_stage, (stage, workdir, cfg)).get(timeout)
+            pool.close()
+        except multiprocessing.TimeoutError:
+            res = {"status": "timeout", "wall_s": None, "peak_rss_mb": None}
+        except Exception as e:
+            res = {"status": f"error: {type(e).__name__}: {e}", "wall_s": None, "peak_rss_mb": None}
+        finally:
+            pool.terminate()
+            pool.join()
+        if res["status"] != "ok":
+            failed = stage
+        results[stage] = res
+        wall = "-" if res["wall_s"] is None else f"{res['wall_s']:.3f} s"
+        rss = "-" if res["peak_rss_mb"] is None else f"{res['peak_rss_mb']:.0f} MB"
+        print(f"[benchmark] {scale:>5} {stage:<27} {wall:>12} {rss:>9}  {res['status']}")
+    return results
+
+
+def compare_with_baseline(run, baseline, tolerance=0.2):
+    """
+    Lists (scale, stage, metric, baseline value, new value) for every stage that
+    got slower or bigger than the baseline by more than 'tolerance' (relative)
+    and more than the absolute noise margins.
+    """
+    regressions = []
+    for scale, stages in run["scales"].items():
+        base_stages = baseline.get("scales", {}).get(scale, {})
+        for stage, res in stages.items():
+            base = base_stages.get(stage)
+            if not base or base.get("status") != "ok":
+                continue
+            if res.get("status") != "ok":
+                regressions.append((scale, stage, "status", "ok", res.get("status")))
+                continue
+            for metric, margin in (("wall_s", MIN_WALL_DELTA_S), ("peak_rss_mb", MIN_RSS_DELTA_MB)):
+                old, new = base.get(metric), res.get(metric)
+                if old is None or new is None:
+                    continue
+                if new > old * (1.0 + tolerance) and new - old > margin:
+                    regressions.append((scale, stage, metric, old, new))
+    return regressions
+
+
+def _load_json(path, default):
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return default
+
+
+def _write_json(obj, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_benchmarks(scales=("1k", "10k"), workdir="benchmark_work",
+                   history_path="benchmark_history.json",
+                   baseline_path="benchmark_baseline.json",
+                   tolerance=0.2, timeout=None, steps=4, buildings_per_feeder=200,
+                   seed=42, save_baseline=False, keep_files=False, verbose=False):
+    """
+    Runs the benchmark for the given scales, appends the run to the history file
+    and compares it with the baseline. Returns (run, regressions).
+    """
+    cfg = {"seed": seed, "steps": steps, "buildings_per_feeder": buildings_per_feeder,
+           "verbose": verbose}
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": cfg,
+        "scales": {}
+    }
+    for scale in scales:
+        scale_dir = os.path.join(workdir, scale)
+        run["scales"][scale] = run_scale(scale, SCALES[scale], scale_dir, cfg, timeout=timeout)
+        if not keep_files:
+            shutil.rmtree(scale_dir, ignore_errors=True)
+
+    history = _load_json(history_path, [])
+    history.append(run)
+    _write_json(history, history_path)
+    print(f"[benchmark] Appended run to '{history_path}' ({len(history)} runs).")
+
+    regressions = []
+    baseline = _load_json(baseline_path, None)
+    if baseline is not None:
+        regressions = compare_with_baseline(run, baseline, tolerance)
+        for scale, stage, metric, old, new in regressions:
+            print(f"[benchmark] REGRESSION {scale} {stage} {metric}: {old} -> {new}")
+        if not regressions:
+            print(f"[benchmark] No regressions against '{baseline_path}'.")
+    if save_baseline:
+        _write_json(run, baseline_path)
+        print(f"[benchmark] Saved run as baseline '{baseline_path}'.")
+    return run, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage at several scales.")
+    parser.add_argument("--scales", default="1k,10k,100k,1m",
+                        help=f"comma separated subset of {','.join(SCALES)}")
+    parser.add_argument("--workdir", default="benchmark_work")
+    parser.add_argument("--history", default="benchmark_history.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative growth flagged as a regression (default 0.2 = 20%%)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per stage")
+    parser.add_argument("--steps", type=int, default=4, help="time steps for the time-series stages")
+    parser.add_argument("--buildings-per-feeder", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-files", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the stages' own output")
+    args = parser.parse_args(argv)
+
+    scales = [s.strip().lower() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"unknown scales {unknown}, choose from {list(SCALES)}")
+
+    _, regressions = run_benchmarks(
+        scales=scales, workdir=args.workdir, history_path=args.history,
+        baseline_path=args.baseline, tolerance=args.tolerance, timeout=args.timeout,
+        steps=args.steps, buildings_per_feeder=args.buildings_per_feeder, seed=args.seed,
+        save_baseline=args.save_baseline, keep_files=args.keep_files, verbose=args.verbose)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
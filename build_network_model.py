@@ -5,7 +5,8 @@ Creates a final 'model' dictionary for your distribution network, using:
   - buildings.csv/json
   - lines.csv/json
   - building_assignments.csv/json
-  - node locations (dict or file)
+  - node locations (dict, or the node table written by create_mv_lv_lines.py;
+    by default the table next to the lines file, see node_table.py)
 
 and merges them into one data structure:
 
@@ -25,6 +26,7 @@ import csv
 import json
 import os
 from data_lookup import DEFAULT_CONFIG, DEFAULT_LINE_PARAMS, DEFAULT_TRANSFORMER_PARAMS
+from node_table import resolve_node_locations
 
 def load_csv_or_json(filepath):
     """
@@ -52,7 +54,8 @@ def build_network_model(
     :param buildings_path: CSV/JSON file with building data (id, lat, lon, peak_load, etc.)
     :param lines_path: CSV/JSON file with lines data (line_id, from_id, to_id, voltage_level, etc.)
     :param assignments_path: CSV/JSON file with building->line assignments
-    :param node_locations: dict { node_id: (lat, lon) }, optional if lines_path doesn't store lat/lon
+    :param node_locations: dict { node_id: (lat, lon) } or a node table path;
+        if None, the node table next to lines_path is used when it exists
     :param config: dictionary of default config, from data_lookup.py or custom
     :return: a dictionary with structure:
        {
@@ -67,8 +70,7 @@ def build_network_model(
     if config is None:
         config = DEFAULT_CONFIG
 
-    if node_locations is None:
-        node_locations = {}
+    node_locations = resolve_node_locations(node_locations, lines_path)
 
     # Initialize model
     model = {
@@ -243,25 +245,19 @@ def update_building_loads(model, load_dict):
     """
     # We'll assume building_name == model "node" name for loads
     # You might track them differently if needed.
-    name_to_load_id = {}
-    # build a quick map from node name -> load entry
+    # Index nodes and loads once, so the update is linear in the model size.
+    node_name_by_id = {n["id"]: n["name"] for n in model["nodes"]}
+    name_to_load = {}
     for ld in model["loads"]:
-        node_id = ld["node"]
-        # find the node in model["nodes"] to get name
-        node_obj = next((n for n in model["nodes"] if n["id"] == node_id), None)
-        if node_obj:
-            b_name = node_obj["name"]
-            name_to_load_id[b_name] = ld["id"]
+        b_name = node_name_by_id.get(ld["node"])
+        if b_name is not None:
+            name_to_load[b_name] = ld
 
     for bname, load_val in load_dict.items():
-        # find load entry
-        if bname in name_to_load_id:
-            ld_id = name_to_load_id[bname]
-            # update that load
-            for ld in model["loads"]:
-                if ld["id"] == ld_id:
-                    ld["p_kW"] = load_val
-                    break
+        # find load entry and update it
+        ld = name_to_load.get(bname)
+        if ld is not None:
+            ld["p_kW"] = load_val
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+"""
+checkpoint.py
+
+Small JSON checkpoints for long runs (see time_series_runner_long.py).
+
+A checkpoint is written to '<path>.tmp', flushed to disk and then renamed
+over '<path>', so a crash leaves either the previous or the new checkpoint,
+never a partial one.
+
+State too large for JSON (e.g. NumPy arrays) goes into side files that the
+checkpoint lists under "files" ({name: path}); remove_checkpoint deletes them too.
+"""
+
+import json
+import os
+
+
+def checkpoint_path_for(output_path):
+    """
+    Default checkpoint path for an output file: '<output_path>.checkpoint.json'.
+    """
+    return f"{output_path}.checkpoint.json"
+
+
+def save_checkpoint(state, path):
+    """
+    Atomically writes the JSON-serializable 'state' to 'path'.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """
+    Returns the checkpoint dict, or None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def remove_checkpoint(path):
+    """
+    Deletes the checkpoint and its side files (e.g. after the run completed).
+    """
+    checkpoint = load_checkpoint(path)
+    if checkpoint is None:
+        return
+    for side_path in checkpoint.get("files", {}).values():
+        if os.path.exists(side_path):
+            os.remove(side_path)
+    os.remove(path)
@@ -6,31 +6,130 @@ Creates MV and LV lines for a distribution network, given:
   2) A list of feeder nodes, each with lat/lon
   3) (Optionally) we can create a few "LV branches" off each feeder node,
      but not assigned to buildings. This is just a topology skeleton.
+     With lv_topology="mst" we instead build a radial LV tree per feeder:
+     every building is attached to its nearest feeder, and the feeder plus its
+     buildings are connected by a Euclidean minimum spanning tree (lv_topology.py).
+     Each building gets an LV node "<feeder>_LVbranch_<building_id>" at its location.
 
 Outputs lines in CSV or JSON with fields:
-   line_id, from_id, to_id, length_km, voltage_level
+   line_id, from_id, to_id, length_km, voltage_level,
+   from_lat, from_lon, to_lat, to_lon
+
+and a node table (node_table.py) with node_id, lat, lon, voltage_level for every
+line end, written next to the lines file (lines.csv -> lines_nodes.csv).
 """
 
 import csv
 import json
-import math
 
-def distance_lat_lon(lat1, lon1, lat2, lon2):
+import numpy as np
+
+from geo import haversine_km, project_local_km
+from lv_topology import euclidean_mst, orient_tree
+from node_table import node_table_path_for, write_node_table
+
+# (buildings x feeders) distances evaluated at once when attaching buildings to feeders
+NEAREST_FEEDER_BLOCK = 1 << 21
+
+def _load_building_points(buildings):
     """
-    Approximate distance in km using the haversine formula.
+    Accepts a list of building dicts or a path to a buildings CSV.
+    Returns (building_ids, lat array, lon array).
     """
-    R = 6371.0
-    lat1_r = math.radians(lat1)
-    lon1_r = math.radians(lon1)
-    lat2_r = math.radians(lat2)
-    lon2_r = math.radians(lon2)
+    ids, lats, lons = [], [], []
+    if isinstance(buildings, str):
+        with open(buildings, "r", encoding="utf-8", newline="") as f:
+            rows = csv.DictReader(f)
+            for b in rows:
+                ids.append(b["building_id"])
+                lats.append(float(b["lat"]))
+                lons.append(float(b["lon"]))
+    else:
+        for b in buildings:
+            ids.append(b["building_id"])
+            lats.append(float(b["lat"]))
+            lons.append(float(b["lon"]))
+    return ids, np.array(lats), np.array(lons)
 
-    dlat = lat2_r - lat1_r
-    dlon = lon2_r - lon1_r
 
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+def _mst_lv_lines(feeder_nodes, buildings):
+    """
+    Radial LV trees: each building goes to its nearest feeder, then the feeder
+    and its buildings are spanned by a Euclidean MST rooted at the feeder.
+    Returns {feeder_id: [line dicts]}; line IDs are assigned by the caller.
+    """
+    b_ids, b_lat, b_lon = _load_building_points(buildings)
+    f_lat = np.array([float(fd["lat"]) for fd in feeder_nodes])
+    f_lon = np.array([float(fd["lon"]) for fd in feeder_nodes])
+    ref_lat = float(np.concatenate([b_lat, f_lat]).mean())
+    ref_lon = float(np.concatenate([b_lon, f_lon]).mean())
+    b_xy = project_local_km(b_lat, b_lon, ref_lat, ref_lon)
+    f_xy = project_local_km(f_lat, f_lon, ref_lat, ref_lon)
+
+    # nearest feeder per building, in chunks to bound the distance matrix
+    nearest = np.empty(len(b_ids), dtype=np.int64)
+    chunk = max(1, NEAREST_FEEDER_BLOCK // max(len(feeder_nodes), 1))
+    for start in range(0, len(b_ids), chunk):
+        p = b_xy[start:start + chunk]
+        d2 = ((p[:, None, :] - f_xy[None, :, :]) ** 2).sum(axis=2)
+        nearest[start:start + chunk] = d2.argmin(axis=1)
+
+    order = np.argsort(nearest, kind="stable")
+    bounds = np.searchsorted(nearest[order], np.arange(len(feeder_nodes) + 1))
+
+    lines_by_feeder = {}
+    for fi, feeder in enumerate(feeder_nodes):
+        f_id = feeder["feeder_id"]
+        members = order[bounds[fi]:bounds[fi + 1]]
+        names = [f_id] + [f"{f_id}_LVbranch_{b_ids[i]}" for i in members.tolist()]
+        lat = np.concatenate([[f_lat[fi]], b_lat[members]])
+        lon = np.concatenate([[f_lon[fi]], b_lon[members]])
+        xy = np.vstack([f_xy[fi:fi + 1], b_xy[members]])
+
+        tree = orient_tree(len(xy), euclidean_mst(xy), root=0)
+        up, down = tree[:, 0], tree[:, 1]
+        lengths = haversine_km(lat[up], lon[up], lat[down], lon[down])
+
+        feeder_lines = []
+        for k, (u, d) in enumerate(tree.tolist()):
+            feeder_lines.append({
+                "line_id": None,
+                "from_id": names[u],
+                "to_id": names[d],
+                "length_km": round(float(lengths[k]), 4),
+                "voltage_level": "LV",
+                "from_lat": float(lat[u]),
+                "from_lon": float(lon[u]),
+                "to_lat": float(lat[d]),
+                "to_lon": float(lon[d])
+            })
+        lines_by_feeder[f_id] = feeder_lines
+
+    return lines_by_feeder
+
+
+def _node_records(lines_list):
+    """
+    One record per line end. A node takes the voltage level of the line feeding it;
+    the substation (never a 'to' end) takes the level of its outgoing lines.
+    """
+    nodes = {}
+    for ln in lines_list:
+        if ln["from_id"] not in nodes:
+            nodes[ln["from_id"]] = {
+                "node_id": ln["from_id"],
+                "lat": ln["from_lat"],
+                "lon": ln["from_lon"],
+                "voltage_level": ln["voltage_level"]
+            }
+        nodes[ln["to_id"]] = {
+            "node_id": ln["to_id"],
+            "lat": ln["to_lat"],
+            "lon": ln["to_lon"],
+            "voltage_level": ln["voltage_level"]
+        }
+    return nodes.values()
+
 
 def create_mv_lv_lines(
     substation_id="Substation",
@@ -39,7 +138,10 @@ def create_mv_lv_lines(
     feeder_nodes=None,
     lv_branches_per_feeder=0,
     output_format="csv",
-    output_path="lines.csv"
+    output_path="lines.csv",
+    lv_topology="stub",
+    buildings=None,
+    nodes_output_path=None
 ):
     """
     :param substation_id: name/id for the substation node
@@ -62,13 +164,19 @@ def create_mv_lv_lines(
         (purely to illustrate an LV topology skeleton, not assigned to buildings).
     :param output_format: "csv" or "json"
     :param output_path: file path to write lines
+    :param lv_topology: "stub" (lv_branches_per_feeder short branches per feeder)
+        or "mst" (radial LV tree over the buildings, see _mst_lv_lines)
+    :param buildings: for lv_topology="mst", list of building dicts or a path to
+        the buildings CSV (building_id, lat, lon)
+    :param nodes_output_path: node table path, default node_table_path_for(output_path)
     :return: a list of line dicts with fields
         {
           "line_id": ...,
           "from_id": ...,
           "to_id": ...,
           "length_km": ...,
-          "voltage_level": "MV" or "LV"
+          "voltage_level": "MV" or "LV",
+          "from_lat", "from_lon", "to_lat", "to_lon": node coordinates
         }
     """
     if feeder_nodes is None:
@@ -77,30 +185,50 @@ def create_mv_lv_lines(
     lines_list = []
     line_count = 1
 
+    lv_lines_by_feeder = {}
+    if lv_topology == "mst":
+        if buildings is None:
+            raise ValueError("lv_topology='mst' needs the buildings (list or CSV path).")
+        lv_lines_by_feeder = _mst_lv_lines(feeder_nodes, buildings)
+    elif lv_topology != "stub":
+        raise ValueError("lv_topology must be 'stub' or 'mst'.")
+
     # 1) For each feeder node, create an MV line from the substation to that node
     for feeder in feeder_nodes:
         f_id = feeder["feeder_id"]
         f_lat = feeder["lat"]
         f_lon = feeder["lon"]
 
-        dist_km = distance_lat_lon(substation_lat, substation_lon, f_lat, f_lon)
+        dist_km = float(haversine_km(substation_lat, substation_lon, f_lat, f_lon))
         line_id = f"L{line_count:04d}"
         lines_list.append({
             "line_id": line_id,
             "from_id": substation_id,
             "to_id": f_id,
             "length_km": round(dist_km, 4),
-            "voltage_level": "MV"
+            "voltage_level": "MV",
+            "from_lat": substation_lat,
+            "from_lon": substation_lon,
+            "to_lat": f_lat,
+            "to_lon": f_lon
         })
         line_count += 1
 
+        # 2a) MST mode: the feeder's radial LV tree, numbered after its MV line
+        for lv_line in lv_lines_by_feeder.get(f_id, []):
+            lv_line["line_id"] = f"L{line_count:04d}"
+            lines_list.append(lv_line)
+            line_count += 1
+        if lv_topology == "mst":
+            continue
+
         # 2) Optionally create some LV lines to represent branches from the feeder node
         for branch_i in range(lv_branches_per_feeder):
             # We'll create a simple pseudo-lv node at a random small offset
             # In reality, you'd define actual coordinates or further branching logic
             offset_lat = f_lat + 0.001 * (branch_i + 1)  # purely demonstration
             offset_lon = f_lon - 0.001 * (branch_i + 1)
-            dist_lv = distance_lat_lon(f_lat, f_lon, offset_lat, offset_lon)
+            dist_lv = float(haversine_km(f_lat, f_lon, offset_lat, offset_lon))
 
             lv_line_id = f"L{line_count:04d}"
             lv_node_id = f"{f_id}_LVbranch_{branch_i+1}"
@@ -109,13 +237,18 @@ def create_mv_lv_lines(
                 "from_id": f_id,
                 "to_id": lv_node_id,
                 "length_km": round(dist_lv, 4),
-                "voltage_level": "LV"
+                "voltage_level": "LV",
+                "from_lat": f_lat,
+                "from_lon": f_lon,
+                "to_lat": offset_lat,
+                "to_lon": offset_lon
             })
             line_count += 1
 
     # 3) Write output
     if output_format.lower() == "csv":
-        fieldnames = ["line_id", "from_id", "to_id", "length_km", "voltage_level"]
+        fieldnames = ["line_id", "from_id", "to_id", "length_km", "voltage_level",
+                      "from_lat", "from_lon", "to_lat", "to_lon"]
         with open(output_path, "w", newline="", encoding="utf-8") as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
@@ -128,6 +261,11 @@ def create_mv_lv_lines(
     else:
         raise ValueError("output_format must be 'csv' or 'json'.")
 
+    if nodes_output_path is None:
+        nodes_output_path = node_table_path_for(output_path)
+    n_nodes = write_node_table(_node_records(lines_list), nodes_output_path)
+    print(f"[create_mv_lv_lines] Created node table ({n_nodes} nodes): {nodes_output_path}")
+
     return lines_list
 
 if __name__ == "__main__":
@@ -151,4 +289,4 @@ if __name__ == "__main__":
         output_format="csv",
         output_path="lines_demo.csv"
     )
-    print(f"Created {len(lines)} lines in lines_demo.csv.")
+    print(f"Created {len(lines)} lines in lines_demo.csv (node coordinates in lines_demo_nodes.csv).")
@@ -5,15 +5,28 @@ Calculates how many feeders we want and writes a CSV with each feeder's ID and l
 
 Steps:
   1. Read buildings CSV to determine number of buildings (or total load).
-  2. Decide how many feeders by a simple ratio or load-based approach.
-  3. Place feeders at random or user-defined lat/lon within the bounding box of the buildings.
+     This is a single streaming pass (aggregate_buildings): only counters, bounds
+     and, when clustering needs them, compact coordinate/load arrays are kept.
+  2. Decide how many feeders by a simple ratio or load-based approach
+     (coincident peak load vs. feeder capacity).
+  3. Place feeders at random or user-defined lat/lon within the bounding box of the buildings,
+     or at the centroids of a (load-weighted) mini-batch k-means clustering of the buildings.
   4. Write feeders.csv with columns: feeder_id, lat, lon
+
+Requires:
+  pip install numpy
+  (coordinate arrays, projection and the kmeans placement)
 """
 
 import csv
 import math
 import random
 import os
+from array import array
+
+import numpy as np
+
+from geo import project_local_km, unproject_local_km
 
 def get_num_feeders_simple(num_buildings, buildings_per_feeder=50):
     """
@@ -30,17 +43,237 @@ def get_num_feeders_by_load(total_load_kW, feeder_capacity_kW=2000):
     """
     return math.ceil(total_load_kW / feeder_capacity_kW)
 
+def coincidence_factor(num_buildings, g_inf=0.2):
+    """
+    Simultaneity of the individual building peaks:
+      g(n) = g_inf + (1 - g_inf) / sqrt(n)
+    One building coincides with itself (g=1); many buildings tend to g_inf.
+    """
+    if num_buildings <= 0:
+        return 1.0
+    return g_inf + (1.0 - g_inf) / math.sqrt(num_buildings)
+
+
+def aggregate_buildings(buildings_csv, keep_arrays=False):
+    """
+    Single streaming pass over the buildings CSV. Never holds the rows in memory.
+    Returns a dict:
+      {
+        "num_buildings": int,
+        "min_lat", "max_lat", "min_lon", "max_lon": bounds,
+        "total_load_kW": sum of peak_load_kW,
+        "max_building_load_kW": largest single peak,
+        "coincident_load_kW": total_load_kW * coincidence_factor(num_buildings),
+        "lat", "lon", "load_kW": NumPy arrays (only if keep_arrays=True)
+      }
+    With keep_arrays=True only three float64 values per building are kept
+    (~24 MB per million buildings).
+    """
+    lat_arr, lon_arr, load_arr = array("d"), array("d"), array("d")
+
+    with open(buildings_csv, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        i_lat = header.index("lat")
+        i_lon = header.index("lon")
+        i_load = header.index("peak_load_kW") if "peak_load_kW" in header else None
+
+        n = 0
+        min_lat = min_lon = math.inf
+        max_lat = max_lon = -math.inf
+        total = 0.0
+        peak = 0.0
+        for row in reader:
+            if not row:
+                continue
+            lat = float(row[i_lat])
+            lon = float(row[i_lon])
+            load = float(row[i_load] or 0) if i_load is not None else 0.0
+            n += 1
+            if lat < min_lat:
+                min_lat = lat
+            if lat > max_lat:
+                max_lat = lat
+            if lon < min_lon:
+                min_lon = lon
+            if lon > max_lon:
+                max_lon = lon
+            total += load
+            if load > peak:
+                peak = load
+            if keep_arrays:
+                lat_arr.append(lat)
+                lon_arr.append(lon)
+                load_arr.append(load)
+
+    stats = {
+        "num_buildings": n,
+        "min_lat": min_lat, "max_lat": max_lat,
+        "min_lon": min_lon, "max_lon": max_lon,
+        "total_load_kW": total,
+        "max_building_load_kW": peak,
+        "coincident_load_kW": total * coincidence_factor(n),
+    }
+    if keep_arrays:
+        stats["lat"] = np.frombuffer(lat_arr, dtype=float)
+        stats["lon"] = np.frombuffer(lon_arr, dtype=float)
+        stats["load_kW"] = np.frombuffer(load_arr, dtype=float)
+    return stats
+
+
+def _nearest_center(points, centers, chunk_size=65536):
+    """
+    Index of (and squared distance to) the nearest center for every point,
+    computed in chunks so the (points x centers) matrix stays small.
+    """
+    labels = np.empty(len(points), dtype=np.int64)
+    d2_min = np.empty(len(points))
+    c2 = (centers ** 2).sum(axis=1)
+    for start in range(0, len(points), chunk_size):
+        p = points[start:start + chunk_size]
+        d2 = (p ** 2).sum(axis=1)[:, None] + c2[None, :] - 2.0 * p @ centers.T
+        lab = d2.argmin(axis=1)
+        labels[start:start + chunk_size] = lab
+        d2_min[start:start + chunk_size] = np.maximum(d2[np.arange(len(p)), lab], 0.0)
+    return labels, d2_min
+
+
+def _kmeans_plus_plus(points, weights, k, rng, sample_size=20000):
+    """
+    Weighted k-means++ seeding on a random sample of the points.
+    """
+    n = len(points)
+    idx = rng.choice(n, size=min(n, sample_size), replace=False) if n > sample_size else np.arange(n)
+    sample = points[idx]
+    w = weights[idx]
+
+    centers = np.empty((k, 2))
+    # a sample without weight falls back to uniform sampling
+    w_total = w.sum()
+    centers[0] = sample[rng.choice(len(sample), p=w / w_total) if w_total > 0
+                        else rng.integers(len(sample))]
+    d2 = ((sample - centers[0]) ** 2).sum(axis=1)
+    for j in range(1, k):
+        prob = d2 * w
+        total = prob.sum()
+        pick = rng.choice(len(sample), p=prob / total) if total > 0 else rng.integers(len(sample))
+        centers[j] = sample[pick]
+        d2 = np.minimum(d2, ((sample - centers[j]) ** 2).sum(axis=1))
+    return centers
+
+
+def minibatch_kmeans(points, k, weights=None, batch_size=2048, max_iter=200,
+                     tol=1e-4, seed=None):
+    """
+    Vectorized (weighted) mini-batch k-means.
+
+    :param points: (n, 2) array of projected coordinates
+    :param k: number of clusters
+    :param weights: optional (n,) non-negative weights (e.g. peak_load_kW)
+    :param batch_size: points drawn per iteration
+    :param max_iter: upper bound on mini-batch iterations
+    :param tol: stop when no center moves more than this (same unit as points)
+    :param seed: random seed
+    :return: (centers (k, 2), labels (n,))
+
+    Each iteration moves every center towards the weighted mean of its batch
+    members with a per-center learning rate 1/accumulated weight (Sculley, 2010).
+    A final full Lloyd step over all points, done in chunks, sets the
+    centers to the exact weighted centroids of their clusters.
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n == 0:
+        raise ValueError("minibatch_kmeans needs at least one point.")
+    k = min(k, n)
+    if weights is None or np.sum(weights) <= 0:
+        weights = np.ones(n)
+    weights = np.asarray(weights, dtype=float)
+    rng = np.random.default_rng(seed)
+
+    centers = _kmeans_plus_plus(points, weights, k, rng)
+    counts = np.zeros(k)
+    for _ in range(max_iter):
+        b = rng.integers(0, n, size=min(batch_size, n))
+        xb = points[b]
+        wb = weights[b]
+        lab, _ = _nearest_center(xb, centers)
+        w_sum = np.bincount(lab, weights=wb, minlength=k)
+        x_sum = np.column_stack([np.bincount(lab, weights=wb * xb[:, d], minlength=k)
+                                 for d in range(2)])
+        upd = w_sum > 0
+        new_counts = counts + w_sum
+        old = centers.copy()
+        centers[upd] = (centers[upd] * counts[upd, None] + x_sum[upd]) / new_counts[upd, None]
+        counts = new_counts
+        if np.abs(centers - old).max() < tol:
+            break
+
+    # final Lloyd step over all points
+    labels, _ = _nearest_center(points, centers)
+    w_sum = np.bincount(labels, weights=weights, minlength=k)
+    x_sum = np.column_stack([np.bincount(labels, weights=weights * points[:, d], minlength=k)
+                             for d in range(2)])
+    filled = w_sum > 0
+    centers[filled] = x_sum[filled] / w_sum[filled, None]
+    labels, _ = _nearest_center(points, centers)
+    return centers, labels
+
+
+def split_oversized_clusters(points, loads, labels, feeder_capacity_kW,
+                             weights=None, g_inf=0.2, max_depth=16, seed=None):
+    """
+    Recursively bisects (2-means) every cluster whose coincident load
+    exceeds 'feeder_capacity_kW', until all clusters fit or are single buildings.
+
+    :param points: (n, 2) projected coordinates
+    :param loads: (n,) peak load per building in kW
+    :param labels: (n,) initial cluster label per building
+    :param weights: optional clustering weights (default: unweighted)
+    :return: (centers (m, 2), labels (n,)) with m >= number of input clusters
+    """
+    final_groups = []
+    stack = [(np.nonzero(labels == c)[0], 0) for c in np.unique(labels)]
+    while stack:
+        idx, depth = stack.pop()
+        group_load = loads[idx].sum() * coincidence_factor(len(idx), g_inf)
+        if group_load <= feeder_capacity_kW or len(idx) < 2 or depth >= max_depth:
+            final_groups.append(idx)
+            continue
+        w = None if weights is None else weights[idx]
+        _, sub = minibatch_kmeans(points[idx], 2, weights=w, seed=seed)
+        if sub.min() == sub.max():
+            # identical points cannot be separated
+            final_groups.append(idx)
+            continue
+        stack.append((idx[sub == 0], depth + 1))
+        stack.append((idx[sub == 1], depth + 1))
+
+    new_labels = np.empty(len(points), dtype=np.int64)
+    centers = np.empty((len(final_groups), 2))
+    for c, idx in enumerate(final_groups):
+        new_labels[idx] = c
+        w = np.ones(len(idx)) if weights is None or weights[idx].sum() <= 0 else weights[idx]
+        centers[c] = (points[idx] * w[:, None]).sum(axis=0) / w.sum()
+    return centers, new_labels
+
+
 def determine_feeders(
     buildings_csv="buildings.csv",
     feeders_csv="feeders.csv",
     buildings_per_feeder=50,
     placement_mode="random_in_bounding_box",
     lat_buffer=0.01,
-    lon_buffer=0.01
+    lon_buffer=0.01,
+    weight_by_load=False,
+    random_seed=None,
+    sizing_mode="count",
+    feeder_capacity_kW=2000,
+    split_oversized=False
 ):
     """
     1) Reads 'buildings_csv' to find how many buildings (and optionally min/max lat/lon).
-    2) Calculates how many feeders are needed (simple ratio).
+    2) Calculates how many feeders are needed (simple ratio or coincident load vs. capacity).
     3) For each feeder, picks lat/lon either randomly in the bounding box
        or uses a simple pattern. 
     4) Writes 'feeders_csv' with columns: feeder_id, lat, lon
@@ -48,60 +281,90 @@ def determine_feeders(
     :param buildings_csv: path to buildings data (must have lat, lon columns)
     :param feeders_csv: output CSV with feeder_id, lat, lon
     :param buildings_per_feeder: ratio for feeder count
-    :param placement_mode: "random_in_bounding_box" or "center" or any custom approach
+    :param placement_mode: "random_in_bounding_box", "kmeans" or "center" / any custom approach.
+        "kmeans" clusters the building coordinates with minibatch_kmeans and puts
+        one feeder at each cluster centroid, so feeders serve compact, balanced areas.
     :param lat_buffer, lon_buffer: extra padding around building bounding box
+        (not used by "kmeans")
+    :param weight_by_load: for "kmeans", weight buildings by peak_load_kW
+    :param random_seed: for "kmeans", seed of the clustering
+    :param sizing_mode: "count" (buildings_per_feeder) or "load": enough feeders
+        for the coincident peak load at 'feeder_capacity_kW' each
+    :param feeder_capacity_kW: capacity per feeder for sizing_mode="load"
+        and for split_oversized
+    :param split_oversized: for "kmeans", recursively bisect clusters whose
+        coincident load exceeds feeder_capacity_kW (adds feeders); other
+        placement modes have no clusters and raise ValueError
     """
+    if split_oversized and placement_mode != "kmeans":
+        raise ValueError(f"split_oversized needs placement_mode='kmeans' (got '{placement_mode}').")
+
     # 1) Load building data
     if not os.path.exists(buildings_csv):
         raise FileNotFoundError(f"Cannot find buildings file: {buildings_csv}")
 
-    with open(buildings_csv, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        buildings = list(reader)
+    # single streaming pass; coordinates are only kept for clustering
+    agg = aggregate_buildings(buildings_csv, keep_arrays=(placement_mode == "kmeans"))
 
-    num_buildings = len(buildings)
+    num_buildings = agg["num_buildings"]
     if num_buildings < 1:
         raise ValueError("No buildings found in the CSV. Cannot determine feeders.")
 
-    # gather lat/lon min/max
-    lat_values = []
-    lon_values = []
-    total_load = 0.0
-    for b in buildings:
-        lat_values.append(float(b["lat"]))
-        lon_values.append(float(b["lon"]))
-        # optionally gather load if you prefer a load-based approach
-        if "peak_load_kW" in b:
-            total_load += float(b["peak_load_kW"])
-
-    min_lat, max_lat = min(lat_values), max(lat_values)
-    min_lon, max_lon = min(lon_values), max(lon_values)
+    min_lat, max_lat = agg["min_lat"], agg["max_lat"]
+    min_lon, max_lon = agg["min_lon"], agg["max_lon"]
 
     # 2) Decide feeder count
-    feeders_needed = get_num_feeders_simple(num_buildings, buildings_per_feeder)
-    # (Or we could do get_num_feeders_by_load(total_load, feeder_capacity_kW=2000))
+    if sizing_mode == "load":
+        feeders_needed = max(1, get_num_feeders_by_load(agg["coincident_load_kW"], feeder_capacity_kW))
+        print(f"[determine_num_feeders] Coincident load {agg['coincident_load_kW']:.1f} kW "
+              f"(sum of peaks {agg['total_load_kW']:.1f} kW) at {feeder_capacity_kW} kW per feeder.")
+    else:
+        feeders_needed = get_num_feeders_simple(num_buildings, buildings_per_feeder)
 
     # 3) Place feeders
     # We'll store them in a list of dict: { "feeder_id": ..., "lat": ..., "lon": ... }
     feeder_list = []
-    for i in range(feeders_needed):
-        fid = f"Feeder{i+1}"
-        if placement_mode == "random_in_bounding_box":
-            # pick random lat/lon in [min_lat - lat_buffer, max_lat + lat_buffer], etc.
-            feeder_lat = random.uniform(min_lat - lat_buffer, max_lat + lat_buffer)
-            feeder_lon = random.uniform(min_lon - lon_buffer, max_lon + lon_buffer)
-        else:
-            # fallback: center or other approach
-            # e.g., place them evenly spaced across bounding box
-            frac = (i+1)/(feeders_needed+1)  # fraction in [1/(N+1), ..., N/(N+1)]
-            feeder_lat = (1-frac)*(min_lat - lat_buffer) + frac*(max_lat + lat_buffer)
-            feeder_lon = (1-frac)*(min_lon - lon_buffer) + frac*(max_lon + lon_buffer)
-
-        feeder_list.append({
-            "feeder_id": fid,
-            "lat": round(feeder_lat, 6),
-            "lon": round(feeder_lon, 6)
-        })
+    if placement_mode == "kmeans":
+        lat_arr = agg["lat"]
+        lon_arr = agg["lon"]
+        ref_lat, ref_lon = float(lat_arr.mean()), float(lon_arr.mean())
+        points = project_local_km(lat_arr, lon_arr, ref_lat, ref_lon)
+        weights = agg["load_kW"] if weight_by_load else None
+        centers, labels = minibatch_kmeans(points, feeders_needed, weights=weights, seed=random_seed)
+        if split_oversized:
+            centers, labels = split_oversized_clusters(
+                points, agg["load_kW"], labels, feeder_capacity_kW,
+                weights=weights, seed=random_seed)
+        c_lat, c_lon = unproject_local_km(centers, ref_lat, ref_lon)
+        for i in range(len(centers)):
+            feeder_list.append({
+                "feeder_id": f"Feeder{i+1}",
+                "lat": round(float(c_lat[i]), 6),
+                "lon": round(float(c_lon[i]), 6)
+            })
+        sizes = np.bincount(labels, minlength=len(centers))
+        print(f"[determine_num_feeders] k-means clusters: buildings per feeder "
+              f"min={sizes.min()}, max={sizes.max()}, mean={sizes.mean():.1f}")
+        feeders_needed = len(feeder_list)
+    else:
+        for i in range(feeders_needed):
+            fid = f"Feeder{i+1}"
+            if placement_mode == "random_in_bounding_box":
+                # pick random lat/lon in [min_lat - lat_buffer, max_lat + lat_buffer], etc.
+                feeder_lat = random.uniform(min_lat - lat_buffer, max_lat + lat_buffer)
+                feeder_lon = random.uniform(min_lon - lon_buffer, max_lon + lon_buffer)
+            else:
+                # fallback: center or other approach
+                # e.g., place them evenly spaced across bounding box
+                frac = (i+1)/(feeders_needed+1)  # fraction in [1/(N+1), ..., N/(N+1)]
+                feeder_lat = (1-frac)*(min_lat - lat_buffer) + frac*(max_lat + lat_buffer)
+                feeder_lon = (1-frac)*(min_lon - lon_buffer) + frac*(max_lon + lon_buffer)
+
+            feeder_list.append({
+                "feeder_id": fid,
+                "lat": round(feeder_lat, 6),
+                "lon": round(feeder_lon, 6)
+            })
 
     # 4) Write feeders.csv
     with open(feeders_csv, "w", newline="", encoding="utf-8") as f:
@@ -10,16 +10,31 @@ We assume:
   - buildings_demo.csv has columns [building_id, lat, lon, building_type, peak_load_kW, ...]
   - lines_demo.csv has columns [line_id, from_id, to_id, length_km, voltage_level, ...]
   - building_assignments.csv has columns [building_id, line_id, distance_km, ...]
-  - node_locations: a dict { node_id: (lat, lon) } for from_id/to_id references in lines_demo.csv
+  - node_locations: a dict { node_id: (lat, lon) } for from_id/to_id references in lines_demo.csv,
+    or a node table path (node_table.py); None uses the table next to the lines CSV
 
-Dependencies: None beyond Python stdlib. We'll produce standard GeoJSON FeatureCollections.
+Dependencies: None beyond Python stdlib (export_results_geojson also uses
+time_series_outputs.py, which needs NumPy). We'll produce standard GeoJSON FeatureCollections.
+
+The export_* functions build the whole FeatureCollection in memory and pretty-print it.
+For large inputs use the stream_* functions instead: they read the CSVs row by row,
+write each feature as soon as it is built (compact separators) and can also emit
+newline-delimited GeoJSON (one Feature per line), so memory stays constant.
+
+export_results_geojson adds time-series power flow results (time_series_long.csv,
+or a gzip-compressed time_series_long.csv.gz) to the building points and line
+strings: min/max voltage per building, peak current, max loading and hours above
+the loading limit per line.
 """
 
 import csv
+import gzip
 import json
 import math
 import os
 
+from node_table import resolve_node_locations
+
 def load_csv_as_list_of_dict(csv_path):
     with open(csv_path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
@@ -70,18 +85,20 @@ def export_buildings_geojson(buildings_csv, output_geojson="buildings_demo.geojs
     print(f"[export_buildings_geojson] Created '{output_geojson}' with {len(features)} features.")
 
 
-def export_lines_geojson(lines_csv, node_locations, output_geojson="lines_demo.geojson"):
+def export_lines_geojson(lines_csv, node_locations=None, output_geojson="lines_demo.geojson"):
     """
     Converts lines_demo.csv to a GeoJSON FeatureCollection of LineStrings,
     using 'node_locations' to find lat/lon for from_id and to_id.
 
     lines_csv columns: [line_id, from_id, to_id, length_km, voltage_level, ...]
-    node_locations: dict { "Feeder1": (lat, lon), ... }
+    node_locations: dict { "Feeder1": (lat, lon), ... }, a node table path,
+                    or None for the node table next to lines_csv
     """
     if not os.path.exists(lines_csv):
         print(f"[export_lines_geojson] File not found: {lines_csv}")
         return
 
+    node_locations = resolve_node_locations(node_locations, lines_csv)
     lines = load_csv_as_list_of_dict(lines_csv)
 
     features = []
@@ -212,27 +229,348 @@ def export_building_assignments_geojson(buildings_csv, assignments_csv,
         print(f"[export_building_assignments_geojson] WARNING: {missing_count} buildings not found in CSV.")
 
 
+# ---------------------------------------------------------------------------
+# Streaming writers
+# ---------------------------------------------------------------------------
+
+class GeoJSONStreamWriter:
+    """
+    Writes Features one at a time, either inside a FeatureCollection
+    or as newline-delimited GeoJSON (ndjson=True, one Feature per line).
+
+        with GeoJSONStreamWriter("out.geojson") as w:
+            for feat in features:
+                w.write(feat)
+
+    The features go to '<output_path>.tmp', which close() renames over
+    output_path. If the 'with' block raises (or abort() is called), the temp file
+    is removed and output_path is left as it was, never a truncated collection.
+    """
+
+    def __init__(self, output_path, ndjson=False):
+        self.output_path = output_path
+        self.ndjson = ndjson
+        self.count = 0
+        self._encode = json.JSONEncoder(separators=(",", ":")).encode
+        self._tmp_path = output_path + ".tmp"
+        self._f = open(self._tmp_path, "w", encoding="utf-8")
+        if not ndjson:
+            self._f.write('{"type":"FeatureCollection","features":[\n')
+
+    def write(self, feature):
+        if self.ndjson:
+            self._f.write(self._encode(feature))
+            self._f.write("\n")
+        else:
+            if self.count:
+                self._f.write(",\n")
+            self._f.write(self._encode(feature))
+        self.count += 1
+
+    def close(self):
+        if self._f.closed:
+            return
+        if not self.ndjson:
+            self._f.write("\n]}\n")
+        self._f.close()
+        os.replace(self._tmp_path, self.output_path)
+
+    def abort(self):
+        """Discards everything written (output_path is not touched)."""
+        if self._f.closed:
+            return
+        self._f.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def iter_csv_rows(csv_path):
+    """
+    Yields the rows of a CSV as dicts without loading the whole file
+    (gzip-compressed if the path ends in '.gz').
+    """
+    opener = gzip.open if csv_path.endswith(".gz") else open
+    with opener(csv_path, "rt", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def _building_point(b, props):
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(b.get("lon", 0)), float(b.get("lat", 0))]  # [lon, lat]
+        },
+        "properties": props
+    }
+
+
+def iter_building_features(buildings_csv):
+    """
+    Yields one Point Feature per building row (same properties as export_buildings_geojson).
+    """
+    for b in iter_csv_rows(buildings_csv):
+        yield _building_point(b, {
+            "building_id": b.get("building_id", "Unknown"),
+            "building_type": b.get("building_type", ""),
+            "peak_load_kW": b.get("peak_load_kW", "")
+        })
+
+
+def iter_line_features(lines_csv, node_locations=None, stats=None):
+    """
+    Yields one LineString Feature per line row whose end nodes are in node_locations
+    (dict, node table path, or None for the node table next to lines_csv).
+    If a dict 'stats' is given, stats["missing"] counts the skipped lines.
+    """
+    node_locations = resolve_node_locations(node_locations, lines_csv)
+    missing = 0
+    for ln in iter_csv_rows(lines_csv):
+        from_id = ln.get("from_id", "")
+        to_id = ln.get("to_id", "")
+        if from_id not in node_locations or to_id not in node_locations:
+            missing += 1
+            continue
+        lat1, lon1 = node_locations[from_id]
+        lat2, lon2 = node_locations[to_id]
+        yield {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[lon1, lat1], [lon2, lat2]]
+            },
+            "properties": {
+                "line_id": ln.get("line_id", "Unknown"),
+                "from_id": from_id,
+                "to_id": to_id,
+                "length_km": ln.get("length_km", ""),
+                "voltage_level": ln.get("voltage_level", "")
+            }
+        }
+    if stats is not None:
+        stats["missing"] = missing
+
+
+def iter_assignment_features(buildings_csv, assignments_csv, stats=None):
+    """
+    Yields building Point Features merged with their assignment
+    (same properties as export_building_assignments_geojson).
+
+    Both CSVs are streamed. assign_buildings writes assignments in building order,
+    so rows normally match one-to-one; out-of-order rows wait in small hash tables
+    until their partner shows up, so memory only grows with the misalignment.
+    If a dict 'stats' is given, stats["missing"] counts assignments without a building.
+    """
+    buildings = iter_csv_rows(buildings_csv)
+    pending_buildings = {}
+    missing = 0
+
+    for asg in iter_csv_rows(assignments_csv):
+        b_id = asg.get("building_id", "")
+        b = pending_buildings.pop(b_id, None)
+        while b is None:
+            row = next(buildings, None)
+            if row is None:
+                break
+            if row.get("building_id", "") == b_id:
+                b = row
+            else:
+                pending_buildings[row.get("building_id", "")] = row
+        if b is None:
+            missing += 1
+            continue
+
+        yield _building_point(b, {
+            "building_id": b_id,
+            "assigned_line_id": asg.get("line_id", ""),
+            "distance_km": asg.get("distance_km", ""),
+            "building_type": b.get("building_type", ""),
+            "peak_load_kW": b.get("peak_load_kW", "")
+        })
+    if stats is not None:
+        stats["missing"] = missing
+
+
+def stream_buildings_geojson(buildings_csv, output_geojson="buildings_demo.geojson", ndjson=False):
+    """
+    Streaming version of export_buildings_geojson. Returns the number of features.
+    """
+    if not os.path.exists(buildings_csv):
+        print(f"[stream_buildings_geojson] File not found: {buildings_csv}")
+        return 0
+    with GeoJSONStreamWriter(output_geojson, ndjson=ndjson) as w:
+        for feat in iter_building_features(buildings_csv):
+            w.write(feat)
+    print(f"[stream_buildings_geojson] Created '{output_geojson}' with {w.count} features.")
+    return w.count
+
+
+def stream_lines_geojson(lines_csv, node_locations=None, output_geojson="lines_demo.geojson",
+                         ndjson=False):
+    """
+    Streaming version of export_lines_geojson. Returns the number of features.
+    """
+    if not os.path.exists(lines_csv):
+        print(f"[stream_lines_geojson] File not found: {lines_csv}")
+        return 0
+    stats = {}
+    with GeoJSONStreamWriter(output_geojson, ndjson=ndjson) as w:
+        for feat in iter_line_features(lines_csv, node_locations, stats):
+            w.write(feat)
+    print(f"[stream_lines_geojson] Created '{output_geojson}' with {w.count} line features.")
+    if stats.get("missing"):
+        print(f"[stream_lines_geojson] WARNING: {stats['missing']} lines missing node_locations.")
+    return w.count
+
+
+def stream_building_assignments_geojson(buildings_csv, assignments_csv,
+                                        output_geojson="assignments_demo.geojson",
+                                        ndjson=False):
+    """
+    Streaming version of export_building_assignments_geojson. Returns the number of features.
+    """
+    for path in (buildings_csv, assignments_csv):
+        if not os.path.exists(path):
+            print(f"[stream_building_assignments_geojson] File not found: {path}")
+            return 0
+    stats = {}
+    with GeoJSONStreamWriter(output_geojson, ndjson=ndjson) as w:
+        for feat in iter_assignment_features(buildings_csv, assignments_csv, stats):
+            w.write(feat)
+    print(f"[stream_building_assignments_geojson] Created '{output_geojson}' with {w.count} features.")
+    if stats.get("missing"):
+        print(f"[stream_building_assignments_geojson] WARNING: {stats['missing']} buildings not found in CSV.")
+    return w.count
+
+
+# ---------------------------------------------------------------------------
+# Result-enriched export
+# ---------------------------------------------------------------------------
+
+def aggregate_time_series_results(ts_long_csv, step_hours=None, loading_limit=100.0):
+    """
+    One streaming pass over a LONG time-series result CSV (time_series_runner_long.py),
+    plain or '.gz'.
+    Returns (node_stats, line_stats):
+      node_stats[entity_id] = {"v_min_pu": ..., "v_max_pu": ...}
+      line_stats[line_id]   = {"peak_current_a": ..., "max_loading_percent": ...,
+                               "hours_over_limit": ...}
+    'hours_over_limit' counts steps with loading_percent > loading_limit, times step_hours;
+    step_hours=None derives the step length from the first two time_step labels
+    (time_series_outputs.step_hours_from_labels).
+    """
+    from time_series_outputs import step_hours_from_labels
+
+    node_stats = {}
+    line_stats = {}
+    first_labels = []
+    for row in iter_csv_rows(ts_long_csv):
+        if len(first_labels) < 2 and row.get("time_step") not in first_labels:
+            first_labels.append(row.get("time_step"))
+        if row.get("record_type") == "line":
+            l_id = row.get("line_id", "")
+            if not l_id or row.get("i_from_a", "") == "":
+                continue
+            i_a = float(row["i_from_a"])
+            load_pct = float(row.get("loading_percent") or 0.0)
+            st = line_stats.get(l_id)
+            if st is None:
+                st = line_stats[l_id] = {"peak_current_a": i_a,
+                                         "max_loading_percent": load_pct,
+                                         "hours_over_limit": 0}
+            else:
+                if i_a > st["peak_current_a"]:
+                    st["peak_current_a"] = i_a
+                if load_pct > st["max_loading_percent"]:
+                    st["max_loading_percent"] = load_pct
+            if load_pct > loading_limit:
+                st["hours_over_limit"] += 1  # steps, converted to hours below
+        else:
+            e_id = row.get("entity_id", "")
+            if not e_id or row.get("voltage_pu", "") == "":
+                continue
+            v = float(row["voltage_pu"])
+            st = node_stats.get(e_id)
+            if st is None:
+                node_stats[e_id] = {"v_min_pu": v, "v_max_pu": v}
+            else:
+                if v < st["v_min_pu"]:
+                    st["v_min_pu"] = v
+                if v > st["v_max_pu"]:
+                    st["v_max_pu"] = v
+
+    if step_hours is None:
+        step_hours = step_hours_from_labels(first_labels)
+    for st in line_stats.values():
+        st["hours_over_limit"] *= step_hours
+    return node_stats, line_stats
+
+
+def export_results_geojson(buildings_csv, lines_csv, node_locations, ts_long_csv,
+                           buildings_output="buildings_results.geojson",
+                           lines_output="lines_results.geojson",
+                           step_hours=None, loading_limit=100.0, ndjson=False):
+    """
+    Writes building points and line strings enriched with time-series results,
+    ready for violation maps:
+      buildings: v_min_pu, v_max_pu
+      lines:     peak_current_a, max_loading_percent, hours_over_limit
+
+    The results are aggregated per entity in one pass over ts_long_csv (plain
+    or '.gz'; step_hours=None takes the step length from its time labels); the
+    features are then streamed and joined by dict lookup (hash join).
+    node_locations is passed to iter_line_features (dict, node table path or None).
+    Entities without results get null properties.
+    Returns (number of building features, number of line features).
+    """
+    if not os.path.exists(ts_long_csv):
+        print(f"[export_results_geojson] File not found: {ts_long_csv}")
+        return 0, 0
+    node_stats, line_stats = aggregate_time_series_results(
+        ts_long_csv, step_hours=step_hours, loading_limit=loading_limit)
+
+    n_buildings = 0
+    if os.path.exists(buildings_csv):
+        empty = {"v_min_pu": None, "v_max_pu": None}
+        with GeoJSONStreamWriter(buildings_output, ndjson=ndjson) as w:
+            for feat in iter_building_features(buildings_csv):
+                feat["properties"].update(node_stats.get(feat["properties"]["building_id"], empty))
+                w.write(feat)
+        n_buildings = w.count
+        print(f"[export_results_geojson] Created '{buildings_output}' with {n_buildings} features.")
+
+    n_lines = 0
+    if os.path.exists(lines_csv):
+        empty = {"peak_current_a": None, "max_loading_percent": None, "hours_over_limit": None}
+        with GeoJSONStreamWriter(lines_output, ndjson=ndjson) as w:
+            for feat in iter_line_features(lines_csv, node_locations):
+                feat["properties"].update(line_stats.get(feat["properties"]["line_id"], empty))
+                w.write(feat)
+        n_lines = w.count
+        print(f"[export_results_geojson] Created '{lines_output}' with {n_lines} line features.")
+
+    return n_buildings, n_lines
+
+
 if __name__ == "__main__":
     """
     Example usage:
-      1) We'll define a node_locations for lines (substation, feeders, etc.)
+      1) Line coordinates come from the node table written by create_mv_lv_lines.py
+         (lines_demo_nodes.csv)
       2) We'll export lines_demo.csv -> lines_demo.geojson
       3) We'll export buildings_demo.csv -> buildings_demo.geojson
       4) We'll export building_assignments.csv -> assignments_demo.geojson
     """
-    # 1) Suppose we have the same node_locations as in main.py
-    node_locations = {
-        "MainSubstation": (40.150, -3.550),
-        "Feeder1": (40.160, -3.555),
-        "Feeder1_LVbranch_1": (40.161, -3.556),
-        "Feeder1_LVbranch_2": (40.162, -3.557),
-        "Feeder2": (40.170, -3.560),
-        "Feeder2_LVbranch_1": (40.171, -3.561),
-        "Feeder2_LVbranch_2": (40.172, -3.562)
-    }
-
-    # 2) Export lines
-    export_lines_geojson("lines_demo.csv", node_locations, "lines_demo.geojson")
+    # 1) + 2) Export lines, with node coordinates from the node table
+    export_lines_geojson("lines_demo.csv", None, "lines_demo.geojson")
 
     # 3) Export buildings
     export_buildings_geojson("buildings_demo.csv", "buildings_demo.geojson")
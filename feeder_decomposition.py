@@ -0,0 +1,207 @@
+"""
+feeder_decomposition.py
+
+Solves one large radial snapshot feeder by feeder, in parallel.
+
+With the source voltage fixed, every subtree hanging off a source node (in
+build_network_model's networks: every feeder behind its MV line from
+MainSubstation) is independent of the others. So we:
+  1) find the feeder head of every node (its ancestor directly below a source)
+  2) group the feeders into 'parts' of similar node count (largest first,
+     each into the currently smallest part)
+  3) cut one sub-network per part: the source node(s) plus the part's feeder
+     subtrees, with their lines, links and loads (loads at the source node
+     itself are left out, they do not affect any feeder)
+  4) run the backward/forward sweep of power_flow_solver on every part in a
+     process pool
+  5) merge the per-part results into one 'sym_output' in input order; the
+     source injection is the sum over all parts plus its local loads
+
+Results match run_power_flow_sweep within the solver tolerance; 'iterations'
+is the maximum over the parts and 'converged' is True only if all converged.
+
+Requires:
+  pip install numpy
+"""
+
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from power_flow_solver import (_input_to_arrays, _result_arrays_to_sym_output, _sweep,
+                               _sweep_result_arrays)
+from topology_cache import get_topology, node_index
+
+_NODE_FIELDS = ("node_u_pu", "node_u", "node_u_angle", "node_p", "node_q")
+_LINE_FIELDS = ("line_i_a", "line_p_from", "line_loading")
+
+
+def feeder_heads(topology):
+    """
+    For every node position, the position of its feeder head (the ancestor at
+    depth 1). Sources and nodes not reached from a source get -1.
+    """
+    parent = topology["parent"]
+    levels = topology["levels"]
+    head = np.full(topology["n_nodes"], -1, dtype=np.int64)
+    if len(levels) > 1:
+        head[levels[1]] = levels[1]
+    for lvl in levels[2:]:
+        head[lvl] = head[parent[lvl]]
+    return head
+
+
+def partition_feeders(topology, n_parts):
+    """
+    Groups the feeder heads into at most 'n_parts' parts of similar node count.
+    Returns (part of every node position or -1, number of parts).
+    """
+    head = feeder_heads(topology)
+    in_feeder = head >= 0
+    heads, sizes = np.unique(head[in_feeder], return_counts=True)
+    n_parts = max(1, min(n_parts, len(heads)))
+
+    part_of_head = np.full(topology["n_nodes"], -1, dtype=np.int64)
+    bins = [(0, p) for p in range(n_parts)]
+    for k in np.argsort(-sizes, kind="stable").tolist():
+        load, p = heapq.heappop(bins)
+        part_of_head[heads[k]] = p
+        heapq.heappush(bins, (load + int(sizes[k]), p))
+
+    part = np.full(topology["n_nodes"], -1, dtype=np.int64)
+    part[in_feeder] = part_of_head[head[in_feeder]]
+    return part, n_parts
+
+
+def _cut_part(arrays, topology, part, p, positions):
+    """
+    Component arrays of part 'p' plus the selections needed to merge it back:
+    (sub_arrays, node positions, selected lines, selected loads).
+    'positions' holds the node positions of every branch end, source and load.
+    """
+    parent = topology["parent"]
+    members = np.nonzero(part == p)[0]
+    heads = members[topology["depth"][members] == 1]
+    roots = np.unique(parent[heads])
+    node_pos = np.concatenate([roots, members])
+
+    in_part = np.zeros(topology["n_nodes"], dtype=bool)
+    in_part[node_pos] = True
+    is_member = part == p
+
+    line_sel = np.nonzero(in_part[positions["line_from"]] & in_part[positions["line_to"]])[0]
+    link_sel = np.nonzero(in_part[positions["link_from"]] & in_part[positions["link_to"]])[0]
+    source_sel = np.nonzero(np.isin(positions["source"], roots))[0]
+    load_sel = np.nonzero(is_member[positions["load"]])[0]
+
+    sub = {
+        "node_id": arrays["node_id"][node_pos],
+        "u_rated": arrays["u_rated"][node_pos],
+        "source_node": arrays["source_node"][source_sel],
+        "source_u_ref": arrays["source_u_ref"][source_sel],
+    }
+    for key in ("line_id", "line_from", "line_to", "line_r1", "line_x1", "line_i_n"):
+        sub[key] = arrays[key][line_sel]
+    for key in ("link_id", "link_from", "link_to"):
+        sub[key] = arrays[key][link_sel]
+    for key in ("load_id", "load_node", "load_p", "load_q"):
+        sub[key] = arrays[key][load_sel]
+    return sub, node_pos, line_sel, load_sel
+
+
+def _solve_part(sub_arrays, tol, max_iter, cache_dir):
+    """
+    Sweep on one part (runs in a worker process). Returns (results, iterations, converged).
+    """
+    topology, _ = get_topology(sub_arrays, cache_dir=cache_dir)
+    u_ref = sub_arrays["source_u_ref"][0] if len(sub_arrays["source_u_ref"]) else 1.0
+    v_init = np.full(topology["n_nodes"], u_ref, dtype=complex)
+    v, i_branch, iterations, converged = _sweep(topology, sub_arrays, v_init, tol=tol, max_iter=max_iter)
+    return _sweep_result_arrays(topology, sub_arrays, v, i_branch), iterations, converged
+
+
+def run_power_flow_by_feeder(input_data, params_data=None, workers=None, parts=None,
+                             cache_dir=None, executor=None):
+    """
+    Feeder-decomposed version of power_flow_solver.run_power_flow_sweep.
+
+    :param input_data: the JSON-style input dict, or component arrays
+        (e.g. json_generator.model_to_solver_arrays)
+    :param params_data: optional {"error_tolerance": ..., "max_iterations": ...}
+    :param workers: processes to use (default: all cores); 1 solves in-process
+    :param parts: number of sub-networks (default 4 per worker, for load balance)
+    :param cache_dir: optional on-disk topology cache, also used by the workers
+    :param executor: optional concurrent.futures executor to reuse across calls
+        (e.g. one per time series); 'workers' then only sets the default 'parts'
+    :return: sym_output dict plus "iterations" and "converged"
+    """
+    params_data = params_data or {}
+    tol = params_data.get("error_tolerance", 1e-8)
+    max_iter = params_data.get("max_iterations", 50)
+    arrays = input_data if "node_id" in input_data else _input_to_arrays(input_data)
+    workers = workers or os.cpu_count() or 1
+    parts = parts or 4 * workers
+
+    topology, _ = get_topology(arrays, cache_dir=cache_dir)
+    part, n_parts = partition_feeders(topology, parts)
+
+    positions = {
+        "line_from": node_index(topology, arrays["line_from"]),
+        "line_to": node_index(topology, arrays["line_to"]),
+        "link_from": node_index(topology, arrays["link_from"]),
+        "link_to": node_index(topology, arrays["link_to"]),
+        "source": node_index(topology, arrays["source_node"]),
+        "load": node_index(topology, arrays["load_node"]),
+    }
+    cuts = [_cut_part(arrays, topology, part, p, positions) for p in range(n_parts)]
+
+    if executor is None and (workers == 1 or n_parts == 1):
+        outcomes = [_solve_part(sub, tol, max_iter, cache_dir) for sub, _, _, _ in cuts]
+    else:
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=min(workers, n_parts))
+        try:
+            futures = [executor.submit(_solve_part, sub, tol, max_iter, cache_dir)
+                       for sub, _, _, _ in cuts]
+            outcomes = [f.result() for f in futures]
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+    # start from the unsolved state: no voltage, loads only; sources at their reference
+    n = topology["n_nodes"]
+    merged = {key: np.zeros(n) for key in _NODE_FIELDS}
+    merged.update({key: np.zeros(len(arrays["line_id"])) for key in _LINE_FIELDS})
+    is_root = np.zeros(n, dtype=bool)
+    is_root[topology["roots"]] = True
+    np.subtract.at(merged["node_p"], positions["load"], arrays["load_p"])
+    np.subtract.at(merged["node_q"], positions["load"], arrays["load_q"])
+    # sources supply their local loads on top of what flows into the feeders
+    merged["node_p"][is_root] *= -1
+    merged["node_q"][is_root] *= -1
+    v_ref = arrays["source_u_ref"].astype(complex)
+    merged["node_u_pu"][positions["source"]] = np.abs(v_ref)
+    merged["node_u"][positions["source"]] = np.abs(v_ref) * arrays["u_rated"][positions["source"]]
+    merged["node_u_angle"][positions["source"]] = np.angle(v_ref)
+
+    iterations = 0
+    converged = True
+    for (sub, node_pos, line_sel, _), (res, it, conv) in zip(cuts, outcomes):
+        iterations = max(iterations, it)
+        converged = converged and conv
+        member = ~is_root[node_pos]
+        for key in _NODE_FIELDS:
+            merged[key][node_pos[member]] = res[key][member]
+        # the source injections of all parts add up
+        np.add.at(merged["node_p"], node_pos[~member], res["node_p"][~member])
+        np.add.at(merged["node_q"], node_pos[~member], res["node_q"][~member])
+        for key in _LINE_FIELDS:
+            merged[key][line_sel] = res[key]
+
+    sym_output = _result_arrays_to_sym_output(arrays, merged)
+    sym_output["iterations"] = iterations
+    sym_output["converged"] = converged
+    return sym_output
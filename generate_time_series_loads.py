@@ -28,6 +28,8 @@ import csv
 import random
 from datetime import datetime, timedelta
 
+from memory_budget import load_generator_building_bytes, peak_rss_mb, plan_chunk
+
 def generate_time_stamps(
     start_time_str="2025-01-01 00:00:00",
     end_time_str="2025-01-01 06:00:00",
@@ -120,7 +122,8 @@ def generate_time_series_loads(
     end_time="2025-01-01 06:00:00",
     step_minutes=15,
     output_csv="time_series_loads.csv",
-    buildings_info=None
+    buildings_info=None,
+    memory_limit=None
 ):
     """
     Creates a CSV with columns: [building_id, Energy, <time_1>, <time_2>, ...].
@@ -136,6 +139,10 @@ def generate_time_series_loads(
     Otherwise, we default to random or 0 as needed.
 
     IMPORTANT: total_electricity = facility + generation + storage
+
+    If 'memory_limit' (bytes, or e.g. "2G", see memory_budget.py) is given, the
+    rows are generated and written in tiles of as many buildings as fit into
+    the budget, instead of holding all rows until the end. The output is the same.
     """
     print(f"[generate_time_series_loads] Generating time-series loads for {len(building_ids)} buildings.")
 
@@ -146,52 +153,69 @@ def generate_time_series_loads(
     # 2) Header
     header = ["building_id","Energy"] + time_stamps
 
-    # 3) Prepare rows
-    rows = []
-
-    for b_id in building_ids:
-        # Determine if building has solar/battery
-        has_solar = False
-        has_battery = False
-        if buildings_info and b_id in buildings_info:
-            has_solar = bool(buildings_info[b_id].get("has_solar", False))
-            has_battery = bool(buildings_info[b_id].get("has_battery", False))
-
-        # First, generate random values for all categories except total_electricity.
-        # We'll store them in a dict so we can compute total_electricity afterward.
-        cat_profiles = {}
-
-        for cat in categories:
-            if cat != "total_electricity":
-                cat_profiles[cat] = generate_random_profile(num_steps, cat, has_solar, has_battery)
-
-        # Compute total_electricity as facility + generation + storage
-        # (only if these categories exist in cat_profiles)
-        total_vals = [0.0]*num_steps
-        if "facility" in cat_profiles and "generation" in cat_profiles and "storage" in cat_profiles:
-            for i in range(num_steps):
-                total_vals[i] = (cat_profiles["facility"][i]
-                                 + cat_profiles["generation"][i]
-                                 + cat_profiles["storage"][i])
-        else:
-            # If any of them is missing, we just leave total_electricity as all zeros
-            pass
-
-        # Now store that into cat_profiles
-        cat_profiles["total_electricity"] = total_vals
-
-        # Finally, write one row per category
-        for cat in categories:
-            row = [b_id, cat] + cat_profiles[cat]
-            rows.append(row)
+    # 3) Prepare rows, one tile of buildings at a time
+    if memory_limit is None:
+        tile_buildings = max(1, len(building_ids))
+    else:
+        tile_buildings = plan_chunk(memory_limit, load_generator_building_bytes(len(categories), num_steps),
+                                    0, max(1, len(building_ids)))
+        print(f"[generate_time_series_loads] memory_limit => {tile_buildings} buildings per tile.")
 
-    # 4) Write CSV
     with open(output_csv, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         writer.writerow(header)
+        rows = []
+        row_count = 0
+
+        for b_id in building_ids:
+            # Determine if building has solar/battery
+            has_solar = False
+            has_battery = False
+            if buildings_info and b_id in buildings_info:
+                has_solar = bool(buildings_info[b_id].get("has_solar", False))
+                has_battery = bool(buildings_info[b_id].get("has_battery", False))
+
+            # First, generate random values for all categories except total_electricity.
+            # We'll store them in a dict so we can compute total_electricity afterward.
+            cat_profiles = {}
+
+            for cat in categories:
+                if cat != "total_electricity":
+                    cat_profiles[cat] = generate_random_profile(num_steps, cat, has_solar, has_battery)
+
+            # Compute total_electricity as facility + generation + storage
+            # (only if these categories exist in cat_profiles)
+            total_vals = [0.0]*num_steps
+            if "facility" in cat_profiles and "generation" in cat_profiles and "storage" in cat_profiles:
+                for i in range(num_steps):
+                    total_vals[i] = (cat_profiles["facility"][i]
+                                     + cat_profiles["generation"][i]
+                                     + cat_profiles["storage"][i])
+            else:
+                # If any of them is missing, we just leave total_electricity as all zeros
+                pass
+
+            # Now store that into cat_profiles
+            cat_profiles["total_electricity"] = total_vals
+
+            # Finally, write one row per category
+            for cat in categories:
+                row = [b_id, cat] + cat_profiles[cat]
+                rows.append(row)
+
+            # 4) Write the CSV rows of a full tile
+            if len(rows) >= tile_buildings * len(categories):
+                writer.writerows(rows)
+                row_count += len(rows)
+                rows = []
+
         writer.writerows(rows)
+        row_count += len(rows)
 
-    print(f"[generate_time_series_loads] Created '{output_csv}' with {len(rows)} rows.")
+    print(f"[generate_time_series_loads] Created '{output_csv}' with {row_count} rows.")
+    peak_mb = peak_rss_mb()
+    if peak_mb is not None:
+        print(f"[generate_time_series_loads] Peak RSS: {peak_mb:.0f} MB")
 
 if __name__ == "__main__":
     # Example usage if run standalone:
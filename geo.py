@@ -0,0 +1,266 @@
+"""
+geo.py
+
+Array versions of the geographic helpers used across the pipeline:
+  - haversine_km: great-circle distances
+  - project_local_km / unproject_local_km: equirectangular projection to a local
+    km grid (accurate enough for city/region-sized areas)
+  - point_segment_distance_km / nearest_segment: point to line segment distances;
+    nearest_segment indexes the segments in a uniform grid so every point is
+    only compared with the segments around it
+
+All functions take scalars or NumPy arrays and follow NumPy broadcasting, so
+callers compute thousands of distances per call instead of one per Python call.
+
+Requires:
+  pip install numpy
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG = math.pi / 180.0 * EARTH_RADIUS_KM
+
+# (points x segments) elements evaluated at once by nearest_segment
+NEAREST_SEGMENT_BLOCK = 1 << 21
+# up to this many point-segment pairs, nearest_segment compares all of them
+NEAREST_SEGMENT_BRUTE_FORCE = 1 << 16
+# segments whose bounding box spans more grid cells are compared with every point
+GRID_MAX_CELLS_PER_SEGMENT = 64
+# a grid candidate is only accepted if it is closer than this fraction of the
+# searched radius (margin for the grid projection vs. per-segment flattening)
+GRID_SAFETY = 0.9
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km between (lat1, lon1) and (lat2, lon2), in degrees.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=float))
+    lon1 = np.radians(np.asarray(lon1, dtype=float))
+    lat2 = np.radians(np.asarray(lat2, dtype=float))
+    lon2 = np.radians(np.asarray(lon2, dtype=float))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def project_local_km(lat, lon, ref_lat, ref_lon):
+    """
+    Equirectangular projection of lat/lon arrays to km around (ref_lat, ref_lon).
+    Returns an (n, 2) array of (x, y).
+    """
+    x = (np.asarray(lon, dtype=float) - ref_lon) * KM_PER_DEG * math.cos(math.radians(ref_lat))
+    y = (np.asarray(lat, dtype=float) - ref_lat) * KM_PER_DEG
+    return np.column_stack([np.ravel(x), np.ravel(y)])
+
+
+def unproject_local_km(xy, ref_lat, ref_lon):
+    """
+    Inverse of project_local_km. Returns (lat, lon) arrays.
+    """
+    xy = np.asarray(xy, dtype=float)
+    lat = xy[:, 1] / KM_PER_DEG + ref_lat
+    lon = xy[:, 0] / (KM_PER_DEG * math.cos(math.radians(ref_lat))) + ref_lon
+    return lat, lon
+
+
+def point_segment_distance_km(p_lat, p_lon, a_lat, a_lon, b_lat, b_lon):
+    """
+    Shortest distance in km from points P to segments A-B. Each segment is
+    flattened around its own midpoint, which is accurate for short segments.
+    """
+    p_lat = np.asarray(p_lat, dtype=float)
+    p_lon = np.asarray(p_lon, dtype=float)
+    a_lat = np.asarray(a_lat, dtype=float)
+    a_lon = np.asarray(a_lon, dtype=float)
+    b_lat = np.asarray(b_lat, dtype=float)
+    b_lon = np.asarray(b_lon, dtype=float)
+
+    mid_lat = (a_lat + b_lat) / 2
+    mid_lon = (a_lon + b_lon) / 2
+    kx = KM_PER_DEG * np.cos(np.radians(mid_lat))
+
+    ax = (a_lon - mid_lon) * kx
+    ay = (a_lat - mid_lat) * KM_PER_DEG
+    dx = (b_lon - a_lon) * kx
+    dy = (b_lat - a_lat) * KM_PER_DEG
+    px = (p_lon - mid_lon) * kx - ax
+    py = (p_lat - mid_lat) * KM_PER_DEG - ay
+
+    seg_len2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(seg_len2 > 0, (px * dx + py * dy) / seg_len2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def _nearest_segment_all(p_lat, p_lon, a_lat, a_lon, b_lat, b_lon, block):
+    """
+    nearest_segment by comparing every point with every segment.
+    """
+    n_points = len(p_lat)
+    index = np.full(n_points, -1, dtype=np.int64)
+    dist = np.full(n_points, np.inf)
+    if n_points == 0 or len(a_lat) == 0:
+        return index, dist
+
+    chunk = max(1, block // len(a_lat))
+    for start in range(0, n_points, chunk):
+        stop = min(start + chunk, n_points)
+        d = point_segment_distance_km(p_lat[start:stop, None], p_lon[start:stop, None],
+                                      a_lat[None, :], a_lon[None, :],
+                                      b_lat[None, :], b_lon[None, :])
+        best = d.argmin(axis=1)
+        index[start:stop] = best
+        dist[start:stop] = d[np.arange(stop - start), best]
+    return index, dist
+
+
+def _csr_gather(ptr, values, rows):
+    """
+    values[ptr[r]:ptr[r + 1]] for every r in rows, concatenated, plus the
+    position in 'rows' each gathered value came from.
+    """
+    start = ptr[rows]
+    count = ptr[rows + 1] - start
+    owner = np.repeat(np.arange(len(rows)), count)
+    offset = np.arange(len(owner)) - np.repeat(np.cumsum(count) - count, count)
+    return values[start[owner] + offset], owner
+
+
+class _SegmentGrid:
+    """
+    Uniform grid over segments in a local km projection. Each segment is
+    listed in every cell its bounding box touches; segments spanning more than
+    GRID_MAX_CELLS_PER_SEGMENT cells are kept apart and checked everywhere.
+    A segment that is not listed in the (2r + 1) x (2r + 1) cells around a
+    point is at least r cells away from it.
+    """
+
+    def __init__(self, a_lat, a_lon, b_lat, b_lon):
+        self.ref_lat = float(np.concatenate([a_lat, b_lat]).mean())
+        self.ref_lon = float(np.concatenate([a_lon, b_lon]).mean())
+        a_xy = project_local_km(a_lat, a_lon, self.ref_lat, self.ref_lon)
+        b_xy = project_local_km(b_lat, b_lon, self.ref_lat, self.ref_lon)
+        lo = np.minimum(a_xy, b_xy)
+        hi = np.maximum(a_xy, b_xy)
+        self.origin = lo.min(axis=0)
+        extent = hi.max(axis=0) - self.origin
+        n_seg = len(a_lat)
+
+        # about one segment per cell, but not smaller than a typical segment
+        area = max(float(extent[0] * extent[1]), 1e-12)
+        seg_len = np.hypot(*(b_xy - a_xy).T)
+        self.cell = max(math.sqrt(area / n_seg), float(np.median(seg_len)), 1e-6)
+        self.shape = (extent // self.cell).astype(np.int64) + 1
+
+        c_lo = self.cell_of(lo)
+        span = self.cell_of(hi) - c_lo + 1
+        n_cells = span[:, 0] * span[:, 1]
+        wide = n_cells > GRID_MAX_CELLS_PER_SEGMENT
+        self.wide = np.flatnonzero(wide)
+
+        seg = np.repeat(np.flatnonzero(~wide), n_cells[~wide])
+        k = np.arange(len(seg)) - np.repeat(np.cumsum(n_cells[~wide]) - n_cells[~wide],
+                                            n_cells[~wide])
+        cx = c_lo[seg, 0] + k // span[seg, 1]
+        cy = c_lo[seg, 1] + k % span[seg, 1]
+        key = cx * self.shape[1] + cy
+        order = np.argsort(key, kind="stable")
+        self.cell_segments = seg[order]
+        self.ptr = np.searchsorted(key[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def cell_of(self, xy):
+        return np.floor((xy - self.origin) / self.cell).astype(np.int64)
+
+    def candidates(self, p_cell, r):
+        """
+        (point, segment) candidate pairs for the points in cells 'p_cell'
+        (n x 2), from the cells within r of each and the wide segments.
+        """
+        offs = np.arange(-r, r + 1)
+        cx = p_cell[:, 0, None, None] + offs[None, :, None]
+        cy = p_cell[:, 1, None, None] + offs[None, None, :]
+        inside = (cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+        point = np.broadcast_to(np.arange(len(p_cell))[:, None, None], inside.shape)[inside]
+        cells = (cx * self.shape[1] + cy)[inside]
+        seg, owner = _csr_gather(self.ptr, self.cell_segments, cells)
+        point = point[owner]
+        if len(self.wide):
+            point = np.concatenate([point, np.repeat(np.arange(len(p_cell)), len(self.wide))])
+            seg = np.concatenate([seg, np.tile(self.wide, len(p_cell))])
+        return point, seg
+
+
+def nearest_segment(p_lat, p_lon, a_lat, a_lon, b_lat, b_lon, block=NEAREST_SEGMENT_BLOCK):
+    """
+    For every point, the index of the nearest segment and the distance to it (km).
+    Ties go to the lowest segment index.
+
+    Small inputs compare every point with every segment. Larger ones index the
+    segments in a grid (_SegmentGrid) and compute the exact distance only to
+    the segments in the cells around each point, widening the search for the
+    points whose nearest candidate is not clearly closer than the searched
+    radius, and compare the rest with all segments once the search would cover
+    a large part of them (at most 'block' point-segment pairs are held in memory).
+    """
+    p_lat = np.asarray(p_lat, dtype=float)
+    p_lon = np.asarray(p_lon, dtype=float)
+    a_lat = np.asarray(a_lat, dtype=float)
+    a_lon = np.asarray(a_lon, dtype=float)
+    b_lat = np.asarray(b_lat, dtype=float)
+    b_lon = np.asarray(b_lon, dtype=float)
+
+    n_points = len(p_lat)
+    if n_points * len(a_lat) <= NEAREST_SEGMENT_BRUTE_FORCE:
+        return _nearest_segment_all(p_lat, p_lon, a_lat, a_lon, b_lat, b_lon, block)
+
+    grid = _SegmentGrid(a_lat, a_lon, b_lat, b_lon)
+    p_cell = grid.cell_of(project_local_km(p_lat, p_lon, grid.ref_lat, grid.ref_lon))
+    index = np.full(n_points, -1, dtype=np.int64)
+    dist = np.full(n_points, np.inf)
+
+    # average segments listed per cell, to size the chunks of points
+    per_cell = max(len(grid.cell_segments) / max(np.count_nonzero(np.diff(grid.ptr)), 1), 1.0)
+    todo = np.arange(n_points)
+    r = 1
+    while len(todo):
+        pairs_per_point = (2 * r + 1) ** 2 * per_cell + len(grid.wide)
+        if pairs_per_point * 2 > len(a_lat):
+            break  # the grid no longer saves work, compare with all segments
+        chunk = max(1, int(block // pairs_per_point))
+        unresolved = []
+        for start in range(0, len(todo), chunk):
+            pts = todo[start:start + chunk]
+            point, seg = grid.candidates(p_cell[pts], r)
+            if len(point) == 0:
+                unresolved.append(pts)
+                continue
+            order = np.lexsort((seg, point))
+            point, seg = point[order], seg[order]
+            p = pts[point]
+            d = point_segment_distance_km(p_lat[p], p_lon[p], a_lat[seg], a_lon[seg],
+                                          b_lat[seg], b_lon[seg])
+            first = np.flatnonzero(np.r_[True, point[1:] != point[:-1]])
+            best = np.minimum.reduceat(d, first)
+            group = np.repeat(np.arange(len(first)), np.diff(np.r_[first, len(point)]))
+            hit = np.flatnonzero(d == best[group])
+            hit = hit[np.r_[True, group[hit[1:]] != group[hit[:-1]]]]
+
+            ok = best <= GRID_SAFETY * r * grid.cell
+            done = pts[point[first[ok]]]
+            index[done] = seg[hit[ok]]
+            dist[done] = best[ok]
+            seen = np.zeros(len(pts), dtype=bool)
+            seen[point[first[ok]]] = True
+            unresolved.append(pts[~seen])
+        todo = np.concatenate(unresolved)
+        r *= 2
+
+    if len(todo):
+        index[todo], dist[todo] = _nearest_segment_all(p_lat[todo], p_lon[todo], a_lat, a_lon,
+                                                       b_lat, b_lon, block)
+    return index, dist
@@ -1,73 +1,223 @@
 """
 graph_visualizer.py
 
-Uses NetworkX and matplotlib to visualize the network model built by
-build_network_model.py. Each node/line/link in the model is added to a graph,
-and a simple layout is drawn.
+Uses matplotlib to visualize the network model built by build_network_model.py.
+The model is indexed once into the shared CSR NetworkGraph (network_graph.py);
+node positions and edges (lines first, then links) are read from its arrays.
+
+Layouts:
+  - "spring": NetworkX spring layout (small networks only; NetworkX is only
+    needed for this layout)
+  - "geo" / visualize_network_geo, for large (city-scale) networks: nodes are
+    placed at their lat/lon from the model, all edges are drawn as two batched
+    LineCollections (lines and links), labels follow a level of detail, and
+    the figure is rendered straight to a file with the Agg canvas, so no
+    display is needed.
 
 Requires:
-  pip install networkx matplotlib
+  pip install matplotlib numpy
+  (optional, layout="spring") pip install networkx
 """
 
-import networkx as nx
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from network_graph import NetworkGraph
 
-def visualize_network(model, show_labels=True, title="Network Graph"):
+# Colors per node role (see _node_roles)
+ROLE_COLORS = {
+    "substation": "red",
+    "feeder": "darkorange",
+    "lv_branch": "gold",
+    "building": "steelblue",
+    "other": "gray",
+}
+
+def visualize_network(model, show_labels=True, title="Network Graph",
+                      layout="spring", output_path=None):
     """
-    Visualizes the 'model' as a graph using NetworkX and Matplotlib.
+    Visualizes the 'model' as a graph with Matplotlib.
 
     :param model: Dictionary with "nodes", "lines", "links", etc.
     :param show_labels: If True, display node labels (node names) on the graph.
     :param title: Title to display on the plot.
+    :param layout: "spring" (NetworkX spring layout, small networks only)
+                   or "geo" (node lat/lon, see visualize_network_geo)
+    :param output_path: the image file to write; for "spring" the figure
+                        is shown instead if None, for "geo" it defaults
+                        to 'network_map.png'
     """
-    # Create a directed or undirected graph (your choice).
-    # If you prefer an undirected representation, use nx.Graph().
-    G = nx.DiGraph()
-
-    # 1) Add nodes
-    #    We can store each node's name as an attribute for labeling.
-    for nd in model["nodes"]:
-        # nd["id"] is unique
-        node_id = nd["id"]
-        node_label = nd.get("name", f"Node_{node_id}")
-        G.add_node(node_id, label=node_label)
-
-    # 2) Add edges for lines (which have r1, x1, etc.)
-    for ln in model["lines"]:
-        from_n = ln["from_node"]
-        to_n = ln["to_node"]
-        edge_label = ln.get("name", f"Line_{ln['id']}")
-        G.add_edge(from_n, to_n, label=edge_label)
-
-    # 3) Add edges for links (service lines to buildings, etc.)
-    for lk in model["links"]:
-        from_n = lk["from_node"]
-        to_n = lk["to_node"]
-        edge_label = lk.get("name", f"Link_{lk['id']}")
-        G.add_edge(from_n, to_n, label=edge_label)
-
-    # Optionally, you could also add edges for "sources" or "shunts" if desired.
-    # But typically "sources" and "shunts" are attributes at nodes or lines.
-
-    # --- Draw the graph ---
-    pos = nx.spring_layout(G, seed=42)  # spring_layout for a decent layout
+    if layout == "geo":
+        return visualize_network_geo(
+            model,
+            output_path=output_path or "network_map.png",
+            label_mode="auto" if show_labels else "none",
+            title=title
+        )
+
+    graph = NetworkGraph(model)
+    if layout != "spring":
+        raise ValueError("layout must be 'spring' or 'geo'.")
+    xy = _spring_layout(graph)
 
     plt.figure(figsize=(8, 6))
     plt.title(title)
+    ax = plt.gca()
 
-    # Draw the network edges and nodes
-    nx.draw_networkx_edges(G, pos, edge_color="gray", arrows=True, alpha=0.7)
-    nx.draw_networkx_nodes(G, pos, node_color="lightblue", node_size=700)
+    # Draw the network edges (from_node -> to_node, as stored in the model) and nodes
+    for a, b in zip(graph.edge_from.tolist(), graph.edge_to.tolist()):
+        ax.annotate("", xy=xy[b], xytext=xy[a],
+                    arrowprops=dict(arrowstyle="-|>", color="gray", alpha=0.7,
+                                    shrinkA=10, shrinkB=10))
+    ax.scatter(xy[:, 0], xy[:, 1], s=700, c="lightblue", zorder=2)
 
     # If show_labels is True, we'll draw node labels
     if show_labels:
-        node_labels = {n: G.nodes[n]["label"] for n in G.nodes()}
-        nx.draw_networkx_labels(G, pos, labels=node_labels, font_size=10)
+        for name, (x, y) in zip(graph.names, xy):
+            ax.text(x, y, name, fontsize=10, ha="center", va="center", zorder=3)
 
-    # Optionally show edge labels (which might clutter the diagram if many edges)
-    edge_labels = nx.get_edge_attributes(G, 'label')
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_color='red')
+    # Edge labels (which might clutter the diagram if many edges)
+    mid = (xy[graph.edge_from] + xy[graph.edge_to]) / 2
+    for e, (x, y) in enumerate(mid):
+        edge = graph.edge(e)
+        kind = "Line" if e < graph.n_lines else "Link"
+        ax.text(x, y, edge.get("name", f"{kind}_{edge['id']}"), color="red",
+                fontsize=8, ha="center", va="center", zorder=3)
 
+    ax.autoscale_view()
     plt.axis("off")
     plt.tight_layout()
-    plt.show()
+    if output_path:
+        plt.savefig(output_path)
+        plt.close()
+    else:
+        plt.show()
+
+
+def _spring_layout(graph):
+    """
+    NetworkX spring layout of the graph's edges, as an (n, 2) array by node position.
+    """
+    import networkx as nx
+    G = nx.Graph()
+    G.add_nodes_from(range(graph.n_nodes))
+    G.add_edges_from(zip(graph.edge_from.tolist(), graph.edge_to.tolist()))
+    pos = nx.spring_layout(G, seed=42)
+    return np.array([pos[i] for i in range(graph.n_nodes)], dtype=float).reshape(-1, 2)
+
+
+def _node_roles(names):
+    """
+    Classifies node names (MainSubstation / Feeder* / *_LVbranch_* / B*) into roles.
+    """
+    roles = []
+    for name in names:
+        if name == "MainSubstation":
+            roles.append("substation")
+        elif name.startswith("Feeder"):
+            roles.append("lv_branch" if "_LVbranch_" in name else "feeder")
+        elif name.startswith("B"):
+            roles.append("building")
+        else:
+            roles.append("other")
+    return np.array(roles)
+
+
+def visualize_network_geo(model, output_path="network_map.png", label_mode="auto",
+                          max_labels=200, title="Network Map", figsize=(12, 10), dpi=150):
+    """
+    Draws the model at its geographic coordinates and saves it to 'output_path'.
+    Works headless (Agg canvas) and scales to very large models: edges are
+    batched into one LineCollection per kind instead of one artist per edge.
+
+    Nodes whose lat/lon is missing or (0, 0) are skipped, as are edges touching them.
+
+    :param model: Dictionary with "nodes", "lines", "links", etc.
+    :param output_path: image file to write (format from the extension)
+    :param label_mode: "none", "all" (node and line names), or "auto":
+        label every node if there are at most 'max_labels' of them,
+        otherwise only the substation and feeders (still capped at 'max_labels')
+    :param max_labels: upper bound on the number of text labels drawn
+    :param title: Title to display on the plot.
+    :return: output_path
+    """
+    nodes = model["nodes"]
+    names = [nd.get("name", f"Node_{nd['id']}") for nd in nodes]
+    lat = np.array([float(nd.get("lat", 0) or 0) for nd in nodes])
+    lon = np.array([float(nd.get("lon", 0) or 0) for nd in nodes])
+    has_xy = ~((lat == 0) & (lon == 0))
+    roles = _node_roles(names)
+    graph = NetworkGraph(model)
+
+    # edge end positions from the shared index: lines first, then links
+    a, b = graph.edge_from, graph.edge_to
+    edge_ok = has_xy[a] & has_xy[b]
+    edge_segs = np.stack([np.column_stack([lon[a], lat[a]]),
+                          np.column_stack([lon[b], lat[b]])], axis=1)
+    is_line = np.arange(len(a)) < graph.n_lines
+    line_ok = edge_ok[is_line]
+    line_segs = edge_segs[is_line & edge_ok]
+    link_segs = edge_segs[~is_line & edge_ok]
+    line_is_mv = np.array([ln.get("voltage_level", "MV") == "MV" for ln in model["lines"]],
+                          dtype=bool)[line_ok] if len(line_ok) else np.zeros(0, dtype=bool)
+
+    skipped = int((~has_xy).sum())
+    if skipped:
+        print(f"[visualize_network_geo] WARNING: {skipped} nodes without coordinates were skipped.")
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title(title)
+
+    # links first (thin), then LV and MV lines on top
+    if len(link_segs):
+        ax.add_collection(LineCollection(link_segs, colors="lightgray", linewidths=0.3, zorder=1))
+    if len(line_segs):
+        ax.add_collection(LineCollection(line_segs[~line_is_mv], colors="seagreen",
+                                         linewidths=0.6, zorder=2))
+        ax.add_collection(LineCollection(line_segs[line_is_mv], colors="black",
+                                         linewidths=1.2, zorder=3))
+
+    # nodes: one scatter per role, marker size shrinking with network size
+    n_xy = int(has_xy.sum())
+    base_size = float(np.clip(4000.0 / max(n_xy, 1), 0.5, 40.0))
+    for role, color in ROLE_COLORS.items():
+        mask = has_xy & (roles == role)
+        if not mask.any():
+            continue
+        size = base_size if role == "building" else base_size * 4
+        ax.scatter(lon[mask], lat[mask], s=size, c=color, label=role,
+                   linewidths=0, zorder=4)
+
+    # level-of-detail labels
+    if label_mode != "none":
+        if label_mode == "all" or n_xy <= max_labels:
+            label_idx = np.nonzero(has_xy)[0]
+        else:
+            label_idx = np.nonzero(has_xy & np.isin(roles, ["substation", "feeder"]))[0]
+        for i in label_idx[:max_labels].tolist():
+            ax.annotate(names[i], (lon[i], lat[i]), fontsize=6,
+                        xytext=(2, 2), textcoords="offset points", zorder=5)
+
+        if label_mode == "all" and len(line_segs) <= max_labels:
+            line_names = [ln.get("name", f"Line_{ln['id']}") for ln in model["lines"]]
+            line_names = [nm for nm, ok in zip(line_names, line_ok) if ok]
+            mid = line_segs.mean(axis=1)
+            for nm, (x, y) in zip(line_names, mid):
+                ax.annotate(nm, (x, y), fontsize=5, color="red", zorder=5)
+
+    ax.autoscale_view()
+    ax.set_aspect(1.0 / max(np.cos(np.radians(lat[has_xy].mean())), 1e-6) if n_xy else "auto")
+    ax.set_xlabel("lon")
+    ax.set_ylabel("lat")
+    ax.legend(loc="upper right", fontsize=7, markerscale=2)
+    fig.tight_layout()
+    fig.savefig(output_path)
+
+    print(f"[visualize_network_geo] Saved map with {n_xy} nodes, "
+          f"{len(line_segs)} lines, {len(link_segs)} links => '{output_path}'")
+    return output_path
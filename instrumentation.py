@@ -0,0 +1,194 @@
+"""
+instrumentation.py
+
+Structured timings and counters for the pipeline and the time-series runner.
+
+    instr = Instrumentation(profile_stages=["solve"], trace_memory_stages=["json_generation"])
+    with instr.stage("solve", step="00:15"):
+        ...
+    instr.count("solver_iterations", 5)
+    instr.gauge("nodes", 1234)
+    instr.write_json("metrics.json")        # per-stage totals, counters, gauges
+    instr.write_steps_csv("metrics_steps.csv")  # one row per (step, stage)
+    instr.write_profiles("profiles")        # <stage>.prof files for pstats/snakeviz
+
+For every stage we keep the call count and total/min/max seconds. Calls made
+with a 'step' label are also kept individually, so the time of every stage can
+be attributed to every time step of a long run.
+
+Optional captures, per stage name:
+  - profile_stages: a cProfile profiler is enabled around every call of the stage
+    (one accumulated profile per stage)
+  - trace_memory_stages: tracemalloc's peak of traced Python allocations during
+    each call; the maximum over all calls is reported as memory_peak_mb (a
+    traced stage nested in another one also counts towards the outer peak)
+
+Instrumentation(enabled=False) turns every call into a no-op, so code can be
+instrumented unconditionally.
+"""
+
+import cProfile
+import csv
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    """
+    Collects stage timings, counters and gauges (see module docstring).
+    """
+
+    def __init__(self, enabled=True, profile_stages=(), trace_memory_stages=()):
+        self.enabled = enabled
+        self.profile_stages = set(profile_stages)
+        self.trace_memory_stages = set(trace_memory_stages)
+        self.stages = {}       # name -> {"calls", "total_s", "min_s", "max_s"}
+        self.step_rows = []    # (step, stage, seconds)
+        self.counters = {}     # name -> running sum
+        self.gauges = {}       # name -> last value
+        self.memory_peaks = {}  # stage -> max traced peak in bytes
+        self.profiles = {}     # stage -> cProfile.Profile
+        self._started_tracemalloc = False
+        self._profiling = False
+        # open traced stages: the highest traced memory seen so far in each
+        # (tracemalloc has one peak, which every traced stage resets on entry)
+        self._trace_peaks = []
+
+    @contextmanager
+    def stage(self, name, step=None):
+        """
+        Times the enclosed block as stage 'name' (optionally for time step 'step').
+        """
+        if not self.enabled:
+            yield
+            return
+
+        profiler = None
+        # cProfile cannot nest, so a profiled stage inside another one is only timed
+        if name in self.profile_stages and not self._profiling:
+            profiler = self.profiles.get(name)
+            if profiler is None:
+                profiler = self.profiles[name] = cProfile.Profile()
+        trace = name in self.trace_memory_stages
+        if trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            if self._trace_peaks:
+                # keep the enclosing stage's peak before resetting it
+                self._trace_peaks[-1] = max(self._trace_peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            self._trace_peaks.append(base)
+
+        if profiler is not None:
+            self._profiling = True
+            profiler.enable()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            if trace:
+                peak = max(self._trace_peaks.pop(), tracemalloc.get_traced_memory()[1])
+                self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak - base)
+                if self._trace_peaks:
+                    # the inner peak is part of the enclosing stage's peak
+                    self._trace_peaks[-1] = max(self._trace_peaks[-1], peak)
+            self._record(name, elapsed, step)
+
+    def _record(self, name, elapsed, step):
+        st = self.stages.get(name)
+        if st is None:
+            self.stages[name] = {"calls": 1, "total_s": elapsed, "min_s": elapsed, "max_s": elapsed}
+        else:
+            st["calls"] += 1
+            st["total_s"] += elapsed
+            if elapsed < st["min_s"]:
+                st["min_s"] = elapsed
+            if elapsed > st["max_s"]:
+                st["max_s"] = elapsed
+        if step is not None:
+            self.step_rows.append((step, name, elapsed))
+
+    def count(self, name, value=1):
+        """Adds 'value' to counter 'name' (e.g. solver iterations)."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        """Sets gauge 'name' to 'value' (e.g. number of nodes)."""
+        if self.enabled:
+            self.gauges[name] = value
+
+    def summary(self):
+        """
+        Returns a JSON-serializable dict of all stages, counters and gauges.
+        """
+        stages = {}
+        for name, st in self.stages.items():
+            stages[name] = {
+                "calls": st["calls"],
+                "total_s": round(st["total_s"], 6),
+                "mean_s": round(st["total_s"] / st["calls"], 6),
+                "min_s": round(st["min_s"], 6),
+                "max_s": round(st["max_s"], 6),
+            }
+            if name in self.memory_peaks:
+                stages[name]["memory_peak_mb"] = round(self.memory_peaks[name] / 1e6, 3)
+        return {"stages": stages, "counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_steps_csv(self, path):
+        """
+        Writes one row per timed call that had a step label: step, stage, seconds.
+        """
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["step", "stage", "seconds"])
+            for step, name, elapsed in self.step_rows:
+                writer.writerow([step, name, f"{elapsed:.6f}"])
+
+    def write_profiles(self, directory):
+        """
+        Dumps one '<stage>.prof' file per profiled stage. Returns the paths.
+        """
+        paths = []
+        if self.profiles:
+            os.makedirs(directory, exist_ok=True)
+        for name, profiler in self.profiles.items():
+            path = os.path.join(directory, f"{name}.prof")
+            profiler.dump_stats(path)
+            paths.append(path)
+        return paths
+
+    def print_summary(self, prefix="[instrumentation]"):
+        """
+        Prints the stages sorted by total time, then counters and gauges.
+        """
+        summary = self.summary()
+        for name, st in sorted(summary["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+            line = (f"{prefix} {name:<20} calls={st['calls']:<6} total={st['total_s']:.3f}s "
+                    f"mean={st['mean_s'] * 1000:.2f}ms max={st['max_s'] * 1000:.2f}ms")
+            if "memory_peak_mb" in st:
+                line += f" mem_peak={st['memory_peak_mb']:.1f}MB"
+            print(line)
+        for name, value in summary["counters"].items():
+            print(f"{prefix} counter {name} = {value}")
+        for name, value in summary["gauges"].items():
+            print(f"{prefix} gauge {name} = {value}")
+
+    def close(self):
+        """Stops tracemalloc if this instance started it."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
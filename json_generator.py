@@ -17,8 +17,15 @@ into the requested JSON structure:
     "shunt": [...]
   }
 }
+
+For solving, model_to_solver_arrays builds the solver's component arrays straight
+from the model (one NumPy array per attribute, see power_flow_solver), so the
+nested JSON dicts are only needed when the input is written to disk.
 """
 
+import numpy as np
+
+
 def generate_json_data(model):
     """
     Transforms the internal model into the required JSON format.
@@ -115,3 +122,53 @@ def generate_json_data(model):
         })
 
     return output
+
+
+def load_p_specified(p_kW, status):
+    """
+    Active power per load in W (p_specified), zero for switched-off loads.
+    Vectorized over the load column, e.g. one time step of a time series.
+    """
+    return np.asarray(p_kW, dtype=float) * 1000.0 * status
+
+
+def model_to_solver_arrays(model):
+    """
+    Converts the model into the component arrays used by the sweep solver
+    (same content as power_flow_solver._input_to_arrays(generate_json_data(model))),
+    without building the intermediate JSON dicts.
+
+    Besides the solver arrays it returns "load_p_kW" and "load_status", so the
+    loads of a time step can be updated in place with
+        arrays["load_p"] = load_p_specified(p_kW_column, arrays["load_status"])
+    """
+    nodes = model["nodes"]
+    lines = model["lines"]
+    links = model["links"]
+    sources = [s for s in model["sources"] if s.get("status", 1)]
+    loads = model["loads"]
+
+    load_p_kW = np.array([ld.get("p_kW", 0.0) for ld in loads], dtype=float)
+    load_status = np.array([ld.get("status", 1) for ld in loads], dtype=float)
+
+    return {
+        "node_id": np.array([nd["id"] for nd in nodes], dtype=np.int64),
+        "u_rated": np.array([nd["u_rated"] for nd in nodes], dtype=float),
+        "line_id": np.array([ln["id"] for ln in lines], dtype=np.int64),
+        "line_from": np.array([ln["from_node"] for ln in lines], dtype=np.int64),
+        "line_to": np.array([ln["to_node"] for ln in lines], dtype=np.int64),
+        "line_r1": np.array([ln.get("r1", 0.0) for ln in lines], dtype=float),
+        "line_x1": np.array([ln.get("x1", 0.0) for ln in lines], dtype=float),
+        "line_i_n": np.array([ln.get("i_n", 9999) for ln in lines], dtype=float),
+        "link_id": np.array([lk["id"] for lk in links], dtype=np.int64),
+        "link_from": np.array([lk["from_node"] for lk in links], dtype=np.int64),
+        "link_to": np.array([lk["to_node"] for lk in links], dtype=np.int64),
+        "source_node": np.array([s["node"] for s in sources], dtype=np.int64),
+        "source_u_ref": np.array([s.get("u_ref", 1.0) for s in sources], dtype=float),
+        "load_id": np.array([ld["id"] for ld in loads], dtype=np.int64),
+        "load_node": np.array([ld["node"] for ld in loads], dtype=np.int64),
+        "load_p_kW": load_p_kW,
+        "load_status": load_status,
+        "load_p": load_p_specified(load_p_kW, load_status),
+        "load_q": np.zeros(len(loads), dtype=float),
+    }
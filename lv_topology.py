@@ -0,0 +1,196 @@
+"""
+lv_topology.py
+
+Euclidean minimum spanning trees (EMST) for generating radial LV networks.
+
+The MST of n points only uses edges of their Delaunay triangulation, so instead
+of looking at all n^2 pairs we:
+  1) build a sparse candidate edge set:
+       - Delaunay edges (scipy.spatial.Delaunay), O(n log n), exact EMST, or
+       - if SciPy is not installed or the triangulation fails (e.g. collinear
+         points): pairs of points in the same or adjacent cells of a uniform
+         grid with ~2 points per cell, O(n) candidates (near-exact EMST)
+  2) run an MST over the candidates only (SciPy's csgraph when available,
+     otherwise Kruskal with a union-find over the candidates sorted by length).
+
+Coordinates must be projected (e.g. km), not raw lat/lon.
+
+Requires:
+  pip install numpy
+  (optional) pip install scipy
+"""
+
+import numpy as np
+
+from network_graph import bfs_tree, build_csr_adjacency
+
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import minimum_spanning_tree
+    from scipy.spatial import Delaunay
+except ImportError:  # SciPy is optional, the grid candidates are used instead
+    Delaunay = None
+
+# Below this many points all pairs are used as candidates
+COMPLETE_GRAPH_MAX_POINTS = 64
+
+
+def _complete_candidates(n):
+    i, j = np.triu_indices(n, k=1)
+    return np.column_stack([i, j])
+
+
+def _delaunay_candidates(xy):
+    """
+    Unique edges of the Delaunay triangulation. Points Qhull leaves out
+    (duplicates) are connected to their nearest triangulation vertex.
+    """
+    tri = Delaunay(xy)
+    s = tri.simplices
+    edges = np.concatenate([s[:, [0, 1]], s[:, [1, 2]], s[:, [0, 2]]])
+    if len(tri.coplanar):
+        edges = np.concatenate([edges, tri.coplanar[:, [0, 2]]])
+    edges.sort(axis=1)
+    n = len(xy)
+    keys = np.unique(edges[:, 0].astype(np.int64) * n + edges[:, 1])
+    return np.column_stack([keys // n, keys % n])
+
+
+def _csgraph_mst(xy, edges):
+    """
+    MST over candidate edges with SciPy's compiled implementation.
+    Zero-length edges (duplicate points) get a tiny length, since
+    sparse graphs treat explicit zeros as missing edges.
+    """
+    n = len(xy)
+    lengths = np.hypot(*(xy[edges[:, 0]] - xy[edges[:, 1]]).T)
+    lengths = np.maximum(lengths, 1e-12)
+    graph = coo_matrix((lengths, (edges[:, 0], edges[:, 1])), shape=(n, n)).tocsr()
+    tree = minimum_spanning_tree(graph).tocoo()
+    return np.column_stack([tree.row, tree.col]).astype(np.int64)
+
+
+def _grid_candidates(xy, points_per_cell=2.0):
+    """
+    All pairs of points in the same cell or in neighbouring cells of a
+    uniform grid (each unordered cell pair visited once).
+    """
+    n = len(xy)
+    lo = xy.min(axis=0)
+    span = np.maximum(xy.max(axis=0) - lo, 1e-12)
+    cell = max(np.sqrt(span[0] * span[1] * points_per_cell / n), 1e-12)
+    cx = ((xy[:, 0] - lo[0]) / cell).astype(np.int64)
+    cy = ((xy[:, 1] - lo[1]) / cell).astype(np.int64)
+    ny = int(cy.max()) + 3
+    key = (cx + 1) * ny + (cy + 1)  # +1 margin so neighbour keys never wrap
+
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    cells, starts, counts = np.unique(sorted_key, return_index=True, return_counts=True)
+
+    pairs = []
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        target = cells + dx * ny + dy
+        pos = np.searchsorted(cells, target)
+        pos_ok = np.minimum(pos, len(cells) - 1)
+        hit = cells[pos_ok] == target
+        a_cells = np.nonzero(hit)[0]
+        b_cells = pos_ok[hit]
+        ca = counts[a_cells]
+        cb = counts[b_cells]
+        total = ca * cb
+        if total.sum() == 0:
+            continue
+        # expand every (cell a, cell b) pair into ca * cb point pairs
+        rep = np.repeat(np.arange(len(a_cells)), total)
+        within = np.arange(total.sum()) - np.repeat(np.cumsum(total) - total, total)
+        ia = starts[a_cells][rep] + within // cb[rep]
+        ib = starts[b_cells][rep] + within % cb[rep]
+        pa = order[ia]
+        pb = order[ib]
+        keep = pa < pb if (dx, dy) == (0, 0) else pa != pb
+        pairs.append(np.column_stack([pa[keep], pb[keep]]))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    edges = np.concatenate(pairs)
+    edges.sort(axis=1)
+    return edges
+
+
+def _kruskal(xy, edges, parent=None):
+    """
+    Kruskal over candidate edges. Returns (mst edge list, union-find parent array).
+    Passing the parent array of a previous call continues from that forest.
+    """
+    n = len(xy)
+    if parent is None:
+        parent = list(range(n))
+
+    def find(a):
+        root = a
+        while parent[root] != root:
+            root = parent[root]
+        while parent[a] != root:
+            parent[a], a = root, parent[a]
+        return root
+
+    lengths = np.hypot(*(xy[edges[:, 0]] - xy[edges[:, 1]]).T)
+    result = []
+    for a, b in edges[np.argsort(lengths, kind="stable")].tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+            result.append((a, b))
+            if len(result) == n - 1:
+                break
+    return result, parent
+
+
+def euclidean_mst(xy):
+    """
+    Minimum spanning tree of 2D points.
+
+    :param xy: (n, 2) projected coordinates
+    :return: (n-1, 2) int array of point index pairs
+    """
+    xy = np.asarray(xy, dtype=float)
+    n = len(xy)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    if n <= COMPLETE_GRAPH_MAX_POINTS:
+        edges, _ = _kruskal(xy, _complete_candidates(n))
+        return np.array(edges, dtype=np.int64)
+
+    if Delaunay is not None:
+        try:
+            edges = _csgraph_mst(xy, _delaunay_candidates(xy))
+            if len(edges) == n - 1:
+                return edges
+        except Exception:
+            # degenerate input (e.g. all points collinear): use the grid instead
+            pass
+
+    # grid candidates; coarsen the grid until the forest is connected
+    result, parent = [], None
+    points_per_cell = 2.0
+    while True:
+        new_edges, parent = _kruskal(xy, _grid_candidates(xy, points_per_cell), parent)
+        result.extend(new_edges)
+        if len(result) >= n - 1:
+            break
+        points_per_cell *= 4.0
+    return np.array(result, dtype=np.int64)
+
+
+def orient_tree(n, edges, root=0):
+    """
+    Orients tree edges away from 'root' (breadth-first).
+    Returns (parent_of_child, child) pairs as an (m, 2) array, in BFS order.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    adj_ptr, adj_nbr, adj_edge = build_csr_adjacency(n, edges[:, 0], edges[:, 1])
+    order, parent, _, _ = bfs_tree(adj_ptr, adj_nbr, adj_edge, [root])
+    children = order[1:]
+    return np.column_stack([parent[children], children])
@@ -0,0 +1,150 @@
+"""
+memory_budget.py
+
+Sizing of time blocks and building tiles from a memory budget.
+
+The time-series runner and the load generator can hold their data in chunks
+instead of all at once. Given memory_limit (bytes, or a string like "512M" or
+"4G"), they measure what the process already uses (the baseline) and split the
+rest by the estimated bytes per step / per building:
+
+    block_steps = plan_chunk(memory_limit, step_bytes, working_bytes, n_steps)
+
+The per-item estimates below are for CPython objects and NumPy arrays on a
+64-bit build. They are deliberately on the high side.
+
+peak_rss_mb() reports the process' peak resident set size (ru_maxrss).
+"""
+
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # not available on Windows; RSS is then not reported
+    resource = None
+
+# a Python float held in a list (float object + list slot)
+PY_FLOAT_IN_LIST_BYTES = 32
+# one formatted long-CSV row dict (12 keys) with its values
+ROW_DICT_BYTES = 900
+# one (id, value, value) results tuple waiting in the writer queue
+RESULT_TUPLE_BYTES = 160
+# sweep solver temporaries and result arrays per node / per line
+SOLVER_BYTES_PER_NODE = 400
+SOLVER_BYTES_PER_LINE = 150
+# solver arrays plus topology, per node, as copied into every worker process
+WORKER_BYTES_PER_NODE = 300
+# running statistics per node/line in output_mode="stats" (streaming_stats.py:
+# mean, m2, min, max and 3 quantiles of 10 markers, plus the limit counter)
+STATS_BYTES_PER_ENTITY = 8 * (4 + 3 * 10 + 1)
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+_MB = _UNITS["M"]
+
+
+def parse_memory_size(value):
+    """
+    Bytes from an int or a string such as '800M', '4G', '1.5G' or '2048'
+    (binary units, an optional trailing 'B' or 'iB' is ignored).
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper()
+    if text.endswith("IB"):
+        text = text[:-2]
+    elif text.endswith("B"):
+        text = text[:-1]
+    unit = text[-1] if text and text[-1] in "KMGT" else ""
+    number = text[:-1] if unit else text
+    try:
+        return int(float(number) * _UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Cannot parse memory size '{value}'.") from None
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None if unknown.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def current_rss_bytes():
+    """
+    Current resident set size in bytes (from /proc where available,
+    otherwise the peak, which is an upper bound). None if unknown.
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        peak = peak_rss_mb()
+        return None if peak is None else int(peak * 1024 * 1024)
+
+
+def time_series_step_bytes(n_nodes, n_lines, n_loads, shared_results=False):
+    """
+    Bytes per time step of a block in the time-series runner: the loads of
+    the current block and of the next one (read ahead from the block file),
+    the NumPy load matrix and, with workers, the shared result rows
+    (node_u_pu, node_p, node_q, line_i_a, iterations, converged).
+    """
+    step = n_loads * (2 * 8 + 8)
+    if shared_results:
+        step += (3 * n_nodes + n_lines) * 8 + 9
+    return step
+
+
+def time_series_working_bytes(n_nodes, n_lines, queue_steps, workers=1, output_mode="long"):
+    """
+    Block-independent working memory of the time-series runner: one step's
+    solver temporaries, the output (formatted rows and the results waiting in
+    the writer queue, or the running statistics; events are few and not
+    counted) and, with workers, each
+    worker's copy of the solver arrays and topology.
+    """
+    entities = n_nodes + n_lines
+    working = n_nodes * SOLVER_BYTES_PER_NODE + n_lines * SOLVER_BYTES_PER_LINE
+    if output_mode == "long":
+        working += entities * ROW_DICT_BYTES
+        working += queue_steps * entities * RESULT_TUPLE_BYTES
+    elif output_mode == "stats":
+        working += entities * STATS_BYTES_PER_ENTITY
+    if workers > 1:
+        working += workers * n_nodes * (WORKER_BYTES_PER_NODE + SOLVER_BYTES_PER_NODE)
+    return working
+
+
+def load_generator_building_bytes(n_categories, n_steps):
+    """
+    Bytes per building held by generate_time_series_loads before writing:
+    one row list of n_steps floats per category.
+    """
+    return n_categories * (n_steps * PY_FLOAT_IN_LIST_BYTES + 120)
+
+
+def plan_chunk(memory_limit, item_bytes, working_bytes, n_items, baseline=None):
+    """
+    Number of items (steps, buildings) per chunk so that
+      baseline + working_bytes + chunk * item_bytes <= memory_limit.
+    'baseline' defaults to the current RSS. Returns at least 1 and at most
+    n_items; raises ValueError if not even one item fits.
+    """
+    limit = parse_memory_size(memory_limit)
+    if baseline is None:
+        baseline = current_rss_bytes() or 0
+    available = limit - baseline - working_bytes
+    if item_bytes <= 0:
+        return max(1, n_items)
+    chunk = int(available // item_bytes)
+    if chunk < 1:
+        needed = baseline + working_bytes + item_bytes
+        raise ValueError(f"memory_limit of {limit / _MB:.0f} MB is too small: at least "
+                         f"{needed / _MB:.0f} MB are needed ({baseline / _MB:.0f} MB already in use).")
+    return max(1, min(chunk, n_items))
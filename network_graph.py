@@ -0,0 +1,287 @@
+"""
+network_graph.py
+
+Shared adjacency index for the 'model' dict produced by build_network_model.py.
+
+Instead of scanning model["lines"] / model["links"] for every neighbour lookup,
+the model is indexed once into CSR-style arrays:
+  - undirected adjacency (neighbour node + edge per node)
+  - a rooted tree (oriented away from the source): parent, parent edge, depth,
+    children in CSR form, BFS order and DFS preorder
+
+All queries below run in time linear in their output:
+  - node_by_id / position lookups: O(1)
+  - children, lines_from, links_from: O(degree)
+  - bfs / dfs over the whole network: O(nodes + edges)
+  - subtree(node): O(subtree size), via DFS preorder intervals
+  - path_to_source(node): O(depth)
+
+Node "positions" are indices into model["nodes"]; edges are numbered with all
+lines first, followed by all links.
+
+Requires:
+  pip install numpy
+"""
+
+import numpy as np
+
+EDGE_LINE = 0
+EDGE_LINK = 1
+
+
+def build_csr_adjacency(n, ends_a, ends_b):
+    """
+    Builds an undirected adjacency in CSR form for 'n' nodes and edges
+    (ends_a[k], ends_b[k]), both given as node positions.
+    Returns (adj_ptr, adj_nbr, adj_edge): the neighbours of node u are
+    adj_nbr[adj_ptr[u]:adj_ptr[u+1]], reached through edges adj_edge[...].
+    """
+    ends_a = np.asarray(ends_a, dtype=np.int64)
+    ends_b = np.asarray(ends_b, dtype=np.int64)
+    n_edges = len(ends_a)
+    src = np.concatenate([ends_a, ends_b])
+    dst = np.concatenate([ends_b, ends_a])
+    edge = np.concatenate([np.arange(n_edges), np.arange(n_edges)])
+    order = np.argsort(src, kind="stable")
+    adj_ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=adj_ptr[1:])
+    return adj_ptr, dst[order], edge[order]
+
+
+def bfs_tree(adj_ptr, adj_nbr, adj_edge, roots):
+    """
+    Breadth-first search from one or more roots over a CSR adjacency.
+    Returns (order, parent, parent_edge, depth); unreachable nodes keep
+    parent/parent_edge/depth = -1 and are not in 'order'.
+    With several roots, 'order' is grouped by depth (stable per tree).
+    """
+    n = len(adj_ptr) - 1
+    ptr = adj_ptr.tolist()
+    nbr = adj_nbr.tolist()
+    edg = adj_edge.tolist()
+    parent = [-1] * n
+    parent_edge = [-1] * n
+    depth = [-1] * n
+    order = []
+    for r in np.asarray(roots, dtype=np.int64).tolist():
+        if depth[r] >= 0:
+            continue
+        depth[r] = 0
+        order.append(r)
+        head = len(order) - 1
+        while head < len(order):
+            u = order[head]
+            head += 1
+            d = depth[u] + 1
+            for k in range(ptr[u], ptr[u + 1]):
+                v = nbr[k]
+                if depth[v] < 0:
+                    depth[v] = d
+                    parent[v] = u
+                    parent_edge[v] = edg[k]
+                    order.append(v)
+
+    order = np.array(order, dtype=np.int64)
+    depth = np.array(depth, dtype=np.int64)
+    order = order[np.argsort(depth[order], kind="stable")]
+    return (order, np.array(parent, dtype=np.int64),
+            np.array(parent_edge, dtype=np.int64), depth)
+
+
+class NetworkGraph:
+    """
+    Read-only index over a model dict. Build it once per model:
+
+        graph = NetworkGraph(model)
+        for pos in graph.subtree(graph.position_of_name("Feeder1")):
+            ...
+
+    If the model has no source, 'root_name' (default "MainSubstation")
+    is used as the root of the tree.
+    """
+
+    def __init__(self, model, root_name="MainSubstation"):
+        self.model = model
+        nodes = model["nodes"]
+        lines = model["lines"]
+        links = model["links"]
+        self.n_nodes = len(nodes)
+        self.n_lines = len(lines)
+        self.n_links = len(links)
+
+        self.node_ids = np.array([nd["id"] for nd in nodes], dtype=np.int64)
+        self.names = [nd["name"] for nd in nodes]
+        self._pos_of_id = {nid: i for i, nid in enumerate(self.node_ids.tolist())}
+        self._pos_of_name = {}
+        for i, name in enumerate(self.names):
+            self._pos_of_name.setdefault(name, i)
+
+        # edges: lines first, then links
+        edge_from = [self._pos_of_id[ln["from_node"]] for ln in lines] + \
+                    [self._pos_of_id[lk["from_node"]] for lk in links]
+        edge_to = [self._pos_of_id[ln["to_node"]] for ln in lines] + \
+                  [self._pos_of_id[lk["to_node"]] for lk in links]
+        self.edge_from = np.array(edge_from, dtype=np.int64)
+        self.edge_to = np.array(edge_to, dtype=np.int64)
+        self.edge_kind = np.concatenate([
+            np.full(self.n_lines, EDGE_LINE, dtype=np.int8),
+            np.full(self.n_links, EDGE_LINK, dtype=np.int8)
+        ])
+
+        self.adj_ptr, self.adj_nbr, self.adj_edge = build_csr_adjacency(
+            self.n_nodes, self.edge_from, self.edge_to)
+
+        # directed "outgoing" index, as stored in the model (from_node -> edges)
+        out_order = np.argsort(self.edge_from, kind="stable")
+        self.out_ptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.edge_from, minlength=self.n_nodes), out=self.out_ptr[1:])
+        self.out_edge = out_order
+
+        # rooted tree
+        roots = [self._pos_of_id[s["node"]] for s in model.get("sources", [])
+                 if s["node"] in self._pos_of_id]
+        if not roots and root_name in self._pos_of_name:
+            roots = [self._pos_of_name[root_name]]
+        self.roots = np.array(roots, dtype=np.int64)
+        self.order, self.parent, self.parent_edge, self.depth = bfs_tree(
+            self.adj_ptr, self.adj_nbr, self.adj_edge, self.roots)
+
+        # children in CSR form (in BFS order)
+        has_parent = self.parent >= 0
+        child_nodes = self.order[has_parent[self.order]]
+        child_parent = self.parent[child_nodes]
+        c_order = np.argsort(child_parent, kind="stable")
+        self.child_idx = child_nodes[c_order]
+        self.child_ptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(child_parent, minlength=self.n_nodes), out=self.child_ptr[1:])
+
+        self._preorder = None
+        self._tin = None
+        self._size = None
+
+    # ----------------------------------------------------------------- lookups
+    def position_of_id(self, node_id):
+        """Position in model["nodes"] of a node ID, or None."""
+        return self._pos_of_id.get(node_id)
+
+    def position_of_name(self, name):
+        """Position in model["nodes"] of a node name, or None."""
+        return self._pos_of_name.get(name)
+
+    def node_by_id(self, node_id):
+        """The node dict for a model node ID, or None (O(1))."""
+        pos = self._pos_of_id.get(node_id)
+        return None if pos is None else self.model["nodes"][pos]
+
+    def edge(self, e):
+        """The line or link dict for an edge index."""
+        if e < self.n_lines:
+            return self.model["lines"][e]
+        return self.model["links"][e - self.n_lines]
+
+    def lines_from(self, node_id):
+        """Lines whose from_node is node_id (replaces a scan over model["lines"])."""
+        pos = self._pos_of_id.get(node_id)
+        if pos is None:
+            return []
+        edges = self.out_edge[self.out_ptr[pos]:self.out_ptr[pos + 1]]
+        return [self.model["lines"][e] for e in edges.tolist() if e < self.n_lines]
+
+    def links_from(self, node_id):
+        """Links whose from_node is node_id (replaces a scan over model["links"])."""
+        pos = self._pos_of_id.get(node_id)
+        if pos is None:
+            return []
+        edges = self.out_edge[self.out_ptr[pos]:self.out_ptr[pos + 1]]
+        return [self.model["links"][e - self.n_lines] for e in edges.tolist() if e >= self.n_lines]
+
+    def neighbours(self, pos):
+        """Positions of all nodes connected to 'pos' by a line or link."""
+        return self.adj_nbr[self.adj_ptr[pos]:self.adj_ptr[pos + 1]]
+
+    def children(self, pos):
+        """Positions of the children of 'pos' in the rooted tree."""
+        return self.child_idx[self.child_ptr[pos]:self.child_ptr[pos + 1]]
+
+    # -------------------------------------------------------------- traversals
+    def bfs(self, start=None):
+        """
+        Breadth-first node positions from 'start' (default: all roots).
+        """
+        if start is None:
+            return self.order
+        out = [start]
+        head = 0
+        ptr = self.child_ptr
+        idx = self.child_idx
+        while head < len(out):
+            u = out[head]
+            head += 1
+            out.extend(idx[ptr[u]:ptr[u + 1]].tolist())
+        return np.array(out, dtype=np.int64)
+
+    def dfs(self, start=None):
+        """
+        Depth-first preorder node positions from 'start' (default: all roots).
+        """
+        if start is None:
+            self._ensure_preorder()
+            return self._preorder
+        return self._dfs_from([start])
+
+    def subtree(self, pos):
+        """
+        Positions of 'pos' and all its descendants (DFS preorder), O(subtree).
+        """
+        self._ensure_preorder()
+        if self._tin[pos] < 0:
+            return np.array([pos], dtype=np.int64)
+        t = self._tin[pos]
+        return self._preorder[t:t + self._size[pos]]
+
+    def path_to_source(self, pos):
+        """
+        Positions from 'pos' up to its root (inclusive), O(depth).
+        """
+        path = [pos]
+        parent = self.parent
+        while parent[path[-1]] >= 0:
+            path.append(int(parent[path[-1]]))
+        return np.array(path, dtype=np.int64)
+
+    def path_edges_to_source(self, pos):
+        """
+        Edge indices on the path from 'pos' to its root, O(depth).
+        """
+        path = self.path_to_source(pos)
+        return self.parent_edge[path[:-1]]
+
+    # ----------------------------------------------------------------- helpers
+    def _dfs_from(self, starts):
+        ptr = self.child_ptr.tolist()
+        idx = self.child_idx.tolist()
+        out = []
+        stack = list(reversed(starts))
+        while stack:
+            u = stack.pop()
+            out.append(u)
+            # push children reversed so they come out in stored order
+            stack.extend(reversed(idx[ptr[u]:ptr[u + 1]]))
+        return np.array(out, dtype=np.int64)
+
+    def _ensure_preorder(self):
+        if self._preorder is not None:
+            return
+        self._preorder = self._dfs_from(self.roots.tolist())
+        self._tin = np.full(self.n_nodes, -1, dtype=np.int64)
+        self._tin[self._preorder] = np.arange(len(self._preorder))
+        # subtree sizes, accumulated level by level from the leaves up
+        size = np.ones(self.n_nodes, dtype=np.int64)
+        depth = self.depth
+        reached = self.order
+        if len(reached):
+            level_ptr = np.searchsorted(depth[reached], np.arange(int(depth.max()) + 2))
+            for d in range(len(level_ptr) - 2, 0, -1):
+                lvl = reached[level_ptr[d]:level_ptr[d + 1]]
+                np.add.at(size, self.parent[lvl], size[lvl])
+        self._size = size
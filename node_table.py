@@ -0,0 +1,143 @@
+"""
+node_table.py
+
+A persisted table of network node coordinates, shared by all pipeline stages.
+
+create_mv_lv_lines.py writes it next to the lines file (e.g. lines_demo.csv ->
+lines_demo_nodes.csv) with columns:
+   node_id, lat, lon, voltage_level
+
+assign_buildings.py, build_network_model.py and export_as_geojson.py read it
+through load_node_locations(), which parses each file once per process and
+returns the cached dict { node_id: (lat, lon) } on later calls (the cache entry
+is refreshed if the file changes on disk). Treat the returned dicts as read-only.
+Lines files without a node table fall back to their own from_lat/from_lon/
+to_lat/to_lon columns (see node_locations_from_lines()).
+"""
+
+import csv
+import os
+
+NODE_TABLE_FIELDS = ["node_id", "lat", "lon", "voltage_level"]
+
+# abspath -> ((mtime_ns, size), locations, voltage_levels)
+_CACHE = {}
+
+
+def node_table_path_for(lines_path):
+    """
+    Default node table path for a lines file: '<lines stem>_nodes.csv'.
+    """
+    stem, _ = os.path.splitext(lines_path)
+    return f"{stem}_nodes.csv"
+
+
+def write_node_table(nodes, output_path):
+    """
+    Writes the node table.
+    :param nodes: iterable of dicts with node_id, lat, lon, voltage_level
+    :return: number of nodes written
+    """
+    count = 0
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=NODE_TABLE_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for nd in nodes:
+            writer.writerow(nd)
+            count += 1
+    _CACHE.pop(os.path.abspath(output_path), None)
+    return count
+
+
+def _load(path):
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    stamp = (st.st_mtime_ns, st.st_size)
+    entry = _CACHE.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry
+
+    locations = {}
+    voltage_levels = {}
+    with open(key, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        i_id = header.index("node_id")
+        i_lat = header.index("lat")
+        i_lon = header.index("lon")
+        i_vl = header.index("voltage_level") if "voltage_level" in header else None
+        for row in reader:
+            locations[row[i_id]] = (float(row[i_lat]), float(row[i_lon]))
+            if i_vl is not None:
+                voltage_levels[row[i_id]] = row[i_vl]
+
+    entry = (stamp, locations, voltage_levels)
+    _CACHE[key] = entry
+    return entry
+
+
+def load_node_locations(path):
+    """
+    Returns { node_id: (lat, lon) } from a node table (cached per file).
+    """
+    return _load(path)[1]
+
+
+def load_node_voltage_levels(path):
+    """
+    Returns { node_id: voltage_level } from a node table (cached per file).
+    """
+    return _load(path)[2]
+
+
+def node_locations_from_lines(lines_path):
+    """
+    Returns { node_id: (lat, lon) } from the from_lat/from_lon/to_lat/to_lon
+    columns of a lines CSV (as written by create_mv_lv_lines.py), or an empty
+    dict if the file has no coordinate columns.
+    """
+    locations = {}
+    with open(lines_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        ends = []
+        for end in ("from", "to"):
+            cols = (f"{end}_id", f"{end}_lat", f"{end}_lon")
+            if all(c in header for c in cols):
+                ends.append([header.index(c) for c in cols])
+        if not ends:
+            return locations
+        for row in reader:
+            for i_id, i_lat, i_lon in ends:
+                if row[i_lat] and row[i_lon]:
+                    locations[row[i_id]] = (float(row[i_lat]), float(row[i_lon]))
+    return locations
+
+
+def resolve_node_locations(node_locations=None, lines_path=None):
+    """
+    Accepts what callers pass as 'node_locations' and returns a dict:
+      - a dict is returned as is
+      - a string is read as a node table path
+      - None falls back to the table next to 'lines_path' if it exists,
+        otherwise to the coordinate columns of the lines CSV itself
+        (node_locations_from_lines), otherwise an empty dict
+    """
+    if isinstance(node_locations, dict):
+        return node_locations
+    if isinstance(node_locations, str):
+        return load_node_locations(node_locations)
+    if lines_path:
+        path = node_table_path_for(lines_path)
+        if os.path.exists(path):
+            return load_node_locations(path)
+        if lines_path.lower().endswith(".csv") and os.path.exists(lines_path):
+            return node_locations_from_lines(lines_path)
+    return {}
+
+
+def clear_node_table_cache():
+    """
+    Drops all cached node tables.
+    """
+    _CACHE.clear()
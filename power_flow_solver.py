@@ -7,11 +7,22 @@ A dummy "power flow solver" that can:
 
 In a real scenario, you'd parse the input more thoroughly,
 run a real solver, and produce real results.
+
+For radial networks there is also a backward/forward sweep solver
+(run_power_flow_sweep) and a stateful PowerFlowSession that keeps the
+previous snapshot's voltages as the initial guess for the next one.
+
+Requires (sweep solver only):
+  pip install numpy
 """
 
 import json
 import random
 
+import numpy as np
+
+from topology_cache import S_BASE as SWEEP_S_BASE, get_topology, node_index, structure_hash
+
 def run_power_flow_sym(input_data, params_data=None):
     """
     Runs a dummy symmetrical power flow solution,
@@ -126,6 +137,326 @@ def run_power_flow_asym(input_data, params_data=None):
     return asym_output
 
 
+def _input_to_arrays(input_data):
+    """
+    Flattens the JSON-style input dict (data.node, data.line, ...) into
+    NumPy arrays, one per component attribute.
+    Links are treated as zero-impedance branches, inactive sources are dropped.
+    """
+    data = input_data["data"]
+    nodes = data.get("node", [])
+    lines = data.get("line", [])
+    links = data.get("link", [])
+    sources = [s for s in data.get("source", []) if s.get("status", 1)]
+    loads = data.get("sym_load", [])
+
+    return {
+        "node_id": np.array([nd["id"] for nd in nodes], dtype=np.int64),
+        "u_rated": np.array([nd.get("u_rated", 1.0) for nd in nodes], dtype=float),
+        "line_id": np.array([ln["id"] for ln in lines], dtype=np.int64),
+        "line_from": np.array([ln["from_node"] for ln in lines], dtype=np.int64),
+        "line_to": np.array([ln["to_node"] for ln in lines], dtype=np.int64),
+        "line_r1": np.array([ln.get("r1", 0.0) for ln in lines], dtype=float),
+        "line_x1": np.array([ln.get("x1", 0.0) for ln in lines], dtype=float),
+        "line_i_n": np.array([ln.get("i_n", 9999) for ln in lines], dtype=float),
+        "link_id": np.array([lk["id"] for lk in links], dtype=np.int64),
+        "link_from": np.array([lk["from_node"] for lk in links], dtype=np.int64),
+        "link_to": np.array([lk["to_node"] for lk in links], dtype=np.int64),
+        "source_node": np.array([s["node"] for s in sources], dtype=np.int64),
+        "source_u_ref": np.array([s.get("u_ref", 1.0) for s in sources], dtype=float),
+        "load_id": np.array([ld["id"] for ld in loads], dtype=np.int64),
+        "load_node": np.array([ld["node"] for ld in loads], dtype=np.int64),
+        "load_p": np.array([ld.get("p_specified", 0.0) * ld.get("status", 1)
+                            for ld in loads], dtype=float),
+        "load_q": np.array([ld.get("q_specified", 0.0) * ld.get("status", 1)
+                            for ld in loads], dtype=float),
+    }
+
+
+def _sweep(topology, arrays, v_init, tol=1e-8, max_iter=50):
+    """
+    Backward/forward sweep on a radial topology.
+    Returns (complex per-unit voltages, branch currents per child node,
+    iterations used, converged flag).
+    """
+    n = topology["n_nodes"]
+    parent = topology["parent"]
+    levels = topology["levels"]
+    z_pu = topology["z_pu"]
+    roots = topology["roots"]
+    energized = topology["energized"]
+
+    # demand per node in p.u. (consumption positive)
+    s_demand = np.zeros(n, dtype=complex)
+    np.add.at(s_demand, node_index(topology, arrays["load_node"]),
+              (arrays["load_p"] + 1j * arrays["load_q"]) / SWEEP_S_BASE)
+    s_demand[~energized] = 0.0
+
+    v = v_init.astype(complex, copy=True)
+    v[~energized] = 0.0
+    v_ref = arrays["source_u_ref"].astype(complex)
+    v[roots] = v_ref
+
+    i_branch = np.zeros(n, dtype=complex)
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        # backward: accumulate load currents towards the source
+        i_branch[:] = 0.0
+        i_branch[energized] = np.conj(s_demand[energized] / v[energized])
+        for lvl in reversed(levels[1:]):
+            np.add.at(i_branch, parent[lvl], i_branch[lvl])
+
+        # forward: voltage drop along each branch
+        v_new = v.copy()
+        v_new[roots] = v_ref
+        for lvl in levels[1:]:
+            v_new[lvl] = v_new[parent[lvl]] - z_pu[lvl] * i_branch[lvl]
+
+        delta = np.max(np.abs(v_new - v)) if n else 0.0
+        v = v_new
+        if delta < tol:
+            converged = True
+            break
+
+    return v, i_branch, iterations, converged
+
+
+def _sweep_result_arrays(topology, arrays, v, i_branch):
+    """
+    Sweep results as arrays in input order:
+      node_u_pu, node_u, node_u_angle, node_p, node_q (injection in W / var,
+      negative for loads) and line_i_a, line_p_from, line_loading.
+    """
+    u_rated = arrays["u_rated"]
+
+    s_inj = np.zeros(len(v), dtype=complex)
+    np.add.at(s_inj, node_index(topology, arrays["load_node"]),
+              -(arrays["load_p"] + 1j * arrays["load_q"]))
+    # sources inject whatever flows out through their branches (plus local load)
+    roots = topology["roots"]
+    i_out = np.zeros(len(v), dtype=complex)
+    fed = topology["parent"] >= 0
+    np.add.at(i_out, topology["parent"][fed], i_branch[fed])
+    s_inj[roots] = v[roots] * np.conj(i_out[roots]) * SWEEP_S_BASE - s_inj[roots]
+
+    u_pu = np.abs(v)
+
+    # lines not reached from any source carry no current
+    line_child = topology["line_child"]
+    reached = line_child >= 0
+    c = line_child[reached]
+    i_pu = i_branch[c]
+    i_a = np.zeros(len(line_child))
+    p_from = np.zeros(len(line_child))
+    i_a[reached] = np.abs(i_pu) * SWEEP_S_BASE / (np.sqrt(3) * u_rated[c])
+    # power entering the line at its upstream end
+    p_from[reached] = (v[topology["parent"][c]] * np.conj(i_pu)).real * SWEEP_S_BASE
+    i_n = arrays["line_i_n"]
+    loading = np.zeros(len(line_child))
+    np.divide(i_a, i_n, out=loading, where=i_n > 0)
+
+    return {
+        "node_u_pu": u_pu,
+        "node_u": u_pu * u_rated,
+        "node_u_angle": np.angle(v),
+        "node_p": s_inj.real,
+        "node_q": s_inj.imag,
+        "line_i_a": i_a,
+        "line_p_from": p_from,
+        "line_loading": loading,
+    }
+
+
+def _result_arrays_to_sym_output(arrays, res):
+    """
+    Builds the 'sym_output.json' dict from _sweep_result_arrays output.
+    """
+    sym_output = {
+        "version": "1.0",
+        "type": "sym_output",
+        "data": {
+            "node": [],
+            "line": [],
+            "shunt": []
+        }
+    }
+    node_rows = zip(arrays["node_id"].tolist(), res["node_u_pu"].tolist(), res["node_u"].tolist(),
+                    res["node_u_angle"].tolist(), res["node_p"].tolist(), res["node_q"].tolist())
+    for node_id, u_pu, u, u_angle, p, q in node_rows:
+        sym_output["data"]["node"].append({
+            "id": node_id,
+            "u_pu": u_pu,
+            "u": u,
+            "u_angle": u_angle,
+            "p": p,
+            "q": q
+        })
+
+    line_rows = zip(arrays["line_id"].tolist(), res["line_i_a"].tolist(),
+                    res["line_p_from"].tolist(), res["line_loading"].tolist())
+    for line_id, i_a, p_from, loading in line_rows:
+        sym_output["data"]["line"].append({
+            "id": line_id,
+            "i_from": i_a,
+            "i_to": i_a,
+            "p_from": p_from,
+            "loading": loading
+        })
+
+    return sym_output
+
+
+def _sweep_to_sym_output(topology, arrays, v, i_branch):
+    """
+    Converts sweep results into a dict shaped like 'sym_output.json'.
+    Node 'p' is the active power injection in W (negative for loads),
+    line currents are in A.
+    """
+    return _result_arrays_to_sym_output(arrays, _sweep_result_arrays(topology, arrays, v, i_branch))
+
+
+def run_power_flow_sweep(input_data, params_data=None, initial_voltage=None,
+                         cache_dir=None):
+    """
+    Runs a backward/forward sweep power flow on a radial network,
+    returns a dict matching a 'sym_output.json' structure plus
+    'iterations' and 'converged' at the top level.
+
+    input_data: a dict (the parsed JSON "input" with data.node, data.line, etc.)
+    params_data: optional {"error_tolerance": ..., "max_iterations": ...}
+    initial_voltage: optional complex p.u. voltages in input node order
+                     (defaults to a flat start at the source reference)
+    cache_dir: optional directory for the on-disk topology cache
+    """
+    params_data = params_data or {}
+    arrays = _input_to_arrays(input_data)
+    topology, _ = get_topology(arrays, cache_dir=cache_dir)
+    if initial_voltage is None:
+        u_ref = arrays["source_u_ref"][0] if len(arrays["source_u_ref"]) else 1.0
+        initial_voltage = np.full(topology["n_nodes"], u_ref, dtype=complex)
+
+    v, i_branch, iterations, converged = _sweep(
+        topology, arrays, initial_voltage,
+        tol=params_data.get("error_tolerance", 1e-8),
+        max_iter=params_data.get("max_iterations", 50)
+    )
+    sym_output = _sweep_to_sym_output(topology, arrays, v, i_branch)
+    sym_output["iterations"] = iterations
+    sym_output["converged"] = converged
+    return sym_output
+
+
+class PowerFlowSession:
+    """
+    Stateful sweep solver for consecutive snapshots of the same network
+    (e.g. the 15-minute steps of a time series).
+
+    Between calls it keeps:
+      - the radial topology (node ordering, parents, branch impedances),
+        looked up in topology_cache only when the structure hash changes
+      - the previous voltage solution, used as the initial guess
+        when warm_start is True
+
+    Iterations to convergence of every solve are appended to
+    'iteration_history'. get_state()/set_state() carry the warm-start
+    voltages over to a new session (e.g. when resuming from a checkpoint).
+    """
+
+    def __init__(self, warm_start=True, tol=1e-8, max_iter=50, cache_dir=None):
+        self.warm_start = warm_start
+        self.tol = tol
+        self.max_iter = max_iter
+        self.cache_dir = cache_dir
+        self.iteration_history = []
+        self._key = None
+        self._topology = None
+        self._voltage = None
+        self._restored = None
+
+    def reset(self):
+        """Drops the cached topology and voltages (next solve is a cold start)."""
+        self._key = None
+        self._topology = None
+        self._voltage = None
+        self._restored = None
+
+    def get_state(self):
+        """
+        The warm-start state as a JSON-serializable dict: the structure hash and
+        the last voltage solution (input node order), or None values before any solve.
+        """
+        v = self._voltage
+        return {
+            "structure_key": self._key,
+            "voltage_re": None if v is None else v.real.tolist(),
+            "voltage_im": None if v is None else v.imag.tolist(),
+        }
+
+    def set_state(self, state):
+        """
+        Restores get_state() output. The voltages are used as the initial guess
+        of the next solve if its network has the same structure hash.
+        """
+        self.reset()
+        if state and state.get("voltage_re") is not None:
+            v = np.array(state["voltage_re"]) + 1j * np.array(state["voltage_im"])
+            self._restored = (state["structure_key"], v)
+
+    def solve(self, input_dict, params_data=None):
+        """
+        Solves one snapshot in memory.
+        Returns:
+          {
+            "sym": {... sym_output ...},
+            "iterations": int,
+            "converged": bool
+          }
+        """
+        return self.solve_arrays(_input_to_arrays(input_dict), params_data)
+
+    def solve_arrays(self, arrays, params_data=None, structure_key=None, as_arrays=False):
+        """
+        Like solve(), but takes the component arrays directly
+        (e.g. from json_generator.model_to_solver_arrays), skipping the JSON dicts.
+
+        :param structure_key: structure_hash(arrays) if the caller already knows it;
+            a time series that only changes the loads can hash once and pass it
+            for every step
+        :param as_arrays: return the result arrays of _sweep_result_arrays
+            (input order) under "arrays" instead of the "sym" dict
+        """
+        params_data = params_data or {}
+
+        key = structure_key if structure_key is not None else structure_hash(arrays)
+        if key != self._key:
+            self._topology, self._key = get_topology(arrays, cache_dir=self.cache_dir, key=key)
+            self._voltage = None
+            if self._restored is not None and self._restored[0] == key:
+                self._voltage = self._restored[1]
+            self._restored = None
+
+        if self.warm_start and self._voltage is not None:
+            v_init = self._voltage
+        else:
+            u_ref = arrays["source_u_ref"][0] if len(arrays["source_u_ref"]) else 1.0
+            v_init = np.full(self._topology["n_nodes"], u_ref, dtype=complex)
+
+        v, i_branch, iterations, converged = _sweep(
+            self._topology, arrays, v_init,
+            tol=params_data.get("error_tolerance", self.tol),
+            max_iter=params_data.get("max_iterations", self.max_iter)
+        )
+        self._voltage = v
+        self.iteration_history.append(iterations)
+
+        if as_arrays:
+            res = _sweep_result_arrays(self._topology, arrays, v, i_branch)
+            return {"arrays": res, "iterations": iterations, "converged": converged}
+        sym_output = _sweep_to_sym_output(self._topology, arrays, v, i_branch)
+        return {"sym": sym_output, "iterations": iterations, "converged": converged}
+
+
 def solve_power_flow_in_memory(input_dict, params_data=None):
     """
     Runs the power flow solver *in memory* (no files). 
@@ -0,0 +1,202 @@
+"""
+screening.py
+
+Cheap pre-screening of the time steps of a time series, so the full power
+flow only runs on the steps that can come close to a limit.
+
+For every step we estimate, without solving:
+  - voltages: a linear (LinDistFlow-style) voltage drop at a few monitored
+    nodes per feeder, the ones with the largest path resistance to the source:
+        du_c = sum_j (R_common(c, j) * p_j + X_common(c, j) * q_j)   (p.u.)
+    where R_common(c, j) is the resistance of the path shared by node c and
+    load j. The sensitivities (monitored nodes x loads) are built once, so all
+    steps take one matrix product; generation (negative load) gives a rise.
+  - line loading: the feeder's aggregate load over the rating of the line
+    into its head, I ~ P / (sqrt(3) * U_rated)
+and rate each step by its 'severity', the largest fraction of a limit used:
+  drop / (u_ref - v_min), rise / (v_max - u_ref), loading / loading_limit.
+(1.0 means the estimate reaches a limit.) The estimates ignore losses and
+the voltage dependence of the currents, so they are slightly optimistic;
+screen with a threshold below 1 or together with a top-k.
+
+    screener = StepScreener(arrays, topology)
+    est = screener.estimate(ts_load_pos, ts_p_kW)   # (steps x loads with a series)
+    solve = select_steps(est["severity"], top_k=100, threshold=0.8)
+
+Requires:
+  pip install numpy
+"""
+
+import csv
+
+import numpy as np
+
+from feeder_decomposition import feeder_heads
+from json_generator import load_p_specified
+from topology_cache import S_BASE, node_index
+
+# monitored nodes per feeder (largest path resistance first)
+MONITORED_PER_FEEDER = 4
+
+SCREENING_COLUMNS = [
+    "time_step","est_min_voltage_pu","est_max_voltage_pu","est_max_loading_percent",
+    "severity","solved"
+]
+
+
+def path_impedance(topology):
+    """
+    Per node, the per-unit impedance of its path to the source (0 at sources
+    and at nodes not fed from a source).
+    """
+    parent = topology["parent"]
+    z_pu = topology["z_pu"]
+    z_path = np.zeros(topology["n_nodes"], dtype=complex)
+    for lvl in topology["levels"][1:]:
+        z_path[lvl] = z_path[parent[lvl]] + z_pu[lvl]
+    return z_path
+
+
+def monitored_nodes(topology, z_path, per_feeder=MONITORED_PER_FEEDER):
+    """
+    Node positions with the largest path resistance, 'per_feeder' per feeder.
+    """
+    head = feeder_heads(topology)
+    fed = np.flatnonzero(head >= 0)
+    # by feeder, then by descending path resistance
+    fed = fed[np.lexsort((-z_path[fed].real, head[fed]))]
+    _, first = np.unique(head[fed], return_index=True)
+    rank = np.arange(len(fed)) - np.repeat(first, np.diff(np.append(first, len(fed))))
+    return fed[rank < per_feeder]
+
+
+def common_path_impedance(topology, z_path, node):
+    """
+    For every node position, the impedance of the path it shares with 'node'
+    (the path impedance of their deepest common ancestor).
+    """
+    parent = topology["parent"]
+    on_path = np.zeros(topology["n_nodes"], dtype=bool)
+    k = node
+    while k >= 0:
+        on_path[k] = True
+        k = parent[k]
+    # deepest ancestor of every node that lies on the path of 'node'
+    anchor = np.arange(topology["n_nodes"])
+    for lvl in topology["levels"][1:]:
+        off = lvl[~on_path[lvl]]
+        anchor[off] = anchor[parent[off]]
+    common = z_path[anchor]
+    common[~topology["energized"]] = 0.0
+    return common
+
+
+class StepScreener:
+    """
+    Linear estimates of the worst voltages and feeder loading of many steps
+    at once (see module docstring), for one network ('arrays' as used by the
+    sweep solver, with 'load_p_kW' and 'load_status' from
+    json_generator.model_to_solver_arrays, and its topology).
+    """
+
+    def __init__(self, arrays, topology, voltage_limits=(0.95, 1.05), loading_limit=100.0,
+                 per_feeder=MONITORED_PER_FEEDER):
+        self.arrays = arrays
+        self.v_min, self.v_max = voltage_limits
+        self.loading_limit = loading_limit
+        parent = topology["parent"]
+        load_pos = node_index(topology, arrays["load_node"])
+
+        # source voltage seen by every node
+        u_ref = np.zeros(topology["n_nodes"])
+        u_ref[node_index(topology, arrays["source_node"])] = arrays["source_u_ref"]
+        for lvl in topology["levels"][1:]:
+            u_ref[lvl] = u_ref[parent[lvl]]
+
+        z_path = path_impedance(topology)
+        self.monitored = monitored_nodes(topology, z_path, per_feeder)
+        self.u_ref = u_ref[self.monitored]
+        # voltage drop per W / var of every load at every monitored node
+        common = np.array([common_path_impedance(topology, z_path, c)[load_pos]
+                           for c in self.monitored]).reshape(len(self.monitored), len(load_pos))
+        self.sens_p = common.real / S_BASE
+        self.sens_q = common.imag / S_BASE
+
+        # feeder head lines: aggregate load of the feeder over the line's rating
+        head = feeder_heads(topology)
+        line_child = topology["line_child"]
+        is_head_line = (line_child >= 0) & (head[np.maximum(line_child, 0)] == line_child)
+        self.head_lines = np.flatnonzero(is_head_line)
+        heads = line_child[self.head_lines]
+        self.feeder_loads = (head[load_pos][None, :] == heads[:, None]).astype(float)
+        u_line = arrays["u_rated"][heads]
+        i_n = arrays["line_i_n"][self.head_lines]
+        # loading percent per W of feeder load (0 for unrated lines)
+        self.loading_per_w = np.zeros(len(heads))
+        rated = i_n > 0
+        self.loading_per_w[rated] = 100.0 / (np.sqrt(3) * u_line[rated] * i_n[rated])
+
+    def estimate(self, ts_load_pos, ts_p_kW):
+        """
+        :param ts_load_pos: load positions that have a time series
+        :param ts_p_kW: (steps x len(ts_load_pos)) their active power in kW;
+            the other loads keep their base value
+        :return: dict of per-step arrays: min_voltage_pu, max_voltage_pu,
+            max_loading_percent, severity
+        """
+        ts_p_kW = np.atleast_2d(ts_p_kW)
+        n_steps = ts_p_kW.shape[0]
+        p_kW = np.tile(self.arrays["load_p_kW"], (n_steps, 1))
+        p_kW[:, ts_load_pos] = ts_p_kW
+        p_w = load_p_specified(p_kW, self.arrays["load_status"])
+
+        drop = p_w @ self.sens_p.T + self.arrays["load_q"] @ self.sens_q.T
+        u_est = self.u_ref[None, :] - drop
+        loading = np.abs(p_w @ self.feeder_loads.T) * self.loading_per_w[None, :]
+
+        def row_max(x, empty):
+            return x.max(axis=1) if x.shape[1] else np.full(n_steps, empty)
+
+        min_u = -row_max(-u_est, -1.0)
+        max_u = row_max(u_est, 1.0)
+        max_loading = row_max(loading, 0.0)
+        severity = np.maximum.reduce([
+            row_max(drop / np.maximum(self.u_ref - self.v_min, 1e-9), 0.0),
+            row_max(-drop / np.maximum(self.v_max - self.u_ref, 1e-9), 0.0),
+            max_loading / self.loading_limit,
+        ])
+        return {"min_voltage_pu": min_u, "max_voltage_pu": max_u,
+                "max_loading_percent": max_loading, "severity": severity}
+
+
+def select_steps(severity, top_k=None, threshold=None):
+    """
+    Boolean mask of the steps to solve: the 'top_k' most severe steps plus all
+    steps with severity >= 'threshold'. With neither, every step is selected.
+    """
+    severity = np.asarray(severity, dtype=float)
+    if top_k is None and threshold is None:
+        return np.ones(len(severity), dtype=bool)
+    selected = np.zeros(len(severity), dtype=bool)
+    if threshold is not None:
+        selected |= severity >= threshold
+    if top_k:
+        k = min(int(top_k), len(severity))
+        selected[np.argsort(-severity, kind="stable")[:k]] = True
+    return selected
+
+
+def write_screening_csv(path, time_headers, estimate, solved):
+    """
+    One row per step: its estimates, severity and whether it was solved.
+    """
+    columns = zip(time_headers,
+                  np.round(estimate["min_voltage_pu"], 4).tolist(),
+                  np.round(estimate["max_voltage_pu"], 4).tolist(),
+                  np.round(estimate["max_loading_percent"], 2).tolist(),
+                  np.round(estimate["severity"], 4).tolist(),
+                  np.asarray(solved, dtype=int).tolist())
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SCREENING_COLUMNS)
+        writer.writerows(columns)
@@ -0,0 +1,150 @@
+"""
+shared_buffers.py
+
+NumPy arrays in shared memory, for passing large matrices between processes
+without pickling them.
+
+The owner creates the buffers and hands their (small, picklable) specs to the
+workers, which attach to the same memory and read/write the arrays in place:
+
+    buffers = SharedBuffers.create({
+        "loads": ((n_steps, n_loads), "float64"),
+        "node_u_pu": ((n_steps, n_nodes), "float64"),
+    })
+    try:
+        ...  # pass buffers.specs() to the workers, e.g. as pool initargs
+        # worker: bufs = SharedBuffers.attach(specs); bufs["node_u_pu"][t] = ...
+    finally:
+        buffers.unlink()
+
+Only the owner unlinks; attached instances just close. Views into the arrays
+must not be used after close()/unlink().
+
+Requires:
+  pip install numpy
+"""
+
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _attach_memory(name):
+    """
+    Attaches to an existing block. Before Python 3.13 attaching also registers
+    the block with the resource tracker, which multiprocessing children share
+    with their parent (the owner), so that registration is a no-op there.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedArray:
+    """
+    One NumPy array backed by a multiprocessing.shared_memory block.
+    """
+
+    def __init__(self, shm, shape, dtype, owner):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape, dtype="float64"):
+        """New zero-filled shared array (this process owns and later unlinks it)."""
+        nbytes = max(1, int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        arr = cls(shm, shape, dtype, owner=True)
+        arr.array.fill(0)
+        return arr
+
+    @classmethod
+    def attach(cls, spec):
+        """Attaches to the array described by 'spec' (see spec())."""
+        name, shape, dtype = spec
+        return cls(_attach_memory(name), shape, dtype, owner=False)
+
+    def spec(self):
+        """(name, shape, dtype string): what another process needs to attach."""
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self):
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # views into the array are still alive somewhere; the mapping is
+            # released when they are garbage collected
+            pass
+
+    def unlink(self):
+        """Closes and, for the owner, frees the shared memory."""
+        self.close()
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+
+
+class SharedBuffers:
+    """
+    A named group of SharedArrays; buffers[name] is the NumPy view.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays  # name -> SharedArray
+
+    @classmethod
+    def create(cls, layout):
+        """
+        :param layout: { name: (shape, dtype) }
+        """
+        arrays = {}
+        try:
+            for name, (shape, dtype) in layout.items():
+                arrays[name] = SharedArray.create(shape, dtype)
+        except Exception:
+            for arr in arrays.values():
+                arr.unlink()
+            raise
+        return cls(arrays)
+
+    @classmethod
+    def attach(cls, specs):
+        """
+        :param specs: { name: spec } from specs() of the owning instance
+        """
+        return cls({name: SharedArray.attach(spec) for name, spec in specs.items()})
+
+    def specs(self):
+        return {name: arr.spec() for name, arr in self.arrays.items()}
+
+    def nbytes(self):
+        return sum(arr.array.nbytes for arr in self.arrays.values() if arr.array is not None)
+
+    def __getitem__(self, name):
+        return self.arrays[name].array
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def close(self):
+        for arr in self.arrays.values():
+            arr.close()
+
+    def unlink(self):
+        for arr in self.arrays.values():
+            arr.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if any(arr.owner for arr in self.arrays.values()):
+            self.unlink()
+        else:
+            self.close()
+        return False
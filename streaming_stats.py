@@ -0,0 +1,179 @@
+"""
+streaming_stats.py
+
+Single-pass statistics over many parallel streams (one per network entity),
+updated with one NumPy array per time step:
+  - RunningStats: count, mean, standard deviation (Welford's update), min, max
+  - P2Quantile: the P-square estimate (Jain & Chlamtac, 1985) of one quantile,
+    which keeps 5 markers per stream instead of all values
+  - StreamingStats: both together, e.g. for the 5th/50th/95th percentiles
+
+Memory is constant in the number of steps: a year of 15-minute steps costs
+the same as one day. state() / load_state() export and restore the running
+state as a flat dict of arrays (for np.savez), so a run can be checkpointed.
+
+Requires:
+  pip install numpy
+"""
+
+import numpy as np
+
+
+class RunningStats:
+    """
+    Count, mean, population standard deviation, min and max of 'size' streams.
+    """
+
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        np.minimum(self.min, x, out=self.min)
+        np.maximum(self.max, x, out=self.max)
+
+    def std(self):
+        if self.count == 0:
+            return np.full(len(self.mean), np.nan)
+        return np.sqrt(self.m2 / self.count)
+
+    def state(self, prefix=""):
+        return {f"{prefix}count": np.array(self.count), f"{prefix}mean": self.mean,
+                f"{prefix}m2": self.m2, f"{prefix}min": self.min, f"{prefix}max": self.max}
+
+    def load_state(self, state, prefix=""):
+        self.count = int(state[f"{prefix}count"])
+        self.mean = np.array(state[f"{prefix}mean"], dtype=float)
+        self.m2 = np.array(state[f"{prefix}m2"], dtype=float)
+        self.min = np.array(state[f"{prefix}min"], dtype=float)
+        self.max = np.array(state[f"{prefix}max"], dtype=float)
+
+
+class P2Quantile:
+    """
+    P-square estimate of quantile 'p' (0..1) for 'size' streams. Exact for up
+    to 5 values; after that each stream keeps 5 marker heights/positions that
+    are moved towards their desired positions with a parabolic (or, where that
+    would break their order, linear) step.
+    """
+
+    def __init__(self, size, p):
+        self.p = p
+        self.count = 0
+        self.q = np.zeros((size, 5))   # marker heights
+        self.n = np.zeros((size, 5))   # marker positions (1-based)
+        self.desired = np.array([1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0])
+        self.increment = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        if self.count < 5:
+            self.q[:, self.count] = x
+            self.count += 1
+            if self.count == 5:
+                self.q.sort(axis=1)
+                self.n[:] = np.arange(1, 6)
+            return
+        self.count += 1
+        q, n = self.q, self.n
+
+        # extend the extreme markers, then find the cell of x (0..3)
+        low = x < q[:, 0]
+        q[low, 0] = x[low]
+        high = x >= q[:, 4]
+        q[high, 4] = x[high]
+        cell = (x[:, None] >= q[:, 1:4]).sum(axis=1)
+        n += np.arange(5)[None, :] > cell[:, None]
+        self.desired += self.increment
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[:, i]
+            up = (d >= 1) & (n[:, i + 1] - n[:, i] > 1)
+            down = (d <= -1) & (n[:, i - 1] - n[:, i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            s = np.where(up[move], 1.0, -1.0)
+            qi, q_lo, q_hi = q[move, i], q[move, i - 1], q[move, i + 1]
+            ni, n_lo, n_hi = n[move, i], n[move, i - 1], n[move, i + 1]
+            parabolic = qi + s / (n_hi - n_lo) * (
+                (ni - n_lo + s) * (q_hi - qi) / (n_hi - ni)
+                + (n_hi - ni - s) * (qi - q_lo) / (ni - n_lo)
+            )
+            q_next = np.where(s > 0, q_hi, q_lo)
+            n_next = np.where(s > 0, n_hi, n_lo)
+            linear = qi + s * (q_next - qi) / (n_next - ni)
+            in_order = (q_lo < parabolic) & (parabolic < q_hi)
+            q[move, i] = np.where(in_order, parabolic, linear)
+            n[move, i] = ni + s
+
+    def value(self):
+        if self.count == 0:
+            return np.full(len(self.q), np.nan)
+        if self.count < 5:
+            return np.quantile(self.q[:, :self.count], self.p, axis=1)
+        return self.q[:, 2].copy()
+
+    def state(self, prefix=""):
+        return {f"{prefix}count": np.array(self.count), f"{prefix}q": self.q,
+                f"{prefix}n": self.n, f"{prefix}desired": self.desired}
+
+    def load_state(self, state, prefix=""):
+        self.count = int(state[f"{prefix}count"])
+        self.q = np.array(state[f"{prefix}q"], dtype=float)
+        self.n = np.array(state[f"{prefix}n"], dtype=float)
+        self.desired = np.array(state[f"{prefix}desired"], dtype=float)
+
+
+def quantile_name(p):
+    """Column name of quantile p, e.g. 0.05 -> 'p05', 0.5 -> 'p50'."""
+    return f"p{round(p * 100):02d}"
+
+
+class StreamingStats:
+    """
+    RunningStats plus one P2Quantile per entry of 'quantiles'.
+    """
+
+    def __init__(self, size, quantiles=(0.05, 0.5, 0.95)):
+        self.running = RunningStats(size)
+        self.quantiles = [P2Quantile(size, p) for p in quantiles]
+
+    def update(self, x):
+        self.running.update(x)
+        for est in self.quantiles:
+            est.update(x)
+
+    def summary(self):
+        """
+        { "count", "min", "max", "mean", "std", "p05", ... } (arrays except count).
+        """
+        out = {
+            "count": self.running.count,
+            "min": self.running.min,
+            "max": self.running.max,
+            "mean": self.running.mean,
+            "std": self.running.std(),
+        }
+        for est in self.quantiles:
+            out[quantile_name(est.p)] = est.value()
+        return out
+
+    def state(self, prefix=""):
+        st = self.running.state(prefix + "running_")
+        for est in self.quantiles:
+            st.update(est.state(f"{prefix}{quantile_name(est.p)}_"))
+        return st
+
+    def load_state(self, state, prefix=""):
+        self.running.load_state(state, prefix + "running_")
+        for est in self.quantiles:
+            est.load_state(state, f"{prefix}{quantile_name(est.p)}_")
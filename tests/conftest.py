@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def radial_network(n_feeders=3, depth=4, load_w=20e3, u_rated=10e3, r=0.2, x=0.1):
+    """
+    JSON-style input dict of a radial network: one source at node 1 with
+    'n_feeders' chains of 'depth' nodes, a side branch behind every second
+    chain node (the last one through a link) and a load on every other node.
+    """
+    nodes = [{"id": 1, "u_rated": u_rated}]
+    lines, links, loads = [], [], []
+    next_id = [2]
+
+    def new_node():
+        node_id = next_id[0]
+        next_id[0] += 1
+        nodes.append({"id": node_id, "u_rated": u_rated})
+        loads.append({"id": 1000 + node_id, "node": node_id, "status": 1,
+                      "p_specified": load_w * (1 + 0.1 * (node_id % 5)),
+                      "q_specified": 0.2 * load_w})
+        return node_id
+
+    for _ in range(n_feeders):
+        prev = 1
+        for k in range(depth):
+            node = new_node()
+            lines.append({"id": 500 + node, "from_node": prev, "to_node": node,
+                          "r1": r, "x1": x, "i_n": 200.0})
+            if k % 2:
+                side = new_node()
+                if k == depth - 1:
+                    links.append({"id": 800 + side, "from_node": node, "to_node": side})
+                else:
+                    lines.append({"id": 500 + side, "from_node": node, "to_node": side,
+                                  "r1": 2 * r, "x1": 2 * x, "i_n": 100.0})
+            prev = node
+
+    return {"data": {
+        "node": nodes,
+        "line": lines,
+        "link": links,
+        "source": [{"id": 900, "node": 1, "status": 1, "u_ref": 1.0}],
+        "sym_load": loads,
+    }}
+
+
+@pytest.fixture
+def radial_input():
+    """Factory fixture: radial_input(n_feeders=..., depth=..., ...) -> input dict."""
+    return radial_network
@@ -0,0 +1,97 @@
+import gzip
+import os
+
+import pytest
+
+from checkpoint import checkpoint_path_for, load_checkpoint, remove_checkpoint, save_checkpoint
+from conftest import REPO_ROOT
+from power_flow_solver import PowerFlowSession
+from time_series_runner_long import run_time_series_pf_long
+
+DEMO_INPUTS = {
+    "buildings_file": os.path.join(REPO_ROOT, "buildings_demo.csv"),
+    "lines_file": os.path.join(REPO_ROOT, "lines_demo.csv"),
+    "assignments_file": os.path.join(REPO_ROOT, "building_assignments.csv"),
+    "ts_file": os.path.join(REPO_ROOT, "time_series_loads.csv"),
+}
+
+
+class CrashingSession(PowerFlowSession):
+    """Raises on the 'crash_at'-th solve, like a run killed midway."""
+
+    def __init__(self, crash_at, **kwargs):
+        super().__init__(**kwargs)
+        self.crash_at = crash_at
+        self.solves = 0
+
+    def solve_arrays(self, *args, **kwargs):
+        self.solves += 1
+        if self.solves == self.crash_at:
+            raise RuntimeError("simulated crash")
+        return super().solve_arrays(*args, **kwargs)
+
+
+def read_output(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return f.read()
+
+
+def test_save_load_remove(tmp_path):
+    path = str(tmp_path / "run.checkpoint.json")
+    side = tmp_path / "run.stats_5.npz"
+    side.write_bytes(b"state")
+    assert load_checkpoint(path) is None
+
+    state = {"next_step": 5, "files": {"stats": str(side)}}
+    save_checkpoint(state, path)
+    assert load_checkpoint(path) == state
+    assert sorted(os.listdir(tmp_path)) == ["run.checkpoint.json", "run.stats_5.npz"]
+
+    remove_checkpoint(path)
+    assert os.listdir(tmp_path) == []
+    remove_checkpoint(path)
+
+
+@pytest.mark.parametrize("name", ["out.csv", "out.csv.gz"])
+def test_resume_truncates_to_checkpointed_offset(tmp_path, name):
+    full = str(tmp_path / ("full_" + name))
+    run_time_series_pf_long(**DEMO_INPUTS, output_csv=full, session=PowerFlowSession(),
+                            checkpoint_every=5)
+    assert not os.path.exists(checkpoint_path_for(full))
+
+    out = str(tmp_path / name)
+    with pytest.raises(RuntimeError, match="simulated crash"):
+        run_time_series_pf_long(**DEMO_INPUTS, output_csv=out, session=CrashingSession(14),
+                                checkpoint_every=5)
+    checkpoint = load_checkpoint(checkpoint_path_for(out))
+    assert checkpoint["next_step"] == 10
+    assert os.path.getsize(out) >= checkpoint["output_bytes"]
+
+    # rows written after the checkpoint (and a torn last write) must be dropped
+    with open(out, "ab") as f:
+        f.write(b"torn partial row,1,2")
+
+    run_time_series_pf_long(**DEMO_INPUTS, output_csv=out, session=PowerFlowSession(),
+                            checkpoint_every=5, resume=True)
+    assert read_output(out) == read_output(full)
+    assert not os.path.exists(checkpoint_path_for(out))
+
+
+def test_failed_stats_run_writes_no_table(tmp_path):
+    full = str(tmp_path / "full_stats.csv")
+    run_time_series_pf_long(**DEMO_INPUTS, output_csv=full, session=PowerFlowSession(),
+                            output_mode="stats")
+
+    out = str(tmp_path / "stats.csv")
+    with pytest.raises(RuntimeError, match="simulated crash"):
+        run_time_series_pf_long(**DEMO_INPUTS, output_csv=out, session=CrashingSession(14),
+                                checkpoint_every=5, output_mode="stats")
+    # only the checkpoint and its statistics file, no partial table
+    assert not os.path.exists(out)
+    assert load_checkpoint(checkpoint_path_for(out))["files"]["stats"]
+
+    run_time_series_pf_long(**DEMO_INPUTS, output_csv=out, session=PowerFlowSession(),
+                            checkpoint_every=5, output_mode="stats", resume=True)
+    assert read_output(out) == read_output(full)
+    assert sorted(os.listdir(tmp_path)) == ["full_stats.csv", "stats.csv"]
@@ -0,0 +1,36 @@
+import json
+import os
+
+import pytest
+
+from export_as_geojson import GeoJSONStreamWriter
+
+FEATURE = {"type": "Feature", "geometry": {"type": "Point", "coordinates": [8.5, 47.4]},
+           "properties": {"building_id": "B1"}}
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_stream_writer(tmp_path, ndjson):
+    path = str(tmp_path / "out.geojson")
+    with GeoJSONStreamWriter(path, ndjson=ndjson) as w:
+        w.write(FEATURE)
+        w.write(FEATURE)
+    assert os.listdir(tmp_path) == ["out.geojson"]
+    with open(path, encoding="utf-8") as f:
+        if ndjson:
+            assert [json.loads(line) for line in f] == [FEATURE, FEATURE]
+        else:
+            assert json.load(f) == {"type": "FeatureCollection", "features": [FEATURE, FEATURE]}
+
+
+def test_failed_export_keeps_previous_file(tmp_path):
+    path = str(tmp_path / "out.geojson")
+    with GeoJSONStreamWriter(path) as w:
+        w.write(FEATURE)
+    with pytest.raises(ValueError):
+        with GeoJSONStreamWriter(path) as w:
+            w.write(FEATURE)
+            raise ValueError("bad row")
+    assert os.listdir(tmp_path) == ["out.geojson"]
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["features"] == [FEATURE]
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from feeder_decomposition import feeder_heads, partition_feeders, run_power_flow_by_feeder
+from power_flow_solver import _input_to_arrays, run_power_flow_sweep
+from topology_cache import build_topology, node_index
+
+PARAMS = {"error_tolerance": 1e-10}
+
+
+def assert_same_results(actual, expected):
+    assert actual["converged"] and expected["converged"]
+    for kind, fields in (("node", ("u_pu", "u", "u_angle", "p", "q")),
+                         ("line", ("i_from", "p_from", "loading"))):
+        rows, ref = actual["data"][kind], expected["data"][kind]
+        assert [row["id"] for row in rows] == [row["id"] for row in ref]
+        for field in fields:
+            np.testing.assert_allclose([row[field] for row in rows], [row[field] for row in ref],
+                                       rtol=1e-7, atol=1e-7, err_msg=f"{kind}.{field}")
+
+
+def test_feeder_heads(radial_input):
+    input_data = radial_input(n_feeders=3, depth=4)
+    arrays = _input_to_arrays(input_data)
+    topology = build_topology(arrays)
+    head = feeder_heads(topology)
+
+    assert head[node_index(topology, [1])[0]] == -1
+    # the first node of every chain heads its feeder; everything behind it follows
+    first = [ln["to_node"] for ln in input_data["data"]["line"] if ln["from_node"] == 1]
+    assert len(first) == 3
+    head_of = dict(zip(arrays["node_id"].tolist(), head.tolist()))
+    for ln in input_data["data"]["line"] + input_data["data"]["link"]:
+        if ln["from_node"] != 1:
+            assert head_of[ln["to_node"]] == head_of[ln["from_node"]]
+    assert sorted(set(head.tolist()) - {-1}) == sorted(node_index(topology, first).tolist())
+
+
+def test_partition_balances_feeders(radial_input):
+    topology = build_topology(_input_to_arrays(radial_input(n_feeders=4, depth=4)))
+    part, n_parts = partition_feeders(topology, 2)
+    assert n_parts == 2
+    assert part[feeder_heads(topology) < 0].tolist() == [-1]
+    assert np.bincount(part[part >= 0]).tolist() == [12, 12]
+    # never more parts than feeders
+    assert partition_feeders(topology, 10)[1] == 4
+
+
+@pytest.mark.parametrize("parts", [1, 2, 3])
+def test_matches_full_sweep(radial_input, parts):
+    input_data = radial_input(n_feeders=3, depth=5)
+    expected = run_power_flow_sweep(input_data, PARAMS)
+    actual = run_power_flow_by_feeder(input_data, PARAMS, workers=1, parts=parts)
+    assert_same_results(actual, expected)
+
+
+def test_source_supplies_its_local_load(radial_input):
+    input_data = radial_input(n_feeders=3, depth=5)
+    base = run_power_flow_by_feeder(input_data, PARAMS, workers=1, parts=2)
+    input_data["data"]["sym_load"].append({"id": 999, "node": 1, "status": 1,
+                                           "p_specified": 50e3, "q_specified": 10e3})
+    actual = run_power_flow_by_feeder(input_data, PARAMS, workers=1, parts=2)
+
+    source, base_source = actual["data"]["node"][0], base["data"]["node"][0]
+    assert source["id"] == 1
+    assert source["p"] == pytest.approx(base_source["p"] + 50e3, rel=1e-9)
+    assert source["q"] == pytest.approx(base_source["q"] + 10e3, rel=1e-9)
+    assert_same_results(actual, run_power_flow_sweep(input_data, PARAMS))
+
+
+def test_matches_full_sweep_in_worker_processes(radial_input):
+    input_data = radial_input(n_feeders=4, depth=3)
+    expected = run_power_flow_sweep(input_data, PARAMS)
+    actual = run_power_flow_by_feeder(_input_to_arrays(input_data), PARAMS, workers=2, parts=2)
+    assert_same_results(actual, expected)
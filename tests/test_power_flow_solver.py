@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from power_flow_solver import PowerFlowSession, _input_to_arrays, run_power_flow_sweep
+
+
+def two_bus_input(p_w=1e6, r=1.0, u_rated=10e3):
+    """Source at node 1, one resistive line to node 2 with a load of 'p_w'."""
+    return {"data": {
+        "node": [{"id": 1, "u_rated": u_rated}, {"id": 2, "u_rated": u_rated}],
+        "line": [{"id": 10, "from_node": 1, "to_node": 2, "r1": r, "x1": 0.0, "i_n": 100.0}],
+        "source": [{"id": 20, "node": 1, "status": 1, "u_ref": 1.0}],
+        "sym_load": [{"id": 30, "node": 2, "status": 1, "p_specified": p_w, "q_specified": 0.0}],
+    }}
+
+
+def by_id(rows):
+    return {row["id"]: row for row in rows}
+
+
+def test_two_bus_matches_closed_form():
+    # constant-power load behind a resistance: V2^2 - V2 + r_pu * p_pu = 0
+    out = run_power_flow_sweep(two_bus_input(), {"error_tolerance": 1e-12})
+    r_pu, p_pu = 1.0 * 1e6 / 10e3 ** 2, 1.0
+    v2 = (1 + np.sqrt(1 - 4 * r_pu * p_pu)) / 2
+    i_a = 1e6 / (v2 * np.sqrt(3) * 10e3)
+
+    nodes = by_id(out["data"]["node"])
+    line = by_id(out["data"]["line"])[10]
+    assert out["converged"]
+    assert nodes[1]["u_pu"] == pytest.approx(1.0)
+    assert nodes[2]["u_pu"] == pytest.approx(v2, abs=1e-9)
+    assert nodes[2]["u"] == pytest.approx(v2 * 10e3, rel=1e-9)
+    assert nodes[2]["p"] == pytest.approx(-1e6)
+    assert line["i_from"] == pytest.approx(i_a, rel=1e-8)
+    assert line["loading"] == pytest.approx(i_a / 100.0, rel=1e-8)
+    # the source supplies the load plus the line losses (3 * I^2 * R)
+    assert nodes[1]["p"] == pytest.approx(1e6 + 3 * i_a ** 2 * 1.0, rel=1e-8)
+    assert line["p_from"] == pytest.approx(nodes[1]["p"], rel=1e-8)
+
+
+def test_no_load_gives_flat_voltages():
+    out = run_power_flow_sweep(two_bus_input(p_w=0.0))
+    assert out["converged"]
+    assert [nd["u_pu"] for nd in out["data"]["node"]] == pytest.approx([1.0, 1.0])
+    assert out["data"]["line"][0]["i_from"] == pytest.approx(0.0)
+
+
+@pytest.mark.parametrize("source_load_w", [0.0, 50e3])
+def test_radial_power_balance(radial_input, source_load_w):
+    input_data = radial_input(n_feeders=3, depth=5)
+    # a load at the source node adds to what the source supplies
+    input_data["data"]["sym_load"].append({"id": 999, "node": 1, "status": 1,
+                                           "p_specified": source_load_w, "q_specified": 0.0})
+    out = run_power_flow_sweep(input_data, {"error_tolerance": 1e-12})
+    assert out["converged"]
+
+    lines = input_data["data"]["line"]
+    r = {ln["id"]: ln["r1"] for ln in lines}
+    losses = sum(3 * row["i_from"] ** 2 * r[row["id"]] for row in out["data"]["line"])
+    loads = sum(ld["p_specified"] for ld in input_data["data"]["sym_load"])
+    source_p = by_id(out["data"]["node"])[1]["p"]
+    assert source_p == pytest.approx(loads + losses, rel=1e-8)
+
+    # voltages fall along every chain away from the source
+    u = {nd["id"]: nd["u_pu"] for nd in out["data"]["node"]}
+    for ln in lines:
+        assert u[ln["to_node"]] < u[ln["from_node"]]
+    for lk in input_data["data"]["link"]:
+        assert u[lk["to_node"]] == pytest.approx(u[lk["from_node"]])
+
+
+def test_session_warm_start_and_state(radial_input):
+    input_data = radial_input()
+    cold = run_power_flow_sweep(input_data, {"error_tolerance": 1e-10})
+
+    session = PowerFlowSession(tol=1e-10)
+    first = session.solve(input_data)
+    second = session.solve(input_data)
+    u_cold = [nd["u_pu"] for nd in cold["data"]["node"]]
+    assert [nd["u_pu"] for nd in first["sym"]["data"]["node"]] == pytest.approx(u_cold)
+    assert second["iterations"] < first["iterations"]
+    assert session.iteration_history == [first["iterations"], second["iterations"]]
+
+    # a new session restored from the state starts warm as well
+    restored = PowerFlowSession(tol=1e-10)
+    restored.set_state(session.get_state())
+    again = restored.solve_arrays(_input_to_arrays(input_data), as_arrays=True)
+    assert again["iterations"] == second["iterations"]
+    assert again["arrays"]["node_u_pu"] == pytest.approx(u_cold)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from power_flow_solver import PowerFlowSession, _input_to_arrays
+from screening import StepScreener, select_steps
+from topology_cache import build_topology
+
+SCALES = np.array([0.5, 2.0, 1.0, 3.0, -1.0])
+
+
+def test_select_steps():
+    severity = np.array([0.2, 0.9, 0.5, 0.9, 1.2, 0.1])
+    assert select_steps(severity).all()
+    assert select_steps(severity, threshold=0.9).tolist() == [False, True, False, True, True, False]
+    # ties keep step order
+    assert select_steps(severity, top_k=2).tolist() == [False, True, False, False, True, False]
+    assert select_steps(severity, top_k=1, threshold=0.5).tolist() == [False, True, True, True, True, False]
+    assert select_steps(severity, top_k=100).all()
+    assert not select_steps(severity, top_k=0, threshold=2.0).any()
+
+
+@pytest.fixture
+def network(radial_input):
+    arrays = _input_to_arrays(radial_input(n_feeders=3, depth=5))
+    arrays["load_p_kW"] = arrays["load_p"] / 1000.0
+    arrays["load_status"] = np.ones(len(arrays["load_p"]))
+    return arrays, build_topology(arrays)
+
+
+def solve_scaled(arrays, scales):
+    session = PowerFlowSession(tol=1e-10)
+    u = []
+    for scale in scales:
+        step = dict(arrays, load_p=arrays["load_p"] * scale)
+        u.append(session.solve_arrays(step, as_arrays=True)["arrays"]["node_u_pu"])
+    return np.array(u)
+
+
+def test_estimates_follow_solved_voltages(network):
+    arrays, topology = network
+    screener = StepScreener(arrays, topology, voltage_limits=(0.95, 1.05))
+    all_loads = np.arange(len(arrays["load_p"]))
+    est = screener.estimate(all_loads, SCALES[:, None] * arrays["load_p_kW"][None, :])
+
+    u = solve_scaled(arrays, SCALES)
+    np.testing.assert_allclose(est["min_voltage_pu"], u.min(axis=1), atol=5e-3)
+    np.testing.assert_allclose(est["max_voltage_pu"], u.max(axis=1), atol=5e-3)
+    # generation raises the voltage, loads lower it
+    assert est["max_voltage_pu"][-1] > 1.0
+    assert np.all(est["min_voltage_pu"][:-1] < 1.0)
+
+    # for the load steps, severity ranks like the solved voltage drop
+    drop = 1.0 - u[:-1].min(axis=1)
+    assert np.argsort(est["severity"][:-1]).tolist() == np.argsort(drop).tolist()
+    solve = select_steps(est["severity"][:-1], top_k=2)
+    assert np.flatnonzero(solve).tolist() == sorted(np.argsort(-drop)[:2].tolist())
+
+
+def test_estimate_keeps_base_loads_without_series(network):
+    arrays, topology = network
+    screener = StepScreener(arrays, topology)
+    base = screener.estimate([], np.zeros((2, 0)))
+    ts_pos = np.array([0, 3])
+    same = screener.estimate(ts_pos, np.tile(arrays["load_p_kW"][ts_pos], (2, 1)))
+    for key in base:
+        np.testing.assert_allclose(same[key], base[key])
+    # only the loads with a series change
+    more = screener.estimate(ts_pos, np.tile(10 * arrays["load_p_kW"][ts_pos], (2, 1)))
+    assert np.all(more["severity"] > base["severity"])
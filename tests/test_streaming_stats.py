@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from streaming_stats import P2Quantile, RunningStats, StreamingStats, quantile_name
+
+
+def feed(estimator, samples):
+    for row in samples:
+        estimator.update(row)
+    return estimator
+
+
+@pytest.mark.parametrize("p", [0.05, 0.5, 0.95])
+def test_p2_accuracy(p):
+    # 20 streams of 5000 steps with different distributions
+    rng = np.random.default_rng(1)
+    samples = np.concatenate([
+        rng.normal(1.0, 0.02, (5000, 10)),
+        rng.exponential(30.0, (5000, 5)),
+        rng.uniform(-1.0, 1.0, (5000, 5)),
+    ], axis=1)
+    est = feed(P2Quantile(samples.shape[1], p), samples)
+    exact = np.quantile(samples, p, axis=0)
+    spread = np.quantile(samples, 0.99, axis=0) - np.quantile(samples, 0.01, axis=0)
+    assert np.all(np.abs(est.value() - exact) <= 0.02 * spread)
+
+
+def test_p2_exact_for_few_values():
+    samples = np.array([[3.0, -1.0], [1.0, -2.0], [2.0, -3.0], [5.0, -4.0]])
+    est = P2Quantile(2, 0.5)
+    assert np.all(np.isnan(est.value()))
+    for k in range(1, len(samples) + 1):
+        est.update(samples[k - 1])
+        np.testing.assert_allclose(est.value(), np.quantile(samples[:k], 0.5, axis=0))
+
+
+def test_running_stats():
+    rng = np.random.default_rng(2)
+    samples = rng.normal(1e6, 5.0, (1000, 3))
+    stats = feed(RunningStats(3), samples)
+    assert stats.count == 1000
+    np.testing.assert_allclose(stats.mean, samples.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stats.std(), samples.std(axis=0), rtol=1e-9)
+    np.testing.assert_array_equal(stats.min, samples.min(axis=0))
+    np.testing.assert_array_equal(stats.max, samples.max(axis=0))
+
+
+def test_state_round_trip():
+    rng = np.random.default_rng(3)
+    samples = rng.normal(size=(400, 4))
+    straight = feed(StreamingStats(4), samples)
+
+    first = feed(StreamingStats(4), samples[:150])
+    state = {key: np.array(value) for key, value in first.state("s_").items()}
+    resumed = StreamingStats(4)
+    resumed.load_state(state, "s_")
+    feed(resumed, samples[150:])
+
+    expected, actual = straight.summary(), resumed.summary()
+    assert sorted(actual) == ["count", "max", "mean", "min", "p05", "p50", "p95", "std"]
+    assert actual["count"] == expected["count"]
+    for key in sorted(set(actual) - {"count"}):
+        np.testing.assert_allclose(actual[key], expected[key], rtol=1e-12, err_msg=key)
+
+
+def test_quantile_name():
+    assert [quantile_name(p) for p in (0.05, 0.5, 0.95)] == ["p05", "p50", "p95"]
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+import topology_cache
+from power_flow_solver import _input_to_arrays
+from topology_cache import (
+    _TOPOLOGY_ARRAYS, build_topology, clear_topology_cache, get_topology,
+    load_topology, node_index, save_topology, structure_hash,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_topology_cache()
+    yield
+    clear_topology_cache()
+
+
+def assert_same_topology(a, b):
+    for name in _TOPOLOGY_ARRAYS:
+        np.testing.assert_array_equal(a[name], b[name], err_msg=name)
+    assert a["n_nodes"] == b["n_nodes"]
+    assert len(a["levels"]) == len(b["levels"])
+    for lvl_a, lvl_b in zip(a["levels"], b["levels"]):
+        np.testing.assert_array_equal(lvl_a, lvl_b)
+
+
+def test_save_load_round_trip(radial_input, tmp_path):
+    topology = build_topology(_input_to_arrays(radial_input()))
+    path = str(tmp_path / "topo.npz")
+    save_topology(topology, path)
+    assert os.listdir(tmp_path) == ["topo.npz"]
+    assert_same_topology(load_topology(path), topology)
+
+
+def test_get_topology_uses_memory_then_disk(radial_input, tmp_path, monkeypatch):
+    arrays = _input_to_arrays(radial_input())
+    cache_dir = str(tmp_path / "cache")
+    built, key = get_topology(arrays, cache_dir=cache_dir)
+    assert key == structure_hash(arrays)
+    assert os.listdir(cache_dir) == [f"topology_{key}.npz"]
+    assert get_topology(arrays, cache_dir=cache_dir)[0] is built
+
+    # a fresh process (empty memory cache) reads the file instead of building
+    clear_topology_cache()
+
+    def no_build(_arrays):
+        raise AssertionError("topology was rebuilt")
+
+    monkeypatch.setattr(topology_cache, "build_topology", no_build)
+    loaded, loaded_key = get_topology(arrays, cache_dir=cache_dir)
+    assert loaded_key == key
+    assert loaded is not built
+    assert_same_topology(loaded, built)
+
+
+def test_hash_ignores_loads(radial_input):
+    input_data = radial_input()
+    arrays = _input_to_arrays(input_data)
+    for ld in input_data["data"]["sym_load"]:
+        ld["p_specified"] *= 3
+    assert structure_hash(_input_to_arrays(input_data)) == structure_hash(arrays)
+
+    input_data["data"]["line"][0]["r1"] += 0.01
+    assert structure_hash(_input_to_arrays(input_data)) != structure_hash(arrays)
+
+
+def test_node_index(radial_input):
+    arrays = _input_to_arrays(radial_input())
+    topology = build_topology(arrays)
+    pos = node_index(topology, arrays["node_id"][::-1])
+    np.testing.assert_array_equal(pos, np.arange(len(arrays["node_id"]))[::-1])
+    with pytest.raises(KeyError, match="Unknown node IDs"):
+        node_index(topology, [1, 99999])
@@ -0,0 +1,595 @@
+"""
+time_series_outputs.py
+
+Output sinks of the time-series runner (time_series_runner_long.py), one per
+'output_mode'. The runner hands every solved step to its sink as result arrays
+in model order (base_model["nodes"] / base_model["lines"]):
+
+    sink = open_output_sink(output_mode, output_csv, entities, time_headers, ...)
+    sink.write_step(time_label, node_u_pu, node_p, line_i_a, checkpoint=None, node_q=None)
+    sink.close()   # close(ok=False) after a failed or interrupted run
+    sink.rows  # rows written
+
+  node_u_pu: voltage in p.u., node_p: injection in W, line_i_a: current in A,
+  node_q: injection in var (optional; only the long output uses it)
+
+Modes:
+  - "long":  LongCsvSink, one row per (time_step, entity) (LONG_COLUMNS),
+             formatted and written by a writer thread
+  - "stats": StatsSink, running per-entity statistics (streaming_stats.py),
+             written as one row per node and line only when the run completes
+             (STATS_COLUMNS): min/max/mean/std and the 5/50/95th percentiles of
+             voltage_pu or loading_percent, and the steps and hours outside the
+             voltage band / above the loading limit. Memory and output size do
+             not grow with the number of steps.
+  - "events": EventsSink, only the limit violations (EVENT_COLUMNS): one row
+             per node outside the voltage band and per line above the loading
+             limit in a step, found with vectorized masks over the step's arrays.
+  - "feeders": FeederSink, one row per (time_step, feeder) (FEEDER_COLUMNS):
+             total load, line losses, lowest voltage and highest line loading.
+             Every node and line is mapped to its feeder once, from the model
+             topology (feeder_map); each step is then a few group-by reductions.
+
+A step handed over with a 'checkpoint' dict is made durable by the sink, which
+adds what it needs to resume (output offset, statistics file) and saves the
+checkpoint (checkpoint.py); open_output_sink(..., checkpoint=...) resumes from it.
+close(ok=False) leaves the output as of the last durable step (the stats table
+is not written at all), so a resumed run can complete it.
+"""
+
+import csv
+import gzip
+import io
+import math
+import os
+import queue
+import threading
+
+import numpy as np
+
+from checkpoint import save_checkpoint
+from feeder_decomposition import feeder_heads
+from json_generator import model_to_solver_arrays
+from streaming_stats import StreamingStats, quantile_name
+from topology_cache import get_topology, node_index
+
+LONG_COLUMNS = [
+    "time_step","entity_id","record_type","line_id",
+    "voltage_pu","p_injection_kW","q_injection_kvar","pf",
+    "i_from_a","i_to_a","line_rating_a","loading_percent"
+]
+
+STATS_QUANTILES = (0.05, 0.5, 0.95)
+_STAT_FIELDS = ["min","max","mean","std"] + [quantile_name(p) for p in STATS_QUANTILES]
+STATS_COLUMNS = ["entity_id","record_type","line_id","quantity","steps"] + _STAT_FIELDS + [
+    "limit","steps_outside_limit","hours_outside_limit"
+]
+
+EVENT_COLUMNS = [
+    "time_step","entity_id","record_type","line_id",
+    "event","quantity","value","limit"
+]
+
+FEEDER_COLUMNS = [
+    "time_step","feeder","total_load_kW","losses_kW","min_voltage_pu","max_loading_percent"
+]
+
+OUTPUT_MODES = ("long", "stats", "events", "feeders")
+
+# default limits: voltage band in p.u. and line loading in percent of i_n
+VOLTAGE_MIN_PU = 0.95
+VOLTAGE_MAX_PU = 1.05
+LOADING_MAX_PERCENT = 100.0
+
+# steps the solver may run ahead of the writer thread
+PIPELINE_QUEUE_STEPS = 8
+# compression level for '.gz' outputs (zlib's 9 costs much more time for little gain)
+GZIP_LEVEL = 6
+# step length when it cannot be inferred from the time labels (15 minutes)
+DEFAULT_STEP_HOURS = 0.25
+
+
+def model_entities(model, feeders=False):
+    """
+    Ids, names, line ratings and resistances of the model's nodes and lines, in
+    model order (the order of the result arrays handed to the sinks), and with
+    feeders=True their feeder_map under "feeders".
+    """
+    entities = {
+        "node_ids": [nd["id"] for nd in model["nodes"]],
+        "node_names": [nd["name"] for nd in model["nodes"]],
+        "line_ids": [ln["id"] for ln in model["lines"]],
+        "line_names": [ln["name"] for ln in model["lines"]],
+        "line_ratings": [ln["i_n"] for ln in model["lines"]],  # nominal rating in A
+        "line_r1": [ln.get("r1", 0.0) for ln in model["lines"]],  # ohm
+    }
+    if feeders:
+        entities["feeders"] = feeder_map(model)
+    return entities
+
+
+def feeder_map(model):
+    """
+    The feeder of every node and line, from the model topology: a feeder is the
+    subtree below a node directly under a source (feeder_decomposition.feeder_heads),
+    named after that node; a line belongs to the feeder of its downstream end.
+    Returns {"names": feeder names in model order,
+             "node_feeder", "line_feeder": feeder number per node / line in
+             model order, -1 for sources and anything not fed from a source}.
+    """
+    arrays = model_to_solver_arrays(model)
+    topology, _ = get_topology(arrays)
+    head = feeder_heads(topology)
+    node_pos = node_index(topology, arrays["node_id"])
+    # model index of the node at every topology position
+    model_index = np.empty(len(node_pos), dtype=np.int64)
+    model_index[node_pos] = np.arange(len(node_pos))
+
+    node_head = head[node_pos]
+    # one end of a line into a feeder head is the source (-1), otherwise both agree
+    line_head = np.maximum(head[node_index(topology, arrays["line_from"])],
+                           head[node_index(topology, arrays["line_to"])])
+    heads = np.unique(model_index[node_head[node_head >= 0]])
+
+    def feeder_number(head_pos):
+        number = np.full(len(head_pos), -1, dtype=np.int64)
+        fed = head_pos >= 0
+        number[fed] = np.searchsorted(heads, model_index[head_pos[fed]])
+        return number
+
+    return {
+        "names": [model["nodes"][k]["name"] for k in heads.tolist()],
+        "node_feeder": feeder_number(node_head),
+        "line_feeder": feeder_number(line_head),
+    }
+
+
+def step_hours_from_labels(time_headers, default=DEFAULT_STEP_HOURS):
+    """
+    Step length in hours from the first two 'HH:MM[:SS]' labels (wrapping at
+    midnight), or 'default' if there are fewer than two or they do not parse.
+    """
+    def seconds(label):
+        parts = [int(x) for x in label.strip().split(" ")[-1].split(":")]
+        parts += [0] * (3 - len(parts))
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+    if len(time_headers) < 2:
+        return default
+    try:
+        delta = (seconds(time_headers[1]) - seconds(time_headers[0])) % 86400
+    except (ValueError, IndexError):
+        return default
+    return delta / 3600.0 if delta > 0 else default
+
+
+def loading_percent(line_i_a, line_rating_a):
+    """
+    Line loading in percent of the rating (0 where the rating is not positive).
+    """
+    out = np.zeros(len(line_rating_a))
+    np.divide(line_i_a * 100.0, line_rating_a, out=out, where=line_rating_a > 0)
+    return out
+
+
+def get_node_record_type(node_name):
+    """
+    Decide if node is building, station, feeder, or other_node.
+    """
+    if node_name.startswith("B"):
+        return "building"
+    elif node_name == "MainSubstation":
+        return "station"
+    elif node_name.startswith("Feeder"):
+        return "feeder"
+    else:
+        return "other_node"
+
+def _append_step_rows(results_rows, time_label, node_results, line_results,
+                      node_id_to_name, line_rating_map, line_id_map):
+    """
+    Appends the long-format rows of one time step.
+    :param node_results: iterable of (node_id, u_pu, p in W, q in var or None)
+    :param line_results: iterable of (line_id, i_from in A)
+    """
+    # parse node results
+    for node_id, v_pu, p_w, q_var in node_results:
+        node_name = node_id_to_name[node_id]
+        r_type = get_node_record_type(node_name)  # building, station, feeder, other
+        p_kW = p_w/1000.0
+        # solvers without q (the dummy one): approximate it
+        if q_var is None:
+            q_var = 0.3*p_w
+        q_kvar = q_var/1000.0
+        s_kW = math.sqrt((p_kW**2)+(q_kvar**2)) if abs(p_kW)>1e-9 or abs(q_kvar)>1e-9 else 1e-9
+        pf_val = abs(p_kW/s_kW) if s_kW>1e-9 else 1.0
+
+        row = {
+            "time_step": time_label,
+            "entity_id": node_name,
+            "record_type": r_type,
+            "line_id": "",
+            "voltage_pu": round(v_pu,3),
+            "p_injection_kW": round(p_kW,3),
+            "q_injection_kvar": round(q_kvar,3),
+            "pf": round(pf_val,3),
+            "i_from_a": "",
+            "i_to_a": "",
+            "line_rating_a": "",
+            "loading_percent": ""
+        }
+        results_rows.append(row)
+
+    # parse line results
+    for l_id, i_from in line_results:
+        rating_a = line_rating_map.get(l_id, 9999)
+        load_pct = 0.0
+        if rating_a>0:
+            load_pct = (i_from/rating_a)*100.0
+
+        row = {
+            "time_step": time_label,
+            "entity_id": "",
+            "record_type": "line",
+            "line_id": line_id_map[l_id],
+            "voltage_pu": "",
+            "p_injection_kW": "",
+            "q_injection_kvar": "",
+            "pf": "",
+            "i_from_a": round(i_from,3),
+            "i_to_a": "",
+            "line_rating_a": rating_a,
+            "loading_percent": round(load_pct,2)
+        }
+        results_rows.append(row)
+
+class _OutputStream:
+    """
+    Text output on a binary file, gzip-compressed if 'path' ends in '.gz'.
+    sync() flushes everything written so far to disk and returns the byte
+    offset up to which the file is complete; for '.gz' it ends the current gzip
+    member there and continues in a new one (concatenated members are one valid
+    gzip file), so the file can later be truncated to that offset and appended to.
+    """
+
+    def __init__(self, path, append_at=None):
+        self._gz = path.endswith(".gz")
+        if append_at is None:
+            self._raw = open(path, "wb")
+        else:
+            self._raw = open(path, "r+b")
+            self._raw.truncate(append_at)
+            self._raw.seek(append_at)
+        self._open_text()
+
+    def _open_text(self):
+        inner = (gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=GZIP_LEVEL)
+                 if self._gz else self._raw)
+        self.text = io.TextIOWrapper(inner, encoding="utf-8", newline="")
+
+    def _end_text(self):
+        self.text.flush()
+        inner = self.text.detach()
+        if self._gz:
+            inner.close()  # writes the member trailer, leaves self._raw open
+
+    def sync(self):
+        if self._gz:
+            self._end_text()
+        else:
+            self.text.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        offset = self._raw.tell()
+        if self._gz:
+            self._open_text()  # GzipFile writes the next member's header right away
+        return offset
+
+    def close(self):
+        self._end_text()
+        self._raw.close()
+
+class LongCsvSink:
+    """
+    Long CSV output with a writer thread. write_step() converts the step's
+    arrays to lists and queues them (blocking while the queue is full); the
+    thread formats them with _append_step_rows and writes them. A step handed
+    over with a 'checkpoint' dict is synced to disk after its rows, and the
+    checkpoint is saved with the output offset and row count added. An error
+    of the thread is re-raised by the next write_step(), so the run stops
+    instead of solving steps that cannot be written; close() drains the queue,
+    closes the file and re-raises it as well.
+
+    To resume, pass the last checkpoint: the file is truncated at its offset
+    and no header is written.
+    """
+
+    def __init__(self, output_csv, entities, checkpoint_path=None, checkpoint=None,
+                 queue_steps=PIPELINE_QUEUE_STEPS):
+        append_at = checkpoint["output_bytes"] if checkpoint is not None else None
+        self.rows = checkpoint["result_rows"] if checkpoint is not None else 0
+        self.error = None
+        self._node_ids = entities["node_ids"]
+        self._line_ids = entities["line_ids"]
+        self._maps = (dict(zip(entities["node_ids"], entities["node_names"])),
+                      dict(zip(entities["line_ids"], entities["line_ratings"])),
+                      dict(zip(entities["line_ids"], entities["line_names"])))
+        self._checkpoint_path = checkpoint_path
+        self._queue = queue.Queue(maxsize=queue_steps)
+        self._stream = _OutputStream(output_csv, append_at=append_at)
+        if append_at is None:
+            csv.DictWriter(self._stream.text, fieldnames=LONG_COLUMNS).writeheader()
+        self._thread = threading.Thread(target=self._run, name="long-csv-writer", daemon=True)
+        self._thread.start()
+
+    def write_step(self, time_label, node_u_pu, node_p, line_i_a, checkpoint=None, node_q=None):
+        if self.error is not None:
+            raise self.error
+        # lists are taken now: the arrays may be reused for the next steps
+        q_values = node_q.tolist() if node_q is not None else [None] * len(self._node_ids)
+        node_results = zip(self._node_ids, node_u_pu.tolist(), node_p.tolist(), q_values)
+        line_results = zip(self._line_ids, line_i_a.tolist())
+        self._queue.put((time_label, node_results, line_results, checkpoint))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # keep draining so write_step() never blocks forever
+            try:
+                time_label, node_results, line_results, checkpoint = item
+                step_rows = []
+                _append_step_rows(step_rows, time_label, node_results, line_results, *self._maps)
+                # the text layer is replaced by sync() for '.gz' outputs
+                csv.DictWriter(self._stream.text, fieldnames=LONG_COLUMNS).writerows(step_rows)
+                self.rows += len(step_rows)
+                if checkpoint is not None:
+                    checkpoint["output_bytes"] = self._stream.sync()
+                    checkpoint["result_rows"] = self.rows
+                    save_checkpoint(checkpoint, self._checkpoint_path)
+            except Exception as exc:
+                self.error = exc
+
+    def close(self, ok=True):
+        self._queue.put(None)
+        self._thread.join()
+        self._stream.close()
+        if self.error is not None:
+            raise self.error
+
+class StatsSink:
+    """
+    Per-entity statistics output (see module docstring). write_step() updates
+    the running statistics in place; close() writes the table. After a failed
+    run, close(ok=False) writes nothing: a table of a partial pass would look
+    like a finished result (the checkpoint's statistics file resumes it).
+
+    At a checkpoint the statistics are saved to
+    '<checkpoint path without .json>.stats_<next step>.npz' (written to a temp
+    file, then renamed), the checkpoint lists it as its "stats" side file, and
+    the file of the previous checkpoint is removed. Resuming loads it.
+    """
+
+    def __init__(self, output_csv, entities, time_headers, checkpoint_path=None, checkpoint=None,
+                 voltage_limits=(VOLTAGE_MIN_PU, VOLTAGE_MAX_PU), loading_limit=LOADING_MAX_PERCENT):
+        self.rows = 0
+        self._output_csv = output_csv
+        self._entities = entities
+        self._checkpoint_path = checkpoint_path
+        self._step_hours = step_hours_from_labels(time_headers)
+        self._v_min, self._v_max = voltage_limits
+        self._loading_limit = loading_limit
+        self._ratings = np.array(entities["line_ratings"], dtype=float)
+        n_nodes, n_lines = len(entities["node_ids"]), len(entities["line_ids"])
+        self._voltage = StreamingStats(n_nodes, STATS_QUANTILES)
+        self._loading = StreamingStats(n_lines, STATS_QUANTILES)
+        self._voltage_outside = np.zeros(n_nodes, dtype=np.int64)
+        self._loading_above = np.zeros(n_lines, dtype=np.int64)
+        self._state_file = None
+        if checkpoint is not None:
+            self._state_file = checkpoint["files"]["stats"]
+            with np.load(self._state_file) as state:
+                self._voltage.load_state(state, "voltage_")
+                self._loading.load_state(state, "loading_")
+                self._voltage_outside = state["voltage_outside"].copy()
+                self._loading_above = state["loading_above"].copy()
+
+    def write_step(self, time_label, node_u_pu, node_p, line_i_a, checkpoint=None, node_q=None):
+        loading = loading_percent(line_i_a, self._ratings)
+        self._voltage.update(node_u_pu)
+        self._loading.update(loading)
+        self._voltage_outside += (node_u_pu < self._v_min) | (node_u_pu > self._v_max)
+        self._loading_above += loading > self._loading_limit
+        if checkpoint is not None:
+            self._save_state(checkpoint)
+
+    def _save_state(self, checkpoint):
+        base = os.path.splitext(self._checkpoint_path)[0]
+        state_file = f"{base}.stats_{checkpoint['next_step']}.npz"
+        state = dict(self._voltage.state("voltage_"), **self._loading.state("loading_"),
+                     voltage_outside=self._voltage_outside, loading_above=self._loading_above)
+        with open(state_file + ".tmp", "wb") as f:
+            np.savez(f, **state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(state_file + ".tmp", state_file)
+        checkpoint["files"] = {"stats": state_file}
+        save_checkpoint(checkpoint, self._checkpoint_path)
+        if self._state_file is not None and os.path.exists(self._state_file):
+            os.remove(self._state_file)
+        self._state_file = state_file
+
+    def _table_rows(self):
+        ent = self._entities
+        voltage_limit = f"{self._v_min}-{self._v_max}"
+        for stats, outside, digits, quantity, limit, names in (
+            (self._voltage, self._voltage_outside, 4, "voltage_pu", voltage_limit, ent["node_names"]),
+            (self._loading, self._loading_above, 2, "loading_percent", self._loading_limit, ent["line_names"]),
+        ):
+            summary = stats.summary()
+            values = {key: np.round(summary[key], digits).tolist() for key in _STAT_FIELDS}
+            hours = np.round(outside * self._step_hours, 4).tolist()
+            is_node = quantity == "voltage_pu"
+            for k, name in enumerate(names):
+                row = {
+                    "entity_id": name if is_node else "",
+                    "record_type": get_node_record_type(name) if is_node else "line",
+                    "line_id": "" if is_node else name,
+                    "quantity": quantity,
+                    "steps": summary["count"],
+                    "limit": limit,
+                    "steps_outside_limit": int(outside[k]),
+                    "hours_outside_limit": hours[k],
+                }
+                row.update((key, vals[k]) for key, vals in values.items())
+                yield row
+
+    def close(self, ok=True):
+        if not ok:
+            return
+        stream = _OutputStream(self._output_csv)
+        try:
+            writer = csv.DictWriter(stream.text, fieldnames=STATS_COLUMNS)
+            writer.writeheader()
+            for row in self._table_rows():
+                writer.writerow(row)
+                self.rows += 1
+        finally:
+            stream.close()
+
+
+class _StepCsvSink:
+    """
+    Base of the sinks that write a few CSV rows per step in the calling thread.
+    A step handed over with a 'checkpoint' dict is synced to disk after its
+    rows and the checkpoint is saved with the output offset and row count, as
+    in LongCsvSink; resuming truncates the file there and writes no header.
+    """
+
+    def __init__(self, output_csv, columns, checkpoint_path=None, checkpoint=None):
+        append_at = checkpoint["output_bytes"] if checkpoint is not None else None
+        self.rows = checkpoint["result_rows"] if checkpoint is not None else 0
+        self._checkpoint_path = checkpoint_path
+        self._stream = _OutputStream(output_csv, append_at=append_at)
+        if append_at is None:
+            csv.writer(self._stream.text).writerow(columns)
+
+    def _write_rows(self, step_rows, checkpoint):
+        if step_rows:
+            # the text layer is replaced by sync() for '.gz' outputs
+            csv.writer(self._stream.text).writerows(step_rows)
+            self.rows += len(step_rows)
+        if checkpoint is not None:
+            checkpoint["output_bytes"] = self._stream.sync()
+            checkpoint["result_rows"] = self.rows
+            save_checkpoint(checkpoint, self._checkpoint_path)
+
+    def close(self, ok=True):
+        self._stream.close()
+
+class EventsSink(_StepCsvSink):
+    """
+    Violation-only event log. write_step() selects the nodes below/above the
+    voltage band and the lines above the loading limit with boolean masks and
+    writes one row for each (events "undervoltage", "overvoltage", "overload");
+    steps without violations write nothing.
+    """
+
+    def __init__(self, output_csv, entities, checkpoint_path=None, checkpoint=None,
+                 voltage_limits=(VOLTAGE_MIN_PU, VOLTAGE_MAX_PU), loading_limit=LOADING_MAX_PERCENT):
+        super().__init__(output_csv, EVENT_COLUMNS, checkpoint_path, checkpoint)
+        self._v_min, self._v_max = voltage_limits
+        self._loading_limit = loading_limit
+        self._ratings = np.array(entities["line_ratings"], dtype=float)
+        # object arrays, so the names of the violating entities are one fancy-index away
+        self._node_names = np.array(entities["node_names"], dtype=object)
+        self._node_types = np.array([get_node_record_type(n) for n in entities["node_names"]], dtype=object)
+        self._line_names = np.array(entities["line_names"], dtype=object)
+
+    def write_step(self, time_label, node_u_pu, node_p, line_i_a, checkpoint=None, node_q=None):
+        loading = loading_percent(line_i_a, self._ratings)
+        step_rows = []
+        for event, idx, limit in (("undervoltage", np.flatnonzero(node_u_pu < self._v_min), self._v_min),
+                                  ("overvoltage", np.flatnonzero(node_u_pu > self._v_max), self._v_max)):
+            step_rows.extend(
+                (time_label, name, r_type, "", event, "voltage_pu", value, limit)
+                for name, r_type, value in zip(self._node_names[idx], self._node_types[idx],
+                                               np.round(node_u_pu[idx], 4).tolist())
+            )
+        idx = np.flatnonzero(loading > self._loading_limit)
+        step_rows.extend(
+            (time_label, "", "line", name, "overload", "loading_percent", value, self._loading_limit)
+            for name, value in zip(self._line_names[idx], np.round(loading[idx], 2).tolist())
+        )
+        self._write_rows(step_rows, checkpoint)
+
+class _GroupReducer:
+    """
+    Reductions of model-order arrays per group (e.g. per feeder) with
+    ufunc.reduceat over an order computed once. Entities in group -1 are left
+    out; groups without entities get 'empty'.
+    """
+
+    def __init__(self, group, n_groups):
+        members = np.flatnonzero(group >= 0)
+        self.order = members[np.argsort(group[members], kind="stable")]
+        self.present, self.starts = np.unique(group[self.order], return_index=True)
+        self.n_groups = n_groups
+
+    def reduce(self, ufunc, values, empty=0.0):
+        out = np.full(self.n_groups, empty)
+        if len(self.order):
+            out[self.present] = ufunc.reduceat(values[self.order], self.starts)
+        return out
+
+class FeederSink(_StepCsvSink):
+    """
+    Feeder-level time series: one row per (step, feeder) with the feeder's net
+    load (the negated node injections of its nodes), its line losses
+    (3 * I^2 * r1 of its lines), its lowest node voltage and its highest line
+    loading, reduced with np.add/np.minimum/np.maximum.reduceat over the
+    feeder map of model_entities(model, feeders=True).
+    """
+
+    def __init__(self, output_csv, entities, checkpoint_path=None, checkpoint=None):
+        super().__init__(output_csv, FEEDER_COLUMNS, checkpoint_path, checkpoint)
+        feeders = entities["feeders"]
+        self._names = feeders["names"]
+        self._nodes = _GroupReducer(feeders["node_feeder"], len(self._names))
+        self._lines = _GroupReducer(feeders["line_feeder"], len(self._names))
+        self._ratings = np.array(entities["line_ratings"], dtype=float)
+        self._r1 = np.array(entities["line_r1"], dtype=float)
+
+    def write_step(self, time_label, node_u_pu, node_p, line_i_a, checkpoint=None, node_q=None):
+        load_kW = -self._nodes.reduce(np.add, node_p) / 1000.0
+        losses_kW = self._lines.reduce(np.add, 3.0 * line_i_a ** 2 * self._r1) / 1000.0
+        min_voltage = self._nodes.reduce(np.minimum, node_u_pu, np.nan)
+        max_loading = self._lines.reduce(np.maximum, loading_percent(line_i_a, self._ratings), np.nan)
+        step_rows = zip([time_label] * len(self._names), self._names,
+                        np.round(load_kW, 3).tolist(), np.round(losses_kW, 3).tolist(),
+                        np.round(min_voltage, 4).tolist(), np.round(max_loading, 2).tolist())
+        self._write_rows(list(step_rows), checkpoint)
+
+
+def open_output_sink(output_mode, output_csv, entities, time_headers, checkpoint_path=None,
+                     checkpoint=None, voltage_limits=(VOLTAGE_MIN_PU, VOLTAGE_MAX_PU),
+                     loading_limit=LOADING_MAX_PERCENT):
+    """
+    The sink for 'output_mode' (one of OUTPUT_MODES), resuming from 'checkpoint' if given.
+    "feeders" needs the feeder map in 'entities' (model_entities(model, feeders=True)).
+    :param voltage_limits: (min, max) voltage band in p.u.
+    :param loading_limit: line loading limit in percent of i_n
+    """
+    if output_mode == "long":
+        return LongCsvSink(output_csv, entities, checkpoint_path=checkpoint_path, checkpoint=checkpoint)
+    if output_mode == "stats":
+        return StatsSink(output_csv, entities, time_headers, checkpoint_path=checkpoint_path,
+                         checkpoint=checkpoint, voltage_limits=voltage_limits, loading_limit=loading_limit)
+    if output_mode == "events":
+        return EventsSink(output_csv, entities, checkpoint_path=checkpoint_path, checkpoint=checkpoint,
+                          voltage_limits=voltage_limits, loading_limit=loading_limit)
+    if output_mode == "feeders":
+        return FeederSink(output_csv, entities, checkpoint_path=checkpoint_path, checkpoint=checkpoint)
+    raise ValueError(f"Unknown output_mode '{output_mode}' (expected one of {OUTPUT_MODES}).")
@@ -2,7 +2,10 @@
 time_series_runner_long.py
 
 Runs time-series power flow for each time step in 'time_series_loads.csv',
-then outputs a LONG format CSV with one row per (time_step, entity).
+then outputs a LONG format CSV with one row per (time_step, entity), or with
+output_mode="stats" one row of running statistics per entity, with
+output_mode="events" only the limit violations, or with output_mode="feeders"
+one row per (time_step, feeder) (the output sinks are in time_series_outputs.py).
 
 Columns:
   time_step,
@@ -15,25 +18,63 @@ We detect building vs station vs feeder from the node_name:
   - 'MainSubstation' => station
   - starts with 'Feeder' => feeder
   - else => other_node
-We approximate Q and PF because the dummy solver doesn't provide them.
+Q and PF come from the sweep solver's node results; with the dummy solver,
+which doesn't provide Q, they are approximated.
+
+With a PowerFlowSession the model is converted to solver arrays once
+(json_generator.model_to_solver_arrays); every step only replaces the load
+vector, so no model copy or JSON dicts are built per step.
+
+With workers > 1 (and a session) the time axis is split into contiguous
+windows, one per worker process. Each worker gets the solver arrays and the
+topology once, solves its window with its own warm-started session and writes
+the per-step results in place into shared memory (shared_buffers.py), where
+the load matrix also lives; rows are then written in time order.
+
+Reading, solving and writing overlap: the time-series CSV is parsed in a
+reader thread while the base model is built (with a memory_limit, that thread
+also reads each next time block while the current one is solved), and the output rows are
+formatted and written (gzip-compressed if output_csv ends in '.gz') by a
+writer thread that is fed through a bounded queue, so the solver only waits
+for the writer when it is more than PIPELINE_QUEUE_STEPS steps behind.
 """
 
 import csv
-import copy
-import math
 import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 
 from build_network_model import build_network_model, update_building_loads
-from json_generator import generate_json_data
-from power_flow_solver import solve_power_flow_in_memory
+from checkpoint import checkpoint_path_for, load_checkpoint, remove_checkpoint
+from instrumentation import Instrumentation
+from json_generator import generate_json_data, load_p_specified, model_to_solver_arrays
+from memory_budget import (parse_memory_size, peak_rss_mb, plan_chunk, time_series_step_bytes,
+                           time_series_working_bytes)
+from power_flow_solver import PowerFlowSession, solve_power_flow_in_memory
+from screening import StepScreener, select_steps, write_screening_csv
+from shared_buffers import SharedBuffers
+from time_series_outputs import (LOADING_MAX_PERCENT, OUTPUT_MODES, PIPELINE_QUEUE_STEPS, VOLTAGE_MAX_PU,
+                                 VOLTAGE_MIN_PU, model_entities, open_output_sink)
+from topology_cache import get_topology, register_topology, structure_hash
+
+# default checkpoint interval in time steps (one day of 15-minute steps)
+CHECKPOINT_EVERY_STEPS = 96
 
-def load_time_series_data(ts_file):
+# per worker process: solver arrays, settings and attached shared buffers,
+# set by _init_window_worker
+_WINDOW_STATE = {}
+
+def load_time_series_data(ts_file, start=0, stop=None):
     """
     Reads time_series_loads.csv (generated by generate_time_series_loads),
     only parse rows where Energy=='total_electricity' for net building load.
     Returns (load_data, time_headers) where:
       load_data[b_id] = [ val_t0, val_t1, ... ]
       time_headers = [ '00:00:00', '00:15:00', ... ]
+    With start/stop only the time steps [start, stop) are kept (for time blocks).
     """
     load_data = {}
     time_headers = []
@@ -41,7 +82,7 @@ def load_time_series_data(ts_file):
     with open(ts_file, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         headers = reader.fieldnames
-        time_headers = headers[2:]  # from third column onward
+        time_headers = headers[2:][start:stop]  # from third column onward
 
         for row in reader:
             if row["Energy"].strip().lower() == "total_electricity":
@@ -53,31 +94,110 @@ def load_time_series_data(ts_file):
 
     return load_data, time_headers
 
-def get_node_record_type(node_name):
+class TimeSeriesBlockFile:
     """
-    Decide if node is building, station, feeder, or other_node.
+    The 'total_electricity' rows of time_series_loads.csv, parsed once into an
+    anonymous temporary file of float64 (one row of all steps per building), so
+    time blocks are read from it with one seek per building instead of parsing
+    the CSV again for every block. The file lives in 'tmp_dir' (default: the
+    system temp directory) and disappears when it is closed.
     """
-    if node_name.startswith("B"):
-        return "building"
-    elif node_name == "MainSubstation":
-        return "station"
-    elif node_name.startswith("Feeder"):
-        return "feeder"
-    else:
-        return "other_node"
+
+    def __init__(self, ts_file, tmp_dir=None):
+        self.building_ids = []
+        self._lock = threading.Lock()
+        self._file = tempfile.TemporaryFile(suffix=".loads.bin", dir=tmp_dir)
+        with open(ts_file, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            i_id = header.index("building_id")
+            i_energy = header.index("Energy")
+            self.time_headers = header[2:]  # from third column onward
+            for row in reader:
+                if row[i_energy].strip().lower() == "total_electricity":
+                    self.building_ids.append(row[i_id])
+                    np.array(row[2:], dtype=np.float64).tofile(self._file)
+        self._file.flush()
+        self.num_steps = len(self.time_headers)
+
+    def read(self, start, stop):
+        """
+        Returns { b_id: array of the loads of steps [start, stop) }.
+        """
+        count = stop - start
+        block = np.empty((len(self.building_ids), count))
+        with self._lock:
+            for k in range(len(self.building_ids)):
+                self._file.seek((k * self.num_steps + start) * 8)
+                block[k] = np.fromfile(self._file, dtype=np.float64, count=count)
+        return dict(zip(self.building_ids, block))
+
+    def close(self):
+        self._file.close()
+
+def _init_window_worker(arrays, topology, structure_key, ts_load_pos, buffer_specs,
+                        warm_start, tol, max_iter):
+    """
+    Process pool initializer: keeps the read-only solver inputs for all windows
+    of this worker, registers the parent's topology, so it is not rebuilt, and
+    attaches to the shared load and result matrices.
+    """
+    register_topology(topology, structure_key)
+    _WINDOW_STATE.update(arrays=arrays, structure_key=structure_key, ts_load_pos=ts_load_pos,
+                         buffers=SharedBuffers.attach(buffer_specs),
+                         warm_start=warm_start, tol=tol, max_iter=max_iter)
+
+def _solve_window(start, stop):
+    """
+    Solves the time steps in rows [start, stop) of the shared buffers (the
+    current time block) in a worker process. Reads the loads from and writes
+    node_u_pu, node_p, node_q, line_i_a, iterations and converged into those rows.
+    Returns the number of steps solved.
+    """
+    st = _WINDOW_STATE
+    buffers = st["buffers"]
+    session = PowerFlowSession(warm_start=st["warm_start"], tol=st["tol"], max_iter=st["max_iter"])
+    arrays = dict(st["arrays"])  # only "load_p" is replaced below
+    step_p_kW = arrays["load_p_kW"].copy()
+
+    for t_idx in range(start, stop):
+        step_p_kW[st["ts_load_pos"]] = buffers["loads"][t_idx]
+        arrays["load_p"] = load_p_specified(step_p_kW, arrays["load_status"])
+        pf_res = session.solve_arrays(arrays, structure_key=st["structure_key"], as_arrays=True)
+        res = pf_res["arrays"]
+        buffers["node_u_pu"][t_idx] = res["node_u_pu"]
+        buffers["node_p"][t_idx] = res["node_p"]
+        buffers["node_q"][t_idx] = res["node_q"]
+        buffers["line_i_a"][t_idx] = res["line_i_a"]
+        buffers["iterations"][t_idx] = pf_res["iterations"]
+        buffers["converged"][t_idx] = pf_res["converged"]
+    return stop - start
 
 def run_time_series_pf_long(
     buildings_file="buildings_demo.csv",
     lines_file="lines_demo.csv",
     assignments_file="building_assignments.csv",
     ts_file="time_series_loads.csv",
-    output_csv="time_series_long.csv"
+    output_csv="time_series_long.csv",
+    session=None,
+    instrumentation=None,
+    workers=1,
+    checkpoint_every=CHECKPOINT_EVERY_STEPS,
+    checkpoint_path=None,
+    resume=False,
+    memory_limit=None,
+    output_mode="long",
+    voltage_limits=(VOLTAGE_MIN_PU, VOLTAGE_MAX_PU),
+    loading_limit=LOADING_MAX_PERCENT,
+    screen_top_k=None,
+    screen_threshold=None,
+    screening_csv=None
 ):
     """
     1) Build a base model from (buildings_file, lines_file, assignments_file).
     2) Load time-series loads from (ts_file) => net building load at each time step.
     3) For each time step:
-       a) update building loads in the model
+       a) update building loads (in the model, or the load vector with a session)
        b) solve PF in memory
        c) parse results for each node + line
        d) write a row for each entity to results
@@ -87,118 +207,378 @@ def run_time_series_pf_long(
       time_step, entity_id, record_type, line_id,
       voltage_pu, p_injection_kW, q_injection_kvar, pf,
       i_from_a, i_to_a, line_rating_a, loading_percent
+    (see output_mode for the alternatives)
+
+    :param session: optional PowerFlowSession (power_flow_solver.py). If given,
+        each step is solved with the sweep solver directly on the solver arrays,
+        warm-started from the previous step, and the iterations per step are reported.
+        If None, the stateless dummy solve_power_flow_in_memory is used
+        (it needs the JSON input dict, which is then generated per step).
+    :param instrumentation: optional Instrumentation (instrumentation.py). Each step
+        is timed in the stages load_update, json_generation (dummy solver only),
+        solve and output (handing the results to the output sink; in long mode
+        long times mean the writer thread is the bottleneck), labelled with the
+        time step; 'write' is closing the sink after the last step, and the inputs
+        are timed in ts_build_model / ts_load_input (the wait for the reader thread).
+        Counters: steps, solver_iterations, result_rows; gauges: nodes, lines, loads.
+    :param output_csv: output path; a '.gz' suffix writes it gzip-compressed
+    :param workers: number of processes; above 1 the steps are split into one
+        contiguous window per worker (needs a session, whose warm_start, tol and
+        max_iter the workers use). Each window starts cold and warm-starts from
+        there on; the per-step solve time is then reported as one 'solve_windows' stage.
+        Loads and results are exchanged through shared memory (not pickled).
+    :param checkpoint_every: every this many steps, once the step's rows are on
+        disk, a checkpoint (checkpoint.py) records the next step index, the output
+        offset and row count, and the session's warm-start voltages; 0 disables it.
+        The checkpoint is removed when the run completes.
+    :param checkpoint_path: defaults to '<output_csv>.checkpoint.json'
+    :param resume: continue from the checkpoint, if there is one: the output is
+        truncated to the checkpointed offset and the run restarts at the step
+        after it, so no rows are duplicated. The checkpoint must come from a run
+        with the same inputs (number of steps, first step, network structure).
+    :param memory_limit: optional budget in bytes (or e.g. "2G", see memory_budget.py).
+        The steps are then processed in time blocks sized from the memory already
+        in use and the estimated bytes per node, line, load and step: ts_file is
+        parsed once into a binary temporary file next to output_csv
+        (TimeSeriesBlockFile), the next block's loads are read from it in a reader
+        thread while the current block is solved, and with workers the shared
+        load/result matrices hold one block. The peak RSS is reported at the end
+        (also as gauge peak_rss_mb).
+    :param output_mode: "long" (default) for the long CSV; "stats" for one row per
+        node and line with running statistics over all steps (min/max/mean/std,
+        5/50/95th percentiles of voltage_pu or loading_percent, steps and hours
+        outside the limits), updated as the steps are solved, so neither memory
+        nor the output grows with the number of steps (see time_series_outputs.py);
+        "events" for a sparse log with one row per violation (node voltage outside
+        voltage_limits, line loading above loading_limit) with step, entity and value;
+        "feeders" for one row per step and feeder (total load, line losses, lowest
+        voltage, highest line loading), with every node and line mapped to its
+        feeder once from the model topology.
+        A checkpoint only resumes a run with the same mode.
+    :param voltage_limits: (min, max) voltage band in p.u. for "stats" and "events"
+        (and screening)
+    :param loading_limit: line loading limit in percent for "stats" and "events"
+        (and screening)
+    :param screen_top_k, screen_threshold: pre-screen the steps (screening.py, needs
+        a session): every step is first rated by a linear estimate of its voltage
+        drop/rise and feeder loading ('severity', 1.0 = at a limit), and only the
+        screen_top_k most severe steps plus those with severity >= screen_threshold
+        are solved and written; the other steps are taken to be within limits and
+        left out of the output (stats then cover the solved steps only). The
+        estimates of all steps, and which were solved, go to screening_csv
+        (default '<output_csv>.screening.csv'). Timed as stage 'screening'; gauge
+        solved_steps. Checkpoints store the selected steps, so a resumed run
+        solves the same steps without screening again or rewriting screening_csv.
     """
-    # 1) Build base model
-    print("[time_series_runner_long] Building base model from CSVs.")
-    base_model = build_network_model(buildings_file, lines_file, assignments_file)
-
-    # 2) Load time-series net loads
-    if not os.path.exists(ts_file):
-        print(f"[time_series_runner_long] No {ts_file} => skip.")
-        return
-    load_data, time_headers = load_time_series_data(ts_file)
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output_mode '{output_mode}' (expected one of {OUTPUT_MODES}).")
+    if workers > 1 and session is None:
+        raise ValueError("workers > 1 needs a session (the dummy solver is not sharded).")
+    screening = screen_top_k is not None or screen_threshold is not None
+    if screening and session is None:
+        raise ValueError("Screening needs a session (it works on the solver arrays).")
+    instr = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+
+    # 1) Build base model, while a reader thread parses the time-series loads
+    #    (with a memory_limit into a TimeSeriesBlockFile, read block by block later)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ts-reader") as reader:
+        ts_future = None
+        if os.path.exists(ts_file):
+            if memory_limit is None:
+                ts_future = reader.submit(load_time_series_data, ts_file)
+            else:
+                ts_future = reader.submit(TimeSeriesBlockFile, ts_file,
+                                          os.path.dirname(os.path.abspath(output_csv)))
+        print("[time_series_runner_long] Building base model from CSVs.")
+        with instr.stage("ts_build_model"):
+            base_model = build_network_model(buildings_file, lines_file, assignments_file)
+        instr.gauge("nodes", len(base_model["nodes"]))
+        instr.gauge("lines", len(base_model["lines"]))
+        instr.gauge("loads", len(base_model["loads"]))
+
+        # 2) Load time-series net loads
+        if ts_future is None:
+            print(f"[time_series_runner_long] No {ts_file} => skip.")
+            return
+        with instr.stage("ts_load_input"):
+            if memory_limit is None:
+                load_data, time_headers = ts_future.result()
+                block_file = None
+            else:
+                load_data, block_file = None, ts_future.result()
+                time_headers = block_file.time_headers
     num_steps = len(time_headers)
     print(f"[time_series_runner_long] Found {num_steps} time columns => {time_headers}")
 
-    # We'll keep line ratings, node names for reference
-    line_rating_map = {}
-    line_id_map = {}
-    for ln in base_model["lines"]:
-        line_rating_map[ln["id"]] = ln["i_n"]  # nominal rating in A
-        line_id_map[ln["id"]] = ln["name"]
-
-    node_id_to_name = {}
-    for nd in base_model["nodes"]:
-        node_id_to_name[nd["id"]] = nd["name"]
-
-    # We'll gather results in memory as a list of dict rows
-    # Each row => {time_step, entity_id, record_type, line_id, voltage_pu, ...}
-    results_rows = []
-
-    # 3) Loop over each time step
-    for t_idx in range(num_steps):
-        time_label = time_headers[t_idx]  # e.g. "00:00:00"
-        # copy model
-        model_t = copy.deepcopy(base_model)
-        # build load dict for this time
-        step_load = {}
-        for b_id, arr in load_data.items():
-            step_load[b_id] = arr[t_idx]
-        update_building_loads(model_t, step_load)
-
-        # solve PF
-        input_dict = generate_json_data(model_t)
-        pf_res = solve_power_flow_in_memory(input_dict)
-        sym_data = pf_res["sym"]["data"]  # node:[], line:[], shunt:[]
-
-        # parse node results
-        for nd_obj in sym_data["node"]:
-            node_id = nd_obj["id"]
-            node_name = node_id_to_name[node_id]
-            r_type = get_node_record_type(node_name)  # building, station, feeder, other
-            v_pu = nd_obj.get("u_pu", 1.0)
-            p_w = nd_obj.get("p", 0.0)
-            p_kW = p_w/1000.0
-            # approximate q, pf
-            q_w = 0.3*p_w
-            q_kvar = q_w/1000.0
-            s_kW = math.sqrt((p_kW**2)+(q_kvar**2)) if abs(p_kW)>1e-9 or abs(q_kvar)>1e-9 else 1e-9
-            pf_val = abs(p_kW/s_kW) if s_kW>1e-9 else 1.0
-
-            row = {
-                "time_step": time_label,
-                "entity_id": node_name,
-                "record_type": r_type,
-                "line_id": "",
-                "voltage_pu": round(v_pu,3),
-                "p_injection_kW": round(p_kW,3),
-                "q_injection_kvar": round(q_kvar,3),
-                "pf": round(pf_val,3),
-                "i_from_a": "",
-                "i_to_a": "",
-                "line_rating_a": "",
-                "loading_percent": ""
-            }
-            results_rows.append(row)
-
-        # parse line results
-        for ln_obj in sym_data["line"]:
-            l_id = ln_obj["id"]
-            i_from = ln_obj.get("i_from", 0.0)
-            rating_a = line_rating_map.get(l_id, 9999)
-            load_pct = 0.0
-            if rating_a>0:
-                load_pct = (i_from/rating_a)*100.0
-
-            row = {
-                "time_step": time_label,
-                "entity_id": "",
-                "record_type": "line",
-                "line_id": line_id_map[l_id],
-                "voltage_pu": "",
-                "p_injection_kW": "",
-                "q_injection_kvar": "",
-                "pf": "",
-                "i_from_a": round(i_from,3),
-                "i_to_a": "",
-                "line_rating_a": rating_a,
-                "loading_percent": round(load_pct,2)
-            }
-            results_rows.append(row)
-
-    # 4) Write final CSV
-    out_cols = [
-        "time_step","entity_id","record_type","line_id",
-        "voltage_pu","p_injection_kW","q_injection_kvar","pf",
-        "i_from_a","i_to_a","line_rating_a","loading_percent"
-    ]
-    with open(output_csv, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=out_cols)
-        writer.writeheader()
-        for rw in results_rows:
-            writer.writerow(rw)
-
-    print(f"[time_series_runner_long] Wrote {len(results_rows)} rows => '{output_csv}'")
+    # ids, names and ratings of the nodes and lines, in the order of the result arrays
+    entities = model_entities(base_model, feeders=output_mode == "feeders")
+    node_id_to_name = dict(zip(entities["node_ids"], entities["node_names"]))
+
+    # iterations to convergence per step, and the steps that did not converge
+    # (only when solving with a session)
+    step_iterations = []
+    non_converged_steps = 0
+
+    parallel = session is not None and workers > 1 and num_steps > 0
+    if session is not None:
+        # solver arrays are built once; each step only rewrites arrays["load_p"]
+        arrays = model_to_solver_arrays(base_model)
+        structure_key = structure_hash(arrays)
+        load_pos_by_name = {node_id_to_name[ld["node"]]: k for k, ld in enumerate(base_model["loads"])}
+        step_p_kW = arrays["load_p_kW"].copy()
+
+    # checkpoints identify the run they belong to
+    checkpoint_path = checkpoint_path or checkpoint_path_for(output_csv)
+    run_info = {
+        "num_steps": num_steps,
+        "first_step": time_headers[0] if time_headers else None,
+        "structure_key": structure_key if session is not None else None,
+        "output_mode": output_mode,
+        "screening": [screen_top_k, screen_threshold] if screening else None,
+    }
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    start_step = 0
+    if checkpoint is not None:
+        if any(checkpoint.get(k) != v for k, v in run_info.items()):
+            raise ValueError(f"Checkpoint '{checkpoint_path}' belongs to a different run.")
+        start_step = checkpoint["next_step"]
+        step_iterations = checkpoint["step_iterations"]
+        non_converged_steps = checkpoint.get("non_converged_steps", 0)
+        if session is not None:
+            session.set_state(checkpoint["session"])
+        print(f"[time_series_runner_long] Resuming at step {start_step} of {num_steps} "
+              f"from '{checkpoint_path}'.")
+
+    # 3) Time blocks: all remaining steps at once, or as many as fit into memory_limit
+    remaining = max(1, num_steps - start_step)
+    if memory_limit is None:
+        block_steps = remaining
+    else:
+        n_nodes, n_lines = len(base_model["nodes"]), len(base_model["lines"])
+        block_steps = plan_chunk(
+            memory_limit,
+            time_series_step_bytes(n_nodes, n_lines, len(base_model["loads"]), shared_results=parallel),
+            time_series_working_bytes(n_nodes, n_lines, PIPELINE_QUEUE_STEPS, workers if parallel else 1,
+                                      output_mode=output_mode),
+            remaining
+        )
+        print(f"[time_series_runner_long] memory_limit => {block_steps} steps per time block.")
+    instr.gauge("block_steps", block_steps)
+
+    def iter_blocks(blocks):
+        """
+        Yields (b_start, b_stop, block_data, data_offset) for the (b_start, b_stop)
+        pairs in 'blocks'; block_data[b_id][t_idx - data_offset] is the load of step
+        t_idx. From a block file, the next block is read in a reader thread while
+        the caller works on the current one.
+        """
+        if block_file is None:
+            for b_start, b_stop in blocks:
+                yield b_start, b_stop, load_data, 0
+            return
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ts-reader") as prefetch:
+            future = prefetch.submit(block_file.read, *blocks[0]) if blocks else None
+            for i, (b_start, b_stop) in enumerate(blocks):
+                with instr.stage("ts_load_input"):
+                    block_data = future.result()
+                future = prefetch.submit(block_file.read, *blocks[i + 1]) if i + 1 < len(blocks) else None
+                yield b_start, b_stop, block_data, b_start
+                block_data = None
+
+    def block_bounds(first_step):
+        return [(b_start, min(b_start + block_steps, num_steps))
+                for b_start in range(first_step, num_steps, block_steps)]
+
+    def init_ts_loads(block_data):
+        """(ts_names, ts_load_pos): the buildings with a time series and their load positions."""
+        names = [b_id for b_id in block_data if b_id in load_pos_by_name]
+        return names, np.array([load_pos_by_name[b_id] for b_id in names], dtype=np.int64)
+
+    ts_names = None
+
+    # 4) Screening: rate every step by a linear estimate, then solve only the selected ones
+    solve_step = None  # per step: solve it? (None: all)
+    if screening and num_steps > 0 and checkpoint is not None and "solved_steps" in checkpoint:
+        # resumed: keep the interrupted run's selection (and its screening_csv)
+        solve_step = np.zeros(num_steps, dtype=bool)
+        solve_step[np.asarray(checkpoint["solved_steps"], dtype=np.int64)] = True
+        instr.gauge("solved_steps", int(solve_step.sum()))
+        print(f"[time_series_runner_long] Screening => solving {int(solve_step.sum())} of {num_steps} "
+              f"steps, as selected before the checkpoint")
+    elif screening and num_steps > 0:
+        with instr.stage("screening"):
+            topology, _ = get_topology(arrays, cache_dir=session.cache_dir, key=structure_key)
+            screener = StepScreener(arrays, topology, voltage_limits, loading_limit)
+            estimates = []
+            for b_start, b_stop, block_data, data_offset in iter_blocks(block_bounds(0)):
+                if ts_names is None:
+                    ts_names, ts_load_pos = init_ts_loads(block_data)
+                lo, hi = b_start - data_offset, b_stop - data_offset
+                ts_p_kW = np.empty((b_stop - b_start, len(ts_names)))
+                for k, b_id in enumerate(ts_names):
+                    ts_p_kW[:, k] = block_data[b_id][lo:hi]
+                estimates.append(screener.estimate(ts_load_pos, ts_p_kW))
+            block_data = None
+            estimate = {key: np.concatenate([e[key] for e in estimates]) for key in estimates[0]}
+            solve_step = select_steps(estimate["severity"], screen_top_k, screen_threshold)
+            screening_csv = screening_csv or f"{output_csv}.screening.csv"
+            write_screening_csv(screening_csv, time_headers, estimate, solve_step)
+        instr.gauge("solved_steps", int(solve_step.sum()))
+        print(f"[time_series_runner_long] Screening => solving {int(solve_step.sum())} of {num_steps} "
+              f"steps (max severity {estimate['severity'].max():.2f}), estimates => '{screening_csv}'")
+
+    solved_steps = np.flatnonzero(solve_step).tolist() if solve_step is not None else None
+
+    # every solved step goes to the output sink (in long mode: a writer thread)
+    sink = open_output_sink(output_mode, output_csv, entities, time_headers,
+                            checkpoint_path=checkpoint_path, checkpoint=checkpoint,
+                            voltage_limits=voltage_limits, loading_limit=loading_limit)
+    if session is None:
+        # positions of the dummy solver's results in the (model-order) result arrays
+        node_pos = {node_id: k for k, node_id in enumerate(entities["node_ids"])}
+        line_pos = {line_id: k for k, line_id in enumerate(entities["line_ids"])}
+    ts_matrix = None  # (block steps) x (loads with a time series), in kW
+    buffers = None
+    executor = None
+    # checkpoints are taken at the first solved step at or after every multiple of checkpoint_every
+    next_checkpoint = (start_step // checkpoint_every + 1) * checkpoint_every if checkpoint_every else None
+    # blocks with steps to solve
+    blocks = block_bounds(start_step)
+    if solve_step is not None:
+        blocks = [(lo, hi) for lo, hi in blocks if solve_step[lo:hi].any()]
+    completed = False
+    try:
+        for block_start, block_stop, block_data, data_offset in iter_blocks(blocks):
+            # the block's steps to solve; ts_matrix row k holds steps[k]
+            keep = solve_step[block_start:block_stop] if solve_step is not None else None
+            steps = list(range(block_start, block_stop)) if keep is None else \
+                (block_start + np.flatnonzero(keep)).tolist()
+
+            if session is not None:
+                if ts_names is None:
+                    ts_names, ts_load_pos = init_ts_loads(block_data)
+                if ts_matrix is None:
+                    ts_shape = (block_steps, len(ts_names))
+                    if parallel:
+                        # workers read the loads and write their results in place
+                        n_nodes, n_lines = len(arrays["node_id"]), len(arrays["line_id"])
+                        buffers = SharedBuffers.create({
+                            "loads": (ts_shape, "float64"),
+                            "node_u_pu": ((block_steps, n_nodes), "float64"),
+                            "node_p": ((block_steps, n_nodes), "float64"),
+                            "node_q": ((block_steps, n_nodes), "float64"),
+                            "line_i_a": ((block_steps, n_lines), "float64"),
+                            "iterations": ((block_steps,), "int64"),
+                            "converged": ((block_steps,), "bool"),
+                        })
+                        ts_matrix = buffers["loads"]
+                        topology, _ = get_topology(arrays, cache_dir=session.cache_dir, key=structure_key)
+                        executor = ProcessPoolExecutor(
+                            max_workers=min(workers, block_steps),
+                            initializer=_init_window_worker,
+                            initargs=(arrays, topology, structure_key, ts_load_pos, buffers.specs(),
+                                      session.warm_start, session.tol, session.max_iter)
+                        )
+                    else:
+                        ts_matrix = np.empty(ts_shape)
+                lo, hi = block_start - data_offset, block_stop - data_offset
+                for k, b_id in enumerate(ts_names):
+                    values = block_data[b_id][lo:hi]
+                    ts_matrix[:len(steps), k] = values if keep is None else np.asarray(values)[keep]
+
+            # with workers, the block's windows are solved up front into the shared result matrices
+            if parallel:
+                n_windows = min(workers, len(steps))
+                bounds = np.linspace(0, len(steps), n_windows + 1).astype(int)
+                with instr.stage("solve_windows"):
+                    futures = [executor.submit(_solve_window, int(w_lo), int(w_hi))
+                               for w_lo, w_hi in zip(bounds[:-1], bounds[1:])]
+                    for f in futures:
+                        f.result()
+
+            # Loop over each time step of the block
+            for row, t_idx in enumerate(steps):
+                time_label = time_headers[t_idx]  # e.g. "00:00:00"
+                instr.count("steps")
+                if parallel:
+                    pf_res = {"iterations": int(buffers["iterations"][row]),
+                              "converged": bool(buffers["converged"][row])}
+                    session.iteration_history.append(pf_res["iterations"])
+                    res = {key: buffers[key][row] for key in ("node_u_pu", "node_p", "node_q", "line_i_a")}
+                elif session is not None:
+                    # loads without a time series keep their base value
+                    with instr.stage("load_update", step=time_label):
+                        step_p_kW[ts_load_pos] = ts_matrix[row]
+                        arrays["load_p"] = load_p_specified(step_p_kW, arrays["load_status"])
+                    with instr.stage("solve", step=time_label):
+                        pf_res = session.solve_arrays(arrays, structure_key=structure_key, as_arrays=True)
+                    res = pf_res["arrays"]
+                else:
+                    # every step overwrites the same buildings, so the base model is updated in place
+                    with instr.stage("load_update", step=time_label):
+                        step_load = {}
+                        for b_id, arr in block_data.items():
+                            step_load[b_id] = arr[t_idx - data_offset]
+                        update_building_loads(base_model, step_load)
+                    with instr.stage("json_generation", step=time_label):
+                        input_dict = generate_json_data(base_model)
+                    with instr.stage("solve", step=time_label):
+                        pf_res = solve_power_flow_in_memory(input_dict)
+                    sym_data = pf_res["sym"]["data"]  # node:[], line:[], shunt:[]
+                    res = {"node_u_pu": np.ones(len(node_pos)), "node_p": np.zeros(len(node_pos)),
+                           "line_i_a": np.zeros(len(line_pos))}
+                    for nd in sym_data["node"]:
+                        res["node_u_pu"][node_pos[nd["id"]]] = nd.get("u_pu", 1.0)
+                        res["node_p"][node_pos[nd["id"]]] = nd.get("p", 0.0)
+                    for ln in sym_data["line"]:
+                        res["line_i_a"][line_pos[ln["id"]]] = ln.get("i_from", 0.0)
+                if session is not None:
+                    step_iterations.append(pf_res["iterations"])
+                    instr.count("solver_iterations", pf_res["iterations"])
+                    if not pf_res["converged"]:
+                        non_converged_steps += 1
+                        instr.count("non_converged_steps")
+                        print(f"[time_series_runner_long] WARNING: step {time_label} did not converge "
+                              f"in {pf_res['iterations']} iterations.")
+
+                step_checkpoint = None
+                if checkpoint_every and t_idx + 1 >= next_checkpoint:
+                    next_checkpoint = ((t_idx + 1) // checkpoint_every + 1) * checkpoint_every
+                    # the sink adds its resume state once this step is durable
+                    step_checkpoint = dict(run_info, next_step=t_idx + 1,
+                                           step_iterations=list(step_iterations),
+                                           non_converged_steps=non_converged_steps,
+                                           solved_steps=solved_steps,
+                                           session=session.get_state() if session is not None else None)
+                with instr.stage("output", step=time_label):
+                    sink.write_step(time_label, res["node_u_pu"], res["node_p"], res["line_i_a"],
+                                    checkpoint=step_checkpoint, node_q=res.get("node_q"))
+            block_data = None
+        completed = True
+    finally:
+        # 5) Finish the output (after a failure only what is already durable)
+        with instr.stage("write"):
+            sink.close(ok=completed)
+        if executor is not None:
+            executor.shutdown()
+        if buffers is not None:
+            buffers.unlink()
+        if block_file is not None:
+            block_file.close()
+    instr.count("result_rows", sink.rows)
+    remove_checkpoint(checkpoint_path)
+
+    print(f"[time_series_runner_long] Wrote {sink.rows} rows => '{output_csv}' ({output_mode})")
+    peak_mb = peak_rss_mb()
+    if peak_mb is not None:
+        instr.gauge("peak_rss_mb", round(peak_mb, 1))
+        limit_note = f" (memory_limit {parse_memory_size(memory_limit) / (1 << 20):.0f} MB)" if memory_limit is not None else ""
+        print(f"[time_series_runner_long] Peak RSS: {peak_mb:.0f} MB{limit_note}")
+    if step_iterations:
+        print(f"[time_series_runner_long] Solver iterations per step: "
+              f"mean={sum(step_iterations)/len(step_iterations):.2f}, "
+              f"max={max(step_iterations)}, not converged={non_converged_steps} of {len(step_iterations)} "
+              f"steps, warm_start={session.warm_start}")
 
 
 if __name__=="__main__":
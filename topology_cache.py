@@ -0,0 +1,259 @@
+"""
+topology_cache.py
+
+Precomputes and caches the load-independent part of a power flow:
+  - node ordering (breadth-first from the source), parent arrays, depth levels
+  - per-unit branch impedances seen from each node
+  - branch-node incidence matrix (COO arrays)
+  - Y-bus sparsity structure (CSR indptr/indices)
+
+Everything here depends only on nodes, lines, links and sources, not on the
+loads, so one topology can serve every time step and every load scenario
+run on the same network.
+
+The cache key is a SHA-256 hash of the structural arrays. Entries are kept
+in memory and, if a cache_dir is given, also on disk as
+'<cache_dir>/topology_<hash>.npz' so that new processes can skip the build.
+
+The input is the dict of NumPy component arrays used by the sweep solver
+(see power_flow_solver._input_to_arrays).
+
+Requires:
+  pip install numpy
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from network_graph import bfs_tree, build_csr_adjacency
+
+# Base power used for the per-unit impedances (1 MVA), shared with the sweep solver
+S_BASE = 1e6
+
+# Arrays that define the structure; the loads are deliberately not part of it
+STRUCTURE_KEYS = (
+    "node_id", "u_rated",
+    "line_id", "line_from", "line_to", "line_r1", "line_x1",
+    "link_id", "link_from", "link_to",
+    "source_node"
+)
+
+# Arrays stored per topology (in memory and in the .npz files)
+_TOPOLOGY_ARRAYS = (
+    "node_sorter", "sorted_node_id", "roots", "parent", "parent_branch", "depth",
+    "order", "level_ptr", "z_pu", "line_child",
+    "incidence_branch", "incidence_node", "incidence_sign",
+    "ybus_indptr", "ybus_indices"
+)
+
+_MEMORY_CACHE = OrderedDict()
+MAX_MEMORY_ENTRIES = 8
+
+
+def structure_hash(arrays):
+    """
+    Returns a hex SHA-256 digest of the structural component arrays.
+    Two networks with the same hash share the same topology.
+    """
+    h = hashlib.sha256()
+    for key in STRUCTURE_KEYS:
+        arr = np.ascontiguousarray(arrays[key])
+        h.update(key.encode("utf-8"))
+        h.update(str(arr.dtype).encode("utf-8"))
+        h.update(str(arr.shape).encode("utf-8"))
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def node_index(topology, ids):
+    """
+    Maps model node IDs to positions in the node arrays (vectorized).
+    Raises KeyError for IDs that are not nodes of the topology.
+    """
+    ids = np.asarray(ids)
+    sorted_node_id = topology["sorted_node_id"]
+    pos = np.searchsorted(sorted_node_id, ids)
+    if len(sorted_node_id):
+        found = sorted_node_id[np.minimum(pos, len(sorted_node_id) - 1)] == ids
+    else:
+        found = np.zeros(ids.shape, dtype=bool)
+    if not np.all(found):
+        unknown = np.unique(ids[~found])
+        raise KeyError(f"Unknown node IDs: {unknown[:10].tolist()}"
+                       f"{' ...' if len(unknown) > 10 else ''}")
+    return topology["node_sorter"][pos]
+
+
+def build_topology(arrays):
+    """
+    Orders the nodes breadth-first from the source(s) and stores, per node,
+    the parent node index and the per-unit impedance of the branch to it,
+    plus the incidence matrix and Y-bus structure.
+    Lines come first in the branch numbering, followed by links
+    (links are zero-impedance branches).
+    """
+    node_id = np.asarray(arrays["node_id"])
+    n = len(node_id)
+    node_sorter = np.argsort(node_id, kind="stable")
+    topology = {
+        "node_sorter": node_sorter,
+        "sorted_node_id": node_id[node_sorter],
+    }
+
+    br_from = node_index(topology, np.concatenate([arrays["line_from"], arrays["link_from"]]))
+    br_to = node_index(topology, np.concatenate([arrays["line_to"], arrays["link_to"]]))
+    br_z = np.concatenate([
+        arrays["line_r1"] + 1j * arrays["line_x1"],
+        np.zeros(len(arrays["link_from"]), dtype=complex)
+    ])
+    n_lines = len(arrays["line_from"])
+    n_branches = len(br_from)
+
+    adj_ptr, adj_nbr, adj_edge = build_csr_adjacency(n, br_from, br_to)
+    roots = node_index(topology, arrays["source_node"])
+    order, parent, parent_branch, depth = bfs_tree(adj_ptr, adj_nbr, adj_edge, roots)
+
+    # per-unit impedance of the branch feeding each node, on the child's voltage base
+    u_base = np.asarray(arrays["u_rated"], dtype=float)
+    z_pu = np.zeros(n, dtype=complex)
+    fed = parent_branch >= 0
+    z_pu[fed] = br_z[parent_branch[fed]] * S_BASE / u_base[fed] ** 2
+
+    # line -> child node (the end further from the source)
+    line_child = np.full(n_lines, -1, dtype=np.int64)
+    is_line = fed & (parent_branch < n_lines)
+    line_child[parent_branch[is_line]] = np.nonzero(is_line)[0]
+
+    # 'order' is sorted by depth, so levels are contiguous slices of it
+    level_ptr = np.searchsorted(depth[order], np.arange(int(depth.max()) + 2 if n else 1))
+
+    # incidence matrix A (branches x nodes): +1 at from, -1 at to
+    incidence_branch = np.repeat(np.arange(n_branches, dtype=np.int64), 2)
+    incidence_node = np.column_stack([br_from, br_to]).ravel()
+    incidence_sign = np.tile(np.array([1, -1], dtype=np.int8), n_branches)
+
+    # Y-bus structure: diagonal plus both directions of every branch
+    rows = np.concatenate([np.arange(n), br_from, br_to])
+    cols = np.concatenate([np.arange(n), br_to, br_from])
+    keys = np.unique(rows.astype(np.int64) * max(n, 1) + cols)
+    ybus_rows = keys // max(n, 1)
+    ybus_indices = keys % max(n, 1)
+    ybus_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ybus_rows, minlength=n), out=ybus_indptr[1:])
+
+    topology.update({
+        "roots": roots,
+        "parent": parent,
+        "parent_branch": parent_branch,
+        "depth": depth,
+        "order": order,
+        "level_ptr": level_ptr,
+        "z_pu": z_pu,
+        "line_child": line_child,
+        "incidence_branch": incidence_branch,
+        "incidence_node": incidence_node,
+        "incidence_sign": incidence_sign,
+        "ybus_indptr": ybus_indptr,
+        "ybus_indices": ybus_indices,
+    })
+    return _finalize(topology)
+
+
+def _finalize(topology):
+    """
+    Adds the derived (non-stored) fields: node count, energized mask,
+    and the per-depth node groups used by the sweep.
+    """
+    order = topology["order"]
+    level_ptr = topology["level_ptr"]
+    topology["n_nodes"] = len(topology["parent"])
+    topology["energized"] = topology["depth"] >= 0
+    topology["levels"] = [order[level_ptr[d]:level_ptr[d + 1]]
+                          for d in range(len(level_ptr) - 1)]
+    return topology
+
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, f"topology_{key}.npz")
+
+
+def save_topology(topology, path):
+    """
+    Writes the stored topology arrays to a .npz file (atomically). The temp
+    file has a unique name, so processes sharing a cache_dir can write the
+    same entry at the same time; the last rename wins.
+    """
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)),
+                                     prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     delete=False) as f:
+        tmp_path = f.name
+        try:
+            np.savez(f, **{name: topology[name] for name in _TOPOLOGY_ARRAYS})
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+def load_topology(path):
+    """
+    Reads a topology written by save_topology.
+    """
+    with np.load(path) as data:
+        topology = {name: data[name] for name in _TOPOLOGY_ARRAYS}
+    return _finalize(topology)
+
+
+def get_topology(arrays, cache_dir=None, key=None):
+    """
+    Returns (topology, key) for the given component arrays.
+    Looks in the in-memory cache first, then in cache_dir (if given),
+    and only builds the topology if neither has it.
+
+    :param arrays: dict of component arrays (node_id, line_from, ...)
+    :param cache_dir: optional directory for the on-disk cache
+    :param key: precomputed structure_hash(arrays), if already known
+    """
+    if key is None:
+        key = structure_hash(arrays)
+
+    topology = _MEMORY_CACHE.get(key)
+    if topology is not None:
+        _MEMORY_CACHE.move_to_end(key)
+        return topology, key
+
+    path = _cache_path(cache_dir, key) if cache_dir else None
+    if path and os.path.exists(path):
+        topology = load_topology(path)
+    else:
+        topology = build_topology(arrays)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            save_topology(topology, path)
+
+    register_topology(topology, key)
+    return topology, key
+
+
+def register_topology(topology, key):
+    """
+    Puts an already built topology into the in-memory cache under 'key'
+    (e.g. one handed to a worker process by its parent), so that
+    get_topology() returns it without hashing the structure again or building it.
+    """
+    _MEMORY_CACHE[key] = topology
+    _MEMORY_CACHE.move_to_end(key)
+    while len(_MEMORY_CACHE) > MAX_MEMORY_ENTRIES:
+        _MEMORY_CACHE.popitem(last=False)
+
+
+def clear_topology_cache():
+    """
+    Empties the in-memory cache (files in any cache_dir are left alone).
+    """
+    _MEMORY_CACHE.clear()